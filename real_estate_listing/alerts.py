@@ -0,0 +1,289 @@
+"""
+Saved search alerts for new listings.
+
+``SavedSearchIndex`` holds the predicates of every active saved search in
+memory so that one listing is matched against all of them at once:
+
+* price ranges in an ``IntervalTree``, a stabbing query returns the searches
+  whose range contains the price,
+* keywords in an inverted index from term to searches, a search matches when
+  the listing text contains all of its keywords, counted with ``bincount``,
+* owners as an array compared with the owner of the listing.
+
+Creating listings enqueues ``SAVED_SEARCH_MATCH`` outbox tasks, the worker
+matches them, stores ``SearchAlert`` rows and enqueues ``ALERT_DELIVER``
+tasks that hand the alerts to the notification backend.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import RealEstateItem, SavedSearch, SearchAlert
+from .outbox import outbox_setting
+from .search import query_terms
+
+logger = logging.getLogger(__name__)
+
+
+def alerts_setting(name, default):
+    return getattr(settings, "SAVED_SEARCH_ALERTS", {}).get(name, default)
+
+
+def listing_terms(description, address):
+    return set(query_terms(f"{description} {address}"))
+
+
+class IntervalTree:
+    """
+    Static centered interval tree over closed intervals ``[start, end]``.
+
+    Every node keeps the intervals containing its center sorted by start and
+    by end, so a stabbing query slices them with ``searchsorted`` and descends
+    one side only: O(log n + matches).
+    """
+
+    leaf_size = 32
+
+    def __init__(self, starts, ends, values):
+        self.root = self._build(
+            np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64), np.asarray(values, dtype=np.int64)
+        )
+
+    def _build(self, starts, ends, values):
+        if not len(values):
+            return None
+        if len(values) <= self.leaf_size:
+            return ("leaf", starts, ends, values)
+        endpoints = np.concatenate([starts, ends])
+        endpoints = endpoints[np.isfinite(endpoints)]
+        center = float(np.median(endpoints)) if len(endpoints) else 0.0
+        left, right = ends < center, starts > center
+        here = ~(left | right)
+        by_start = np.argsort(starts[here], kind="stable")
+        by_end = np.argsort(ends[here], kind="stable")
+        return (
+            "node",
+            center,
+            starts[here][by_start],
+            values[here][by_start],
+            ends[here][by_end],
+            values[here][by_end],
+            self._build(starts[left], ends[left], values[left]),
+            self._build(starts[right], ends[right], values[right]),
+        )
+
+    def stab(self, point):
+        """Values of the intervals containing ``point``."""
+        found, node = [], self.root
+        while node is not None:
+            if node[0] == "leaf":
+                _, starts, ends, values = node
+                found.append(values[(starts <= point) & (point <= ends)])
+                break
+            _, center, starts, by_start, ends, by_end, left, right = node
+            if point < center:
+                found.append(by_start[: np.searchsorted(starts, point, side="right")])
+                node = left
+            elif point > center:
+                found.append(by_end[np.searchsorted(ends, point, side="left"):])
+                node = right
+            else:
+                found.append(by_start)
+                break
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+
+class SavedSearchIndex:
+    """Predicates of a set of saved searches, see the module docstring."""
+
+    def __init__(self, searches):
+        """``searches`` are ``(id, user_id, min_price, max_price, keywords, owner_id)`` tuples."""
+        count = len(searches)
+        self.ids = np.empty(count, dtype=np.int64)
+        self.users = np.empty(count, dtype=np.int64)
+        self.owners = np.full(count, -1, dtype=np.int64)
+        self.keyword_counts = np.zeros(count, dtype=np.int64)
+        starts, ends = np.full(count, -np.inf), np.full(count, np.inf)
+        postings = defaultdict(list)
+        for position, (pk, user_id, min_price, max_price, keywords, owner_id) in enumerate(searches):
+            self.ids[position], self.users[position] = pk, user_id
+            if owner_id is not None:
+                self.owners[position] = owner_id
+            if min_price is not None:
+                starts[position] = float(min_price)
+            if max_price is not None:
+                ends[position] = float(max_price)
+            terms = set(query_terms(keywords or ""))
+            self.keyword_counts[position] = len(terms)
+            for term in terms:
+                postings[term].append(position)
+        self.postings = {term: np.array(positions, dtype=np.int64) for term, positions in postings.items()}
+        self.prices = IntervalTree(starts, ends, np.arange(count))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def match(self, price, terms, owner_id):
+        """Ids of the searches matched by a listing, never the searches of its own owner."""
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+        matched = np.zeros(len(self), dtype=bool)
+        matched[self.prices.stab(float(price))] = True
+        hits = [self.postings[term] for term in terms if term in self.postings]
+        found = np.bincount(np.concatenate(hits), minlength=len(self)) if hits else 0
+        matched &= found == self.keyword_counts
+        matched &= (self.owners == -1) | (self.owners == owner_id)
+        matched &= self.users != owner_id
+        return self.ids[matched]
+
+
+def load_index():
+    rows = SavedSearch.objects.filter(active=True).order_by().values_list(
+        "id", "user_id", "min_price", "max_price", "keywords", "owner_id"
+    )
+    return SavedSearchIndex(list(rows.iterator(chunk_size=10_000)))
+
+
+class SavedSearchMatcher:
+    """
+    Process wide index, rebuilt when the saved searches changed.
+
+    Checking for changes is one aggregate query, done at most every
+    ``REFRESH_SECONDS``. Saved searches change far less often than listings
+    are created, so a rebuild is cheaper than maintaining the tree.
+    """
+
+    def __init__(self, refresh_seconds=10):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._checked_at = 0
+
+    def index(self):
+        with self._lock:
+            if self._index is None or time.monotonic() - self._checked_at >= self.refresh_seconds:
+                version = tuple(SavedSearch.objects.aggregate(modified=Max("modified"), count=Count("id")).values())
+                if version != self._version:
+                    self._index, self._version = load_index(), version
+                self._checked_at = time.monotonic()
+            return self._index
+
+    def match(self, listing):
+        return self.index().match(
+            listing.price, listing_terms(listing.description, listing.address), listing.created_by_id
+        )
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = SavedSearchMatcher(refresh_seconds=alerts_setting("REFRESH_SECONDS", 10))
+    return _matcher
+
+
+def match_listings(listing_ids):
+    """Store an alert for every saved search matched by the listings, return the ids of the alerts inserted."""
+    matcher = get_matcher()
+    alerts = []
+    for listing in RealEstateItem.objects.filter(id__in=listing_ids).only(
+        "id", "price", "description", "address", "created_by_id"
+    ):
+        alerts += [SearchAlert(saved_search_id=pk, listing_id=listing.id) for pk in matcher.match(listing).tolist()]
+    if not alerts:
+        return []
+    batch = SearchAlert.objects.filter(listing_id__in=listing_ids)
+    # Alerts of an earlier run over the same listings are delivered by that run.
+    existing = set(batch.values_list("saved_search_id", "listing_id"))
+    SearchAlert.objects.bulk_create(alerts, batch_size=1000, ignore_conflicts=True)
+    # ignore_conflicts leaves the ids unset, read back the alerts of this batch.
+    new = {(alert.saved_search_id, alert.listing_id) for alert in alerts} - existing
+    return [pk for pk, *pair in batch.values_list("id", "saved_search_id", "listing_id") if tuple(pair) in new]
+
+
+class BaseNotifier:
+    """Tell users about their alerts, ``alerts`` are ``SearchAlert`` with search, user and listing loaded."""
+
+    def send(self, alerts):
+        raise NotImplementedError
+
+
+class LogNotifier(BaseNotifier):
+    def send(self, alerts):
+        for alert in alerts:
+            logger.info(
+                "Saved search %s of user %s matched listing %s",
+                alert.saved_search_id, alert.saved_search.user_id, alert.listing_id,
+            )
+
+
+class EmailNotifier(BaseNotifier):
+    """One email per user listing the new matches, sent over a single connection."""
+
+    def send(self, alerts):
+        by_user = defaultdict(list)
+        for alert in alerts:
+            by_user[alert.saved_search.user].append(alert)
+        messages = []
+        for user, user_alerts in by_user.items():
+            lines = [
+                f"{alert.saved_search.name or 'Saved search'}: {alert.listing.address} "
+                f"({alert.listing.price}) listing {alert.listing_id}"
+                for alert in user_alerts
+            ]
+            messages.append(
+                (f"{len(user_alerts)} new listings match your saved searches", "\n".join(lines), None, [user.email])
+            )
+        send_mass_mail(messages)
+
+
+def get_notifier():
+    return import_string(alerts_setting("BACKEND", "real_estate_listing.alerts.LogNotifier"))()
+
+
+def claim_alerts(alert_ids):
+    """
+    Claim the undelivered alerts among ``alert_ids`` with a conditional UPDATE, return the claim token.
+
+    A claim lasts as long as an outbox lease: the alerts of a worker that died
+    while sending are claimed again when the outbox runs the task again.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    SearchAlert.objects.filter(
+        Q(claimed_by="") | Q(claim_expires__lt=now), id__in=alert_ids, delivered_at__isnull=True
+    ).update(claimed_by=token, claim_expires=now + timedelta(seconds=outbox_setting("LEASE_SECONDS")))
+    return token
+
+
+def deliver_alerts(alert_ids):
+    """Notify the users of the undelivered alerts this call could claim and mark them delivered."""
+    token = claim_alerts(alert_ids)
+    claimed = SearchAlert.objects.filter(id__in=alert_ids, claimed_by=token)
+    alerts = list(claimed.select_related("saved_search__user", "listing"))
+    if not alerts:
+        return 0
+    try:
+        get_notifier().send(alerts)
+    except Exception:
+        # Released for the retry of the outbox task.
+        claimed.update(claimed_by="", claim_expires=None)
+        raise
+    claimed.update(delivered_at=timezone.now(), claimed_by="", claim_expires=None)
+    return len(alerts)
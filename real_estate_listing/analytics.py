@@ -0,0 +1,302 @@
+"""
+Columnar, memory-mapped snapshot of the listings for analytics queries.
+
+``refresh_snapshot`` stores one ``.npy`` file per column (id, owner id, price
+in cents, created) sorted by id, in a new generation directory, then points
+``current.json`` at it. ``ListingSnapshot`` opens the files with
+``mmap_mode="r"``, so every worker process maps the same pages of the page
+cache instead of holding its own copy, and answers filter/group-by/aggregate
+queries with vectorized NumPy. Timestamps and months are UTC.
+
+Each generation records the change feed version it was read at, an
+incremental refresh only reads the listings and tombstones versioned after
+it (see ``real_estate_listing.changes``).
+"""
+import fcntl
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ChangeSequence, ListingTombstone, RealEstateItem
+from .stats import histogram_edges
+
+COLUMNS = ("id", "owner", "price_cents", "created")
+GROUP_KEYS = ("owner", "month", "band")
+POINTER = "current.json"
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def snapshot_setting(name, default):
+    return getattr(settings, "LISTING_SNAPSHOT", {}).get(name, default)
+
+
+def snapshot_path():
+    return Path(snapshot_setting("PATH", settings.BASE_DIR / "snapshots"))
+
+
+def read_pointer(path):
+    try:
+        return json.loads((path / POINTER).read_text())
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def refresh_lock(path):
+    """Serialize writers, readers never wait for it."""
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / "refresh.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def to_datetime64(value):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return np.datetime64((value - EPOCH) // timedelta(microseconds=1), "us")
+
+
+def empty_columns():
+    return {
+        "id": np.empty(0, dtype=np.int64),
+        "owner": np.empty(0, dtype=np.int64),
+        "price_cents": np.empty(0, dtype=np.int64),
+        "created": np.empty(0, dtype="datetime64[us]"),
+    }
+
+
+def read_columns(queryset, chunk_size=50_000):
+    """Read the rows of ``queryset`` into column arrays, ``chunk_size`` rows at a time."""
+    chunks = {name: [] for name in COLUMNS}
+    rows = queryset.order_by().values_list("id", "created_by_id", "price", "created").iterator(chunk_size=chunk_size)
+    while True:
+        batch = [row for _, row in zip(range(chunk_size), rows)]
+        if not batch:
+            break
+        ids, owners, prices, created = zip(*batch)
+        chunks["id"].append(np.array(ids, dtype=np.int64))
+        chunks["owner"].append(np.array(owners, dtype=np.int64))
+        chunks["price_cents"].append(np.array([int(price * 100) for price in prices], dtype=np.int64))
+        chunks["created"].append(np.array([to_datetime64(value) for value in created], dtype="datetime64[us]"))
+    columns = empty_columns()
+    for name, arrays in chunks.items():
+        if arrays:
+            columns[name] = np.concatenate(arrays)
+    return columns
+
+
+def load_columns(directory, rows):
+    # An empty file cannot be memory mapped.
+    mmap_mode = "r" if rows else None
+    return {name: np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in COLUMNS}
+
+
+def write_generation(path, pointer, columns, version):
+    generation = pointer["generation"] + 1 if pointer else 1
+    directory = path / f"generation-{generation}"
+    if directory.exists():
+        shutil.rmtree(directory)
+    directory.mkdir()
+    for name in COLUMNS:
+        np.save(directory / f"{name}.npy", np.ascontiguousarray(columns[name]))
+    new_pointer = {
+        "generation": generation,
+        "directory": directory.name,
+        "rows": len(columns["id"]),
+        "version": version,
+    }
+    tmp = path / f"{POINTER}.tmp"
+    tmp.write_text(json.dumps(new_pointer))
+    os.replace(tmp, path / POINTER)
+    # Readers that opened the previous generation keep using it until they reopen.
+    for old in path.glob("generation-*"):
+        if old.name not in (directory.name, pointer and pointer["directory"]):
+            shutil.rmtree(old, ignore_errors=True)
+    return new_pointer
+
+
+def refresh_snapshot(full=False, path=None, chunk_size=50_000):
+    """
+    Write a new generation of the snapshot and return a summary of the refresh.
+
+    An incremental refresh reads the listings and tombstones versioned
+    since the previous generation, so its cost follows the number of
+    changes rather than the size of the table. It falls back to a full
+    read when tombstones it has not seen were compacted away.
+    """
+    path = path or snapshot_path()
+    with refresh_lock(path):
+        pointer = read_pointer(path)
+        # Read first: rows versioned while reading are read again next time.
+        version, compacted_through = (
+            ChangeSequence.objects.filter(pk=1).values_list("value", "compacted_through").first() or (0, 0)
+        )
+        previous = pointer and pointer.get("version")
+        if full or previous is None or previous < compacted_through:
+            columns = read_columns(RealEstateItem.objects.all(), chunk_size)
+            changed, removed = len(columns["id"]), 0
+        else:
+            current = load_columns(path / pointer["directory"], pointer["rows"])
+            updates = read_columns(RealEstateItem.objects.filter(change_version__gt=previous), chunk_size)
+            deleted = np.fromiter(
+                ListingTombstone.objects.filter(change_version__gt=previous)
+                .order_by()
+                .values_list("listing_id", flat=True)
+                .iterator(chunk_size=chunk_size),
+                dtype=np.int64,
+            )
+            gone = np.isin(current["id"], deleted)
+            keep = ~gone & ~np.isin(current["id"], updates["id"])
+            columns = {name: np.concatenate([current[name][keep], updates[name]]) for name in COLUMNS}
+            order = np.argsort(columns["id"], kind="stable")
+            columns = {name: column[order] for name, column in columns.items()}
+            changed, removed = len(updates["id"]), int(gone.sum())
+        pointer = write_generation(path, pointer, columns, version)
+    return {"generation": pointer["generation"], "rows": pointer["rows"], "changed": changed, "removed": removed}
+
+
+def cents(value):
+    return Decimal(int(value)).scaleb(-2)
+
+
+class ListingSnapshot:
+    """Read-only view of one generation of the snapshot."""
+
+    def __init__(self, path, pointer):
+        self.generation = pointer["generation"]
+        self.version = pointer.get("version")
+        self.columns = load_columns(path / pointer["directory"], pointer["rows"])
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def mask(self, owner=None, created_from=None, created_to=None, price_min=None, price_max=None):
+        """Rows matching every given filter, ``created_to`` and ``price_max`` are exclusive."""
+        columns = self.columns
+        mask = np.ones(len(self), dtype=bool)
+        if owner is not None:
+            mask &= np.isin(columns["owner"], np.atleast_1d(np.asarray(owner, dtype=np.int64)))
+        if created_from is not None:
+            mask &= columns["created"] >= to_datetime64(created_from)
+        if created_to is not None:
+            mask &= columns["created"] < to_datetime64(created_to)
+        if price_min is not None:
+            mask &= columns["price_cents"] >= int(Decimal(price_min) * 100)
+        if price_max is not None:
+            mask &= columns["price_cents"] < int(Decimal(price_max) * 100)
+        return mask
+
+    def group_key(self, name, mask, edges):
+        if name == "owner":
+            return self.columns["owner"][mask]
+        if name == "month":
+            return self.columns["created"][mask].astype("datetime64[M]").astype(np.int64)
+        if name == "band":
+            edges_cents = np.asarray([int(Decimal(edge) * 100) for edge in edges], dtype=np.int64)
+            return np.searchsorted(edges_cents, self.columns["price_cents"][mask], side="right") - 1
+        raise ValueError(f"Cannot group by {name!r}, choose from {', '.join(GROUP_KEYS)}")
+
+    @staticmethod
+    def key_value(name, value, edges):
+        if name == "month":
+            return str(np.datetime64(int(value), "M"))
+        if name == "band":
+            # Prices below the first edge fall in band -1.
+            return edges[value] if value >= 0 else None
+        return int(value)
+
+    def aggregate(self, group_by=(), edges=None, **filters):
+        """
+        Count, total, min, max and mean price of the matching rows per group.
+
+        ``group_by`` names any of ``owner``, ``month`` (``YYYY-MM`` of
+        created) and ``band`` (lower edge of the price band in ``edges``,
+        by default ``PRICE_HISTOGRAM_EDGES``). Groups come sorted by key.
+        """
+        edges = list(edges if edges is not None else histogram_edges())
+        mask = self.mask(**filters)
+        prices = self.columns["price_cents"][mask]
+        if not group_by:
+            return [self.summary(prices)] if len(prices) else []
+        keys = [self.group_key(name, mask, edges) for name in group_by]
+        order = np.lexsort(keys[::-1])
+        keys = [key[order] for key in keys]
+        prices = prices[order]
+        if not len(prices):
+            return []
+        changes = np.zeros(len(prices), dtype=bool)
+        changes[0] = True
+        for key in keys:
+            changes[1:] |= key[1:] != key[:-1]
+        starts = np.flatnonzero(changes)
+        counts = np.diff(np.append(starts, len(prices)))
+        totals = np.add.reduceat(prices, starts)
+        minimums = np.minimum.reduceat(prices, starts)
+        maximums = np.maximum.reduceat(prices, starts)
+        return [
+            {
+                **{name: self.key_value(name, key[start], edges) for name, key in zip(group_by, keys)},
+                "count": int(count),
+                "total": cents(total),
+                "min": cents(minimum),
+                "max": cents(maximum),
+                "mean": round(float(total) / count / 100, 2),
+            }
+            for start, count, total, minimum, maximum in zip(starts, counts, totals, minimums, maximums)
+        ]
+
+    @staticmethod
+    def summary(prices):
+        total = int(prices.sum())
+        return {
+            "count": len(prices),
+            "total": cents(total),
+            "min": cents(prices.min()),
+            "max": cents(prices.max()),
+            "mean": round(total / len(prices) / 100, 2),
+        }
+
+    def price_per_owner(self, **filters):
+        return self.aggregate(("owner",), **filters)
+
+    def price_bands_by_month(self, edges=None, **filters):
+        return self.aggregate(("month", "band"), edges=edges, **filters)
+
+
+_snapshot = None
+_snapshot_stat = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """
+    The current snapshot of this process, ``None`` before the first refresh.
+
+    Reopened when ``current.json`` changes, which is a ``stat()`` per call.
+    """
+    global _snapshot, _snapshot_stat
+    path = snapshot_path()
+    try:
+        stat = (path / POINTER).stat()
+    except FileNotFoundError:
+        return None
+    stat = (stat.st_ino, stat.st_mtime_ns)
+    with _snapshot_lock:
+        if _snapshot is None or stat != _snapshot_stat:
+            pointer = read_pointer(path)
+            if pointer is None:
+                return None
+            _snapshot, _snapshot_stat = ListingSnapshot(path, pointer), stat
+        return _snapshot
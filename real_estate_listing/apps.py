@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RealEstateListingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "real_estate_listing"
+
+    def ready(self):
+        import real_estate_listing.signals
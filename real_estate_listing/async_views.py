@@ -0,0 +1,85 @@
+"""
+Native async read endpoints for listings.
+
+Served under ASGI these run on the event loop with the async ORM instead of
+being pushed through a thread for every request. Responses, ETags and
+cursors are the same as the ones of the DRF views.
+"""
+from django.db.models import Count, Max
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+
+from user_listing_proj.fast_serialization import ValuesSerializer, fast_json_response, fast_serialization_enabled
+from user_listing_proj.responses import json_response
+from users.authentication import async_jwt_authenticated
+
+from . import caching
+from .geo import LOCATION_ERROR, filter_location
+from .models import RealEstateItem
+from .pagination import ListingCursorPagination
+from .serializers import RealEstateItemSerializer
+from .views import RUDRealEstateItemViewSet
+
+
+@async_jwt_authenticated
+async def listing_list(request):
+    """The user's listings, a cursor page at a time when asked for, see ``LCRealEstateItemViewSet.get``."""
+    # Query parameter parsing and links of the DRF request, the user is set by the decorator.
+    drf_request = Request(request)
+    if ListingCursorPagination.page_number_query_param in drf_request.query_params:
+        return json_response({"errors": ["Use cursor pagination on this endpoint"]}, status=400)
+    queryset = RealEstateItem.objects.filter(created_by=request.user.id)
+    try:
+        queryset = filter_location(queryset, drf_request.query_params)
+    except ValueError:
+        return json_response({"errors": [LOCATION_ERROR]}, status=400)
+
+    state = await queryset.aaggregate(last_modified=Max("modified"), count=Count("id"))
+    etag = caching.make_etag(
+        "listings", request.user.id, state["last_modified"], state["count"], drf_request.query_params.urlencode()
+    )
+    not_modified = caching.conditional_response(request, etag)
+    if not_modified is not None:
+        return not_modified
+    # Shares the cache of the sync view, through the async cache API so a cache
+    # backend doing network I/O does not block the event loop.
+    key = await caching.alist_key(request.user.id, drf_request.query_params)
+    data = await caching.acached_data(key, etag)
+    if data is not None:
+        return caching.set_validators(json_response(data), etag)
+
+    paginator = ListingCursorPagination()
+    fast = ValuesSerializer.for_serializer(RealEstateItemSerializer) if fast_serialization_enabled() else None
+    rows = fast.rows(queryset) if fast else queryset
+    paginated = paginator.paginates(drf_request)
+    if paginated:
+        try:
+            page = await paginator.apaginate_queryset(rows, drf_request)
+        except NotFound as e:
+            return json_response({"detail": e.detail}, status=404)
+    else:
+        page = [row async for row in rows]
+    if fast:
+        results, orjson_safe = fast.serialize(page)
+    else:
+        results = RealEstateItemSerializer(page, many=True).data
+    data = results
+    if paginated:
+        data = {"next": paginator.get_next_link(), "previous": paginator.get_previous_link(), "results": results}
+    await caching.acache_response(key, etag, None, data)
+    response = fast_json_response(data, orjson_safe) if fast else json_response(data)
+    return caching.set_validators(response, etag)
+
+
+@async_jwt_authenticated
+async def listing_detail(request, pk):
+    """One listing, answering conditional requests before serializing it."""
+    item = await RealEstateItem.objects.filter(pk=pk).afirst()
+    if item is None:
+        return json_response({"detail": "Not found."}, status=404)
+    etag, last_modified = RUDRealEstateItemViewSet.validators(item.pk, item.modified)
+    not_modified = caching.conditional_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    data = RealEstateItemSerializer(item).data
+    return caching.set_validators(json_response(data), etag, last_modified)
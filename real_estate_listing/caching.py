@@ -0,0 +1,123 @@
+"""
+Conditional GET validators and cached responses for the listing endpoints.
+
+A cached response is only served when its ETag matches the one computed
+from the database for the request, one indexed aggregate query. The cache
+may be per process and writes may bypass the invalidation signals
+(``QuerySet.update``, ``bulk_update``), a stale entry is then simply not
+used. Invalidation keeps the entries of changed owners from piling up.
+The ``a``-prefixed helpers use the async cache API, for the async views.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+DEFAULT_TIMEOUT = 300
+
+
+def listing_cache_setting(name, default):
+    return getattr(settings, "LISTING_CACHE", {}).get(name, default)
+
+
+def get_cache():
+    return caches[listing_cache_setting("CACHE_ALIAS", "default")]
+
+
+def make_etag(*parts):
+    digest = hashlib.md5("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return quote_etag(digest)
+
+
+def detail_key(pk):
+    return f"listings:detail:{pk}"
+
+
+def generation_key(owner_id):
+    return f"listings:generation:{owner_id}"
+
+
+def owner_generation(owner_id):
+    """
+    Return the version of an owner's cached lists.
+
+    Generations are timestamps rather than counters so that a generation key
+    evicted from the cache never comes back with a value that old entries
+    were stored under.
+    """
+    return get_cache().get_or_set(generation_key(owner_id), time.time_ns, timeout=None)
+
+
+async def aowner_generation(owner_id):
+    return await get_cache().aget_or_set(generation_key(owner_id), time.time_ns, timeout=None)
+
+
+def params_digest(params):
+    query = "&".join(f"{name}={value}" for name, value in sorted(params.lists()))
+    return hashlib.md5(query.encode("utf-8")).hexdigest()
+
+
+def list_key(owner_id, params):
+    return f"listings:list:{owner_id}:{owner_generation(owner_id)}:{params_digest(params)}"
+
+
+async def alist_key(owner_id, params):
+    return f"listings:list:{owner_id}:{await aowner_generation(owner_id)}:{params_digest(params)}"
+
+
+def invalidate_listing(pk, *owner_ids):
+    """Drop the cached detail of a listing and every cached list of its owners."""
+    cache = get_cache()
+    cache.delete(detail_key(pk))
+    invalidate_owners(*owner_ids)
+
+
+def invalidate_owners(*owner_ids):
+    generation = time.time_ns()
+    get_cache().set_many({generation_key(owner_id): generation for owner_id in set(owner_ids)}, timeout=None)
+
+
+def cache_response(key, etag, last_modified, data):
+    get_cache().set(key, (etag, last_modified, data), listing_cache_setting("TIMEOUT", DEFAULT_TIMEOUT))
+
+
+async def acache_response(key, etag, last_modified, data):
+    await get_cache().aset(key, (etag, last_modified, data), listing_cache_setting("TIMEOUT", DEFAULT_TIMEOUT))
+
+
+def cached_data(key, etag):
+    """Return the data stored under ``key`` if it was stored for ``etag``, ``None`` otherwise."""
+    return entry_data(get_cache().get(key), etag)
+
+
+async def acached_data(key, etag):
+    return entry_data(await get_cache().aget(key), etag)
+
+
+def entry_data(cached, etag):
+    if cached is None or cached[0] != etag:
+        return None
+    return cached[2]
+
+
+def conditional_response(request, etag, last_modified=None):
+    """Return a 304 (or 412) response when the request preconditions say so, ``None`` otherwise."""
+    request = getattr(request, "_request", request)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if isinstance(response, HttpResponseNotModified):
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    # Listings are per user, shared caches must not hand them to someone else.
+    response["Cache-Control"] = "private, no-cache"
+    patch_vary_headers(response, ("Authorization",))
+    return response
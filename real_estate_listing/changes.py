@@ -0,0 +1,166 @@
+"""
+Incremental change feed of a user's listings.
+
+Every save clears ``change_version`` of the listing, deletes leave a
+``ListingTombstone`` without one. Once the writing transaction committed,
+``stamp_changes`` gives the rows that are committed without a version the
+next value of ``ChangeSequence``, so versions follow the order in which
+writes became visible: a row committing after a version was handed out gets
+a larger one, however long its transaction ran. Rows of a process that died
+before stamping are stamped with the next write. Reading the feed never
+writes, rows are returned once they are stamped.
+
+A cursor holds two keyset positions: ``(change_version, id)`` in the
+listings and in the tombstones, read with the ``(created_by,
+change_version, id)`` and ``(owner_id, change_version, id)`` indexes.
+Pages stop at the current sequence value, the rows versioned later are
+returned by the next poll.
+"""
+import base64
+import binascii
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ChangeSequence, ListingTombstone, RealEstateItem
+
+CURSOR_VERSION = "2"
+# Keyset id past every row of a version, positions of caught-up cursors.
+LAST_ID = 2**63 - 1
+
+ChangeCursor = namedtuple("ChangeCursor", ["version", "pk", "tombstone_version", "tombstone_id"])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorExpired(ValueError):
+    """The cursor is older than the tombstones, the client has to sync from scratch."""
+
+
+def change_feed_setting(name, default):
+    return getattr(settings, "CHANGE_FEED", {}).get(name, default)
+
+
+def tombstone_retention():
+    return timedelta(days=change_feed_setting("TOMBSTONE_RETENTION_DAYS", 30))
+
+
+def encode_cursor(cursor):
+    raw = "|".join((CURSOR_VERSION, *map(str, cursor)))
+    return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii")
+
+
+def decode_cursor(encoded):
+    try:
+        version, *positions = base64.urlsafe_b64decode(encoded.encode("ascii")).decode("ascii").split("|")
+    except (TypeError, ValueError, UnicodeError, binascii.Error):
+        raise InvalidCursor("Invalid cursor")
+    if version == "1":
+        # Timestamp cursors of the first feed, their positions cannot be translated.
+        raise CursorExpired("The cursor is too old, sync again without since")
+    try:
+        if version != CURSOR_VERSION:
+            raise ValueError(version)
+        cursor = ChangeCursor(*map(int, positions))
+    except (TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor")
+    if min(cursor) < 0:
+        raise InvalidCursor("Invalid cursor")
+    return cursor
+
+
+def after(queryset, version, pk):
+    # The redundant >= bound gives the planner an index range to start from.
+    return queryset.filter(
+        Q(change_version__gt=version) | Q(change_version=version, id__gt=pk), change_version__gte=version
+    )
+
+
+def stamp_changes(using=None):
+    """Give the committed rows without a change version the next one, return it, ``None`` when there were none."""
+    using = using or router.db_for_write(RealEstateItem)
+    listings = RealEstateItem.objects.using(using).filter(change_version__isnull=True)
+    tombstones = ListingTombstone.objects.using(using).filter(change_version__isnull=True)
+    if not listings.exists() and not tombstones.exists():
+        return None
+    with transaction.atomic(using=using):
+        # Writing first takes the write lock, concurrent stampers run one after the other.
+        sequences = ChangeSequence.objects.using(using)
+        if not sequences.filter(pk=1).update(value=F("value") + 1):
+            sequences.create(pk=1, value=1)
+        version = sequences.values_list("value", flat=True).get(pk=1)
+        listings.update(change_version=version)
+        tombstones.update(change_version=version)
+    return version
+
+
+def changes_since(owner_id, cursor=None, page_size=100):
+    """
+    Return ``(changed listings, deleted listing ids, next cursor, has_more)``.
+
+    Without a cursor every listing is returned, and the deletes are followed
+    from the start of that first sync on.
+    """
+    using = router.db_for_read(RealEstateItem)
+    # Read first: rows versioned after it are left to the next poll, whatever the queries below see.
+    current, compacted_through = (
+        ChangeSequence.objects.using(using).filter(pk=1).values_list("value", "compacted_through").first() or (0, 0)
+    )
+    if cursor is None:
+        cursor = ChangeCursor(0, 0, current, LAST_ID)
+    elif (cursor.tombstone_version, cursor.tombstone_id) < (compacted_through, LAST_ID):
+        raise CursorExpired("The cursor is too old, sync again without since")
+
+    listings = after(
+        RealEstateItem.objects.using(using).filter(created_by=owner_id, change_version__lte=current),
+        cursor.version,
+        cursor.pk,
+    )
+    changed = list(listings.order_by("change_version", "id")[: page_size + 1])
+    tombstones = after(
+        ListingTombstone.objects.using(using).filter(owner_id=owner_id, change_version__lte=current),
+        cursor.tombstone_version,
+        cursor.tombstone_id,
+    )
+    deleted = list(
+        tombstones.order_by("change_version", "id").values_list("change_version", "id", "listing_id")[: page_size + 1]
+    )
+    has_more = len(changed) > page_size or len(deleted) > page_size
+    changed, deleted = changed[:page_size], deleted[:page_size]
+
+    version, pk = (changed[-1].change_version, changed[-1].id) if changed else cursor[:2]
+    tombstone_version, tombstone_id = deleted[-1][:2] if deleted else cursor[2:]
+    if not has_more:
+        # Caught up: move both positions to the current version so idle clients keep a recent cursor.
+        version, pk = max((version, pk), (current, LAST_ID))
+        tombstone_version, tombstone_id = max((tombstone_version, tombstone_id), (current, LAST_ID))
+    next_cursor = ChangeCursor(version, pk, tombstone_version, tombstone_id)
+    return changed, [listing_id for _, _, listing_id in deleted], next_cursor, has_more
+
+
+def record_tombstone(listing):
+    return ListingTombstone.objects.create(
+        listing_id=listing.pk, owner_id=listing.created_by_id, deleted_at=timezone.now()
+    )
+
+
+def compact_tombstones(retention=None, batch_size=10_000):
+    """Delete the tombstones older than the retention, in batches, return how many were deleted."""
+    cutoff = timezone.now() - (retention or tombstone_retention())
+    expired = ListingTombstone.objects.filter(deleted_at__lt=cutoff, change_version__isnull=False)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(expired.values_list("id", "change_version")[:batch_size])
+            if not batch:
+                return deleted
+            # Cursors that did not get past the newest removed version would miss deletes, they expire.
+            newest = max(version for _, version in batch)
+            ChangeSequence.objects.filter(pk=1, compacted_through__lt=newest).update(compacted_through=newest)
+            deleted += ListingTombstone.objects.filter(id__in=[pk for pk, _ in batch]).delete()[0]
@@ -0,0 +1,213 @@
+"""
+Near-duplicate listing detection with MinHash and banded LSH.
+
+The text of a listing (normalized address and description) is cut into word
+shingles and summarized by a ``NUM_PERM`` value MinHash signature, stored in
+``ListingSignature``. The signature is split into ``BANDS`` bands, each
+band hashed to one ``LSHBucket`` row, so listings sharing a band are found
+with an indexed ``bucket IN (...)`` lookup instead of a table scan. Candidates
+are kept when the signatures estimate a Jaccard similarity of at least
+``THRESHOLD``.
+"""
+import hashlib
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .geo import normalize_address
+from .models import ListingSignature, LSHBucket
+from .search import query_terms
+
+
+def dedup_setting(name, default):
+    return getattr(settings, "DEDUP", {}).get(name, default)
+
+
+def shingles(description, address, size=3):
+    """Word ``size``-grams of the listing text, the whole text when it is shorter."""
+    terms = query_terms(f"{normalize_address(address or '')} {description or ''}")
+    if len(terms) <= size:
+        return {" ".join(terms)} if terms else set()
+    return {" ".join(terms[i:i + size]) for i in range(len(terms) - size + 1)}
+
+
+class MinHashLSH:
+    def __init__(self, num_perm=128, bands=32, threshold=0.7, shingle_size=3, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        # Fixed seed: signatures stored by one process must be comparable in every other.
+        generator = np.random.default_rng(seed)
+        self.a = generator.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self.b = generator.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64, endpoint=True)
+
+    def signature(self, description, address):
+        """MinHash signature as ``uint32`` array, ``None`` for listings without text."""
+        grams = shingles(description, address, self.shingle_size)
+        if not grams:
+            return None
+        hashes = np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+        # Multiply-shift hashing: (a * hash + b) mod 2**64, keeping the high 32 bits.
+        permuted = (np.outer(hashes, self.a) + self.b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def buckets(self, signature):
+        """One bucket per band, the band number is part of the hash."""
+        return [
+            int.from_bytes(
+                hashlib.blake2b(
+                    band.to_bytes(2, "little") + signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                    digest_size=8,
+                ).digest(),
+                "little",
+                signed=True,
+            )
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(signature, others):
+        """Estimated Jaccard similarity between ``signature`` and each row of ``others``."""
+        return (others == signature).mean(axis=-1)
+
+    @staticmethod
+    def load(data):
+        return np.frombuffer(bytes(data), dtype=np.uint32)
+
+    def index(self, items):
+        """Store the signatures and buckets of ``items``, replacing the ones they had."""
+        signatures, buckets = [], []
+        for item in items:
+            signature = self.signature(item.description, item.address)
+            if signature is None:
+                continue
+            signatures.append(ListingSignature(listing_id=item.pk, signature=signature.tobytes()))
+            buckets += [LSHBucket(listing_id=item.pk, bucket=bucket) for bucket in self.buckets(signature)]
+        pks = [item.pk for item in items]
+        with transaction.atomic():
+            ListingSignature.objects.filter(listing_id__in=pks).delete()
+            LSHBucket.objects.filter(listing_id__in=pks).delete()
+            ListingSignature.objects.bulk_create(signatures)
+            LSHBucket.objects.bulk_create(buckets, batch_size=5000)
+        return len(signatures)
+
+    def candidates(self, description, address, exclude=None, limit=10):
+        """
+        Listings whose text is at least ``THRESHOLD`` similar, most similar first.
+
+        Returns ``[{"id": ..., "similarity": ...}]``, ``exclude`` is a listing
+        id to leave out, normally the listing being checked.
+        """
+        signature = self.signature(description, address)
+        if signature is None:
+            return []
+        ids = LSHBucket.objects.filter(bucket__in=self.buckets(signature)).values_list("listing_id", flat=True)
+        ids = set(ids) - {exclude}
+        if not ids:
+            return []
+        stored = list(ListingSignature.objects.filter(listing_id__in=ids).values_list("listing_id", "signature"))
+        others = np.stack([self.load(data) for _, data in stored])
+        similarities = self.similarity(signature, others)
+        matches = sorted(
+            ((float(value), pk) for (pk, _), value in zip(stored, similarities) if value >= self.threshold),
+            reverse=True,
+        )
+        return [{"id": pk, "similarity": round(value, 4)} for value, pk in matches[:limit]]
+
+
+_lsh = None
+
+
+def get_lsh():
+    global _lsh
+    if _lsh is None:
+        _lsh = MinHashLSH(
+            num_perm=dedup_setting("NUM_PERM", 128),
+            bands=dedup_setting("BANDS", 32),
+            threshold=dedup_setting("THRESHOLD", 0.7),
+            shingle_size=dedup_setting("SHINGLE_SIZE", 3),
+            seed=dedup_setting("SEED", 1),
+        )
+    return _lsh
+
+
+def find_duplicates(item, limit=10):
+    return get_lsh().candidates(item.description, item.address, exclude=item.pk, limit=limit)
+
+
+class DisjointSet:
+    def __init__(self):
+        self.parents = {}
+
+    def find(self, value):
+        root = self.parents.setdefault(value, value)
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while value != root:
+            parent = self.parents[value]
+            self.parents[value] = root
+            value = parent
+        return root
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parents[max(first, second)] = min(first, second)
+
+
+def cluster_duplicates(max_bucket_size=1000, chunk_size=50_000):
+    """
+    Group every indexed listing with its near duplicates.
+
+    Reads the buckets in bucket order, verifies the pairs of every bucket
+    with the signatures and returns the clusters of two or more listings as
+    sorted id lists, plus the number of buckets skipped for holding more than
+    ``max_bucket_size`` listings (boilerplate text that would make the pair
+    count quadratic).
+    """
+    lsh = get_lsh()
+    rows = ListingSignature.objects.order_by("listing_id").values_list("listing_id", "signature")
+    ids, signatures = [], []
+    for pk, data in rows.iterator(chunk_size=chunk_size):
+        ids.append(pk)
+        signatures.append(lsh.load(data))
+    if not ids:
+        return [], 0
+    positions = {pk: position for position, pk in enumerate(ids)}
+    matrix = np.stack(signatures)
+
+    clusters, skipped = DisjointSet(), 0
+
+    def verify(members):
+        nonlocal skipped
+        if len(members) > max_bucket_size:
+            skipped += 1
+            return
+        members = [positions[pk] for pk in members if pk in positions]
+        for index, first in enumerate(members[:-1]):
+            others = np.array(members[index + 1:])
+            similar = others[lsh.similarity(matrix[first], matrix[others]) >= lsh.threshold]
+            for second in similar:
+                clusters.union(ids[first], ids[second])
+
+    buckets = LSHBucket.objects.order_by("bucket").values_list("bucket", "listing_id")
+    current, members = None, []
+    for bucket, pk in buckets.iterator(chunk_size=chunk_size):
+        if bucket != current:
+            if len(members) > 1:
+                verify(members)
+            current, members = bucket, []
+        members.append(pk)
+    if len(members) > 1:
+        verify(members)
+
+    groups = {}
+    for pk in clusters.parents:
+        groups.setdefault(clusters.find(pk), []).append(pk)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1), skipped
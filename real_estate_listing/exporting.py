@@ -0,0 +1,95 @@
+"""Constant memory CSV/NDJSON export of listings."""
+import csv
+import io
+import zlib
+from datetime import timezone as dt_timezone
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from user_listing_proj.streaming import ndjson_chunks
+
+from .models import RealEstateItem
+
+FORMATS = ("csv", "ndjson")
+
+EXPORT_COLUMNS = [
+    ("id", "id"),
+    ("created", "created"),
+    ("modified", "modified"),
+    ("description", "description"),
+    ("address", "address"),
+    ("price", "price"),
+    ("created_by", "created_by_id"),
+    ("owner_email", "created_by__email"),
+    ("latitude", "latitude"),
+    ("longitude", "longitude"),
+]
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 datetime filter, naive ones are UTC. ``None`` if it is not a datetime."""
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def export_rows(owner=None, created_after=None, created_before=None, min_price=None, max_price=None, chunk_size=2000):
+    """Yield listing tuples in id order, fetched ``chunk_size`` rows at a time."""
+    queryset = RealEstateItem.objects.all()
+    if owner is not None:
+        queryset = queryset.filter(created_by=owner)
+    if created_after is not None:
+        queryset = queryset.filter(created__gte=created_after)
+    if created_before is not None:
+        queryset = queryset.filter(created__lt=created_before)
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    fields = [field for _, field in EXPORT_COLUMNS]
+    return queryset.order_by("id").values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def _format_value(value):
+    """Format datetimes the way the API does (ISO 8601 with a Z suffix for UTC)."""
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+    return value
+
+
+def csv_chunks(rows, rows_per_chunk=500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_format_value(value) for value in row])
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def export_chunks(rows, data_format):
+    if data_format == "csv":
+        return csv_chunks(rows)
+    names = [name for name, _ in EXPORT_COLUMNS]
+    return ndjson_chunks({name: _format_value(value) for name, value in zip(names, row)} for row in rows)
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a byte stream on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,62 @@
+"""
+SQL of the SQLite FTS5 index over listing descriptions and addresses.
+
+The migrations and the search backend share these statements, so the module
+must not import models. SQLite runs ``ALTER TABLE`` on the listing table by
+copying it into a new table, which drops the triggers: migrations doing so
+call ``restore_triggers`` afterwards.
+"""
+FTS_TABLE = "real_estate_listing_fts"
+LISTING_TABLE = "real_estate_listing_realestateitem"
+
+CREATE_TABLE_SQL = f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        description, address,
+        content='{LISTING_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+TRIGGERS_SQL = {
+    f"{FTS_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {LISTING_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, description, address)
+            VALUES (new.id, new.description, new.address);
+        END
+    """,
+    f"{FTS_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {LISTING_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, address)
+            VALUES ('delete', old.id, old.description, old.address);
+        END
+    """,
+    f"{FTS_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, address ON {LISTING_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, address)
+            VALUES ('delete', old.id, old.description, old.address);
+            INSERT INTO {FTS_TABLE}(rowid, description, address)
+            VALUES (new.id, new.description, new.address);
+        END
+    """,
+}
+
+REBUILD_SQL = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+DROP_SQL = [*(f"DROP TRIGGER IF EXISTS {name}" for name in TRIGGERS_SQL), f"DROP TABLE IF EXISTS {FTS_TABLE}"]
+
+
+def run_on_sqlite(statements):
+    """Migration function running ``statements``, the FTS5 index only exists on SQLite."""
+
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+def restore_triggers():
+    """Migration function recreating the triggers after a table copy, and the index they missed."""
+    return run_on_sqlite([*TRIGGERS_SQL.values(), REBUILD_SQL])
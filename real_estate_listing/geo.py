@@ -0,0 +1,278 @@
+"""Address geocoding and geohash based spatial lookups for listings."""
+import csv
+import math
+import re
+import threading
+
+from cachetools import LRUCache
+from django.conf import settings
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import ExpressionWrapper
+from django.utils.module_loading import import_string
+
+from user_listing_proj.utils import prefix_range
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+MAX_QUERY_CELLS = 16
+MAX_RADIUS_KM = 1000.0
+
+LOCATION_ERROR = (
+    "bbox must be min_lat,min_lng,max_lat,max_lng and near must be lat,lng, with latitudes "
+    f"within -90..90, longitudes within -180..180 and radius_km above 0 and at most {MAX_RADIUS_KM:g}"
+)
+
+_NON_WORD_RE = re.compile(r"[^\w,]+", re.UNICODE)
+_COMMA_RE = re.compile(r"\s*,\s*")
+
+
+def normalize_address(address):
+    """Lowercase the address, drop punctuation except commas and collapse whitespace."""
+    address = _NON_WORD_RE.sub(" ", address.lower())
+    address = _COMMA_RE.sub(", ", address)
+    return " ".join(address.split()).strip(", ")
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, value = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision):
+    """Return the ``(height, width)`` in degrees of a geohash cell."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covering_cells(min_lat, min_lng, max_lat, max_lng):
+    """Return the geohash prefixes of the smallest cells that cover a bounding box with few cells."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        first_row = math.floor((min_lat + 90) / height)
+        last_row = math.floor((max_lat + 90) / height)
+        first_column = math.floor((min_lng + 180) / width)
+        last_column = math.floor((max_lng + 180) / width)
+        if (last_row - first_row + 1) * (last_column - first_column + 1) > MAX_QUERY_CELLS:
+            continue
+        return {
+            encode_geohash(
+                min((row + 0.5) * height - 90, 90.0),
+                min((column + 0.5) * width - 180, 180.0),
+                precision,
+            )
+            for row in range(first_row, last_row + 1)
+            for column in range(first_column, last_column + 1)
+        }
+    return {""}
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return ``(min_lat, min_lng, max_lat, max_lng)`` enclosing a circle."""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    lng_delta = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+    return (
+        max(latitude - lat_delta, -90.0),
+        max(longitude - lng_delta, -180.0),
+        min(latitude + lat_delta, 90.0),
+        min(longitude + lng_delta, 180.0),
+    )
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bbox_q(min_lat, min_lng, max_lat, max_lng):
+    """Filter for listings inside a bounding box, driven by the geohash index."""
+    cells = Q()
+    for cell in covering_cells(min_lat, min_lng, max_lat, max_lng):
+        if not cell:
+            cells = Q(geohash__gt="")
+            break
+        low, high = prefix_range(cell)
+        cells |= Q(geohash__gte=low, geohash__lt=high)
+    return cells & Q(
+        latitude__gte=min_lat, latitude__lte=max_lat, longitude__gte=min_lng, longitude__lte=max_lng
+    )
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Restrict ``queryset`` to listings within ``radius_km`` of a point.
+
+    The geohash cells of the enclosing box narrow the rows down, the distance
+    is then compared in SQL on an equirectangular projection around the
+    point, which stays within a fraction of a percent of the great circle
+    distance up to ``MAX_RADIUS_KM`` away from the poles.
+    """
+    scale = math.cos(math.radians(latitude))
+    radius_deg = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlat = F("latitude") - latitude
+    dlng = (F("longitude") - longitude) * scale
+    return (
+        queryset.filter(bbox_q(*bounding_box(latitude, longitude, radius_km)))
+        .alias(distance_sq=ExpressionWrapper(dlat * dlat + dlng * dlng, output_field=FloatField()))
+        .filter(distance_sq__lte=radius_deg * radius_deg)
+    )
+
+
+def parse_coordinates(value, count):
+    """Split ``value`` into ``count`` finite floats, raise ValueError otherwise."""
+    values = [float(part) for part in value.split(",")]
+    if len(values) != count or not all(map(math.isfinite, values)):
+        raise ValueError(value)
+    return values
+
+
+def check_point(latitude, longitude):
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError((latitude, longitude))
+
+
+def filter_location(queryset, params):
+    """
+    Apply ``?bbox=min_lat,min_lng,max_lat,max_lng`` or ``?near=lat,lng&radius_km=5``.
+    Raises ValueError on malformed or out of range coordinates, see ``LOCATION_ERROR``.
+    """
+    bbox = params.get("bbox")
+    if bbox:
+        min_lat, min_lng, max_lat, max_lng = parse_coordinates(bbox, 4)
+        check_point(min_lat, min_lng)
+        check_point(max_lat, max_lng)
+        if min_lat > max_lat or min_lng > max_lng:
+            raise ValueError(bbox)
+        queryset = queryset.filter(bbox_q(min_lat, min_lng, max_lat, max_lng))
+    near = params.get("near")
+    if near:
+        latitude, longitude = parse_coordinates(near, 2)
+        check_point(latitude, longitude)
+        (radius_km,) = parse_coordinates(params.get("radius_km", "5"), 1)
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValueError(radius_km)
+        queryset = within_radius(queryset, latitude, longitude, radius_km)
+    return queryset
+
+
+class BaseGeocoder:
+    """Resolve a normalized address to ``(latitude, longitude)`` or ``None``."""
+
+    def geocode(self, normalized_address):
+        raise NotImplementedError
+
+
+class GazetteerGeocoder(BaseGeocoder):
+    """
+    Offline geocoder backed by a CSV gazetteer with ``address,latitude,longitude`` rows.
+
+    Unknown addresses fall back to their trailing comma separated parts, so
+    ``12 park lane, lahore`` resolves to the ``lahore`` entry when the street
+    itself is not listed.
+    """
+
+    def __init__(self, path):
+        self.entries = {}
+        with open(path, newline="", encoding="utf-8") as handle:
+            for row in csv.DictReader(handle):
+                self.entries[normalize_address(row["address"])] = (
+                    float(row["latitude"]),
+                    float(row["longitude"]),
+                )
+
+    def geocode(self, normalized_address):
+        parts = normalized_address.split(", ")
+        for start in range(len(parts)):
+            location = self.entries.get(", ".join(parts[start:]))
+            if location is not None:
+                return location
+        return None
+
+
+class GeocodingService:
+    """Geocode addresses once: in-process LRU first, then the ``GeocodeCache`` table, then the geocoder."""
+
+    def __init__(self, geocoder, cache_size=10000):
+        self.geocoder = geocoder
+        self._memory = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+
+    def locate_many(self, addresses):
+        """Return a dict mapping each normalized address to its location or ``None``."""
+        from .models import GeocodeCache
+
+        wanted = {normalize_address(address) for address in addresses} - {""}
+        found = {}
+        with self._lock:
+            for normalized in wanted:
+                if normalized in self._memory:
+                    found[normalized] = self._memory[normalized]
+        missing = wanted - found.keys()
+        if missing:
+            for entry in GeocodeCache.objects.filter(normalized_address__in=missing):
+                found[entry.normalized_address] = (
+                    None if entry.latitude is None else (entry.latitude, entry.longitude)
+                )
+            new_entries = []
+            for normalized in missing - found.keys():
+                location = self.geocoder.geocode(normalized)
+                found[normalized] = location
+                latitude, longitude = location if location else (None, None)
+                new_entries.append(
+                    GeocodeCache(normalized_address=normalized, latitude=latitude, longitude=longitude)
+                )
+            GeocodeCache.objects.bulk_create(new_entries, ignore_conflicts=True)
+            with self._lock:
+                for normalized in missing:
+                    self._memory[normalized] = found[normalized]
+        return found
+
+    def locate(self, address):
+        return self.locate_many([address]).get(normalize_address(address))
+
+    def apply(self, *items):
+        """Set the coordinates and geohash of listings from their addresses."""
+        locations = self.locate_many(item.address for item in items)
+        for item in items:
+            location = locations.get(normalize_address(item.address))
+            if location is None:
+                item.latitude = item.longitude = None
+                item.geohash = ""
+            else:
+                item.latitude, item.longitude = location
+                item.geohash = encode_geohash(*location)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_geocoding_service():
+    """Return the process wide geocoding service configured by ``settings.GEOCODER``."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                config = settings.GEOCODER
+                geocoder = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+                _service = GeocodingService(geocoder, cache_size=config.get("CACHE_SIZE", 10000))
+    return _service
@@ -0,0 +1,111 @@
+"""Streaming bulk import of listings from CSV or NDJSON."""
+import codecs
+import csv
+import json
+import time
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from . import outbox
+from .geo import get_geocoding_service
+from .models import RealEstateItem
+from .serializers import RealEstateItemImportSerializer
+from .signals import listings_bulk_created
+from .tasks import GSHEETS_APPEND, SAVED_SEARCH_MATCH
+
+FORMATS = ("csv", "ndjson")
+
+
+def decode_lines(chunks, encoding="utf-8"):
+    """Turn an iterable of byte lines or chunks into text lines without reading everything."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_rows(lines, data_format):
+    """Yield ``(row_number, row, error)`` for every record of a CSV or NDJSON stream."""
+    if data_format == "csv":
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row, None
+        return
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, {"non_field_errors": [f"Invalid JSON: {e}"]}
+            continue
+        if not isinstance(row, dict):
+            yield number, None, {"non_field_errors": ["Each line must be a JSON object"]}
+            continue
+        yield number, row, None
+
+
+class ListingImporter:
+    """
+    Validate rows in batches and insert them with ``bulk_create``.
+
+    Each chunk of ``chunk_size`` rows is validated with one serializer
+    instance, geocoded and inserted in its own transaction together with its
+    outbox tasks, so a failure only loses the chunk being written. Rows that
+    fail validation are reported and skipped.
+    """
+
+    def __init__(self, owner, chunk_size=500, max_errors=1000):
+        self.owner = owner
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.serializer = RealEstateItemImportSerializer()
+        self.geocoding = get_geocoding_service()
+
+    def run(self, rows):
+        report = {"rows": 0, "created": 0, "failed": 0, "errors": [], "errors_truncated": False}
+        started = time.perf_counter()
+        chunk = []
+        for number, row, error in rows:
+            report["rows"] += 1
+            if error is None:
+                try:
+                    chunk.append(self.serializer.run_validation(row))
+                except ValidationError as e:
+                    error = e.detail
+            if error is not None:
+                self._record_error(report, number, error)
+            if len(chunk) >= self.chunk_size:
+                report["created"] += self.write(chunk)
+                chunk = []
+        if chunk:
+            report["created"] += self.write(chunk)
+        elapsed = time.perf_counter() - started
+        report["seconds"] = round(elapsed, 3)
+        report["rows_per_sec"] = round(report["rows"] / elapsed, 1) if elapsed else None
+        return report
+
+    def _record_error(self, report, number, error):
+        report["failed"] += 1
+        if len(report["errors"]) < self.max_errors:
+            report["errors"].append({"row": number, "errors": error})
+        else:
+            report["errors_truncated"] = True
+
+    def write(self, validated_rows):
+        items = [RealEstateItem(created_by=self.owner, **data) for data in validated_rows]
+        self.geocoding.apply(*items)
+        with transaction.atomic():
+            items = RealEstateItem.objects.bulk_create(items)
+            outbox.enqueue_many(GSHEETS_APPEND, ({"listing_id": item.id} for item in items))
+            outbox.enqueue_many(SAVED_SEARCH_MATCH, ({"listing_id": item.id} for item in items))
+            listings_bulk_created.send(sender=RealEstateItem, items=items)
+        return len(items)
@@ -0,0 +1,279 @@
+"""
+Server-Sent Events feed of listing changes, served by ``user_listing_proj.asgi``.
+
+``ListingBroker`` fans the create/update/delete events of this process out
+to the connected subscribers. Every subscriber has a bounded queue, a client
+that does not keep up fills it and is evicted instead of holding memory or
+slowing the others down. ``ListingEventStream`` is the raw ASGI endpoint: a
+connection is a coroutine waiting on its queue, so one worker holds thousands
+of idle clients.
+
+Events come from the listing signals of the process serving the stream,
+deployments with several ASGI processes see the writes each one handles. The
+stream has no replay, clients reconnecting after a gap catch up with
+``/realestates/changes/``.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from decimal import Decimal, InvalidOperation
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework.exceptions import AuthenticationFailed
+
+from users.authentication import CachedJWTAuthentication
+
+CREATED, UPDATED, DELETED = "created", "updated", "deleted"
+EVICTED = object()
+
+
+def live_setting(name, default):
+    return getattr(settings, "LISTING_EVENTS", {}).get(name, default)
+
+
+class Subscriber:
+    def __init__(self, user_id, own_only=True, min_price=None, max_price=None, queue_size=100):
+        self.user_id = user_id
+        self.own_only = own_only
+        self.min_price = min_price
+        self.max_price = max_price
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.loop = asyncio.get_running_loop()
+        self.evicted = False
+
+    def wants(self, event):
+        if self.own_only and event["owner"] != self.user_id:
+            return False
+        price = event["price"]
+        if self.min_price is not None and price < self.min_price:
+            return False
+        if self.max_price is not None and price > self.max_price:
+            return False
+        return True
+
+    def offer(self, message):
+        """Queue a message on the subscriber's loop, evict it when its queue is full."""
+        if self.evicted:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.evicted = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(EVICTED)
+
+
+class ListingBroker:
+    """In-process fan-out of listing events to subscribers, safe to publish from any thread."""
+
+    def __init__(self, max_subscribers=10000, queue_size=100):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._sequence = itertools.count(1)
+        self.published = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, user_id, **filters):
+        """Return a new subscriber, ``None`` when the broker is full."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscriber = Subscriber(user_id, queue_size=self.queue_size, **filters)
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if subscriber.evicted:
+                self.evicted += 1
+
+    def publish(self, kind, listing):
+        """Send an event about ``listing`` (a dict with at least id, owner and price) to the interested subscribers."""
+        if not self._subscribers:
+            return
+        event = {"type": kind, **listing, "price": Decimal(listing["price"])}
+        message = self.format(next(self._sequence), kind, listing)
+        with self._lock:
+            by_loop = {}
+            for subscriber in self._subscribers:
+                if subscriber.wants(event):
+                    by_loop.setdefault(subscriber.loop, []).append(subscriber)
+            self.published += 1
+        # One callback per event loop, the fan-out itself runs on the loop that owns the queues.
+        for loop, subscribers in by_loop.items():
+            loop.call_soon_threadsafe(self._deliver, subscribers, message)
+
+    @staticmethod
+    def _deliver(subscribers, message):
+        for subscriber in subscribers:
+            subscriber.offer(message)
+
+    @staticmethod
+    def format(sequence, kind, listing):
+        data = json.dumps(listing, cls=DjangoJSONEncoder, separators=(",", ":"))
+        return f"id: {sequence}\nevent: {kind}\ndata: {data}\n\n".encode()
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "published": self.published, "evicted": self.evicted}
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = ListingBroker(
+                    max_subscribers=live_setting("MAX_SUBSCRIBERS", 10000),
+                    queue_size=live_setting("QUEUE_SIZE", 100),
+                )
+    return _broker
+
+
+def has_subscribers():
+    return _broker is not None and len(_broker) > 0
+
+
+def listing_event(item, deleted=False):
+    event = {"id": item.pk, "owner": item.created_by_id, "price": str(item.price)}
+    if not deleted:
+        event.update(address=item.address, description=item.description, modified=item.modified)
+    return event
+
+
+def publish_listings(kind, items):
+    """Publish events about ``items`` once the current transaction commits, nothing without subscribers."""
+    if not has_subscribers():
+        return
+    events = [listing_event(item, deleted=kind == DELETED) for item in items]
+    broker = get_broker()
+    transaction.on_commit(lambda: [broker.publish(kind, event) for event in events])
+
+
+class ListingEventStream:
+    """
+    ASGI endpoint streaming listing events as ``text/event-stream``.
+
+    Authenticates with the ``Authorization: Bearer`` header or, for
+    browsers' ``EventSource``, a ``?token=`` parameter. ``?scope=all``
+    follows every listing instead of the user's own, ``min_price`` and
+    ``max_price`` filter on price.
+    """
+
+    def __init__(self, broker=None):
+        self._broker = broker
+
+    @property
+    def broker(self):
+        return self._broker or get_broker()
+
+    async def __call__(self, scope, receive, send):
+        if scope["method"] not in ("GET", "HEAD"):
+            await self.reject(send, 405, {"detail": f'Method "{scope["method"]}" not allowed.'})
+            return
+        params = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        try:
+            user = await self.authenticate(scope, params)
+        except AuthenticationFailed as e:
+            await self.reject(send, 401, e.detail if isinstance(e.detail, dict) else {"detail": e.detail})
+            return
+        try:
+            filters = self.filters(params)
+        except (InvalidOperation, ValueError):
+            await self.reject(send, 400, {"errors": ["min_price and max_price must be numbers"]})
+            return
+        subscriber = self.broker.subscribe(user.id, **filters)
+        if subscriber is None:
+            await self.reject(send, 503, {"errors": ["Too many listeners, retry later"]}, retry_after=5)
+            return
+        try:
+            await self.stream(subscriber, receive, send)
+        finally:
+            self.broker.unsubscribe(subscriber)
+
+    async def authenticate(self, scope, params):
+        headers = dict(scope.get("headers", []))
+        authentication = CachedJWTAuthentication()
+        raw_token = None
+        header = headers.get(b"authorization")
+        if header is not None:
+            raw_token = authentication.get_raw_token(header)
+        elif params.get("token"):
+            raw_token = params["token"][0].encode()
+        if raw_token is None:
+            raise AuthenticationFailed("Authentication credentials were not provided.")
+        return await authentication.aget_user(authentication.get_validated_token(raw_token))
+
+    @staticmethod
+    def filters(params):
+        def price(name):
+            return Decimal(params[name][0]) if params.get(name) else None
+
+        return {
+            "own_only": params.get("scope", ["own"])[0] != "all",
+            "min_price": price("min_price"),
+            "max_price": price("max_price"),
+        }
+
+    async def stream(self, subscriber, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        heartbeat = live_setting("HEARTBEAT_SECONDS", 15)
+        try:
+            while not disconnected.done():
+                next_message = asyncio.ensure_future(subscriber.queue.get())
+                done, _ = await asyncio.wait({next_message, disconnected}, timeout=heartbeat,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if next_message not in done:
+                    next_message.cancel()
+                    if not disconnected.done():
+                        # Comment line, keeps proxies from closing idle connections.
+                        await send({"type": "http.response.body", "body": b": ping\n\n", "more_body": True})
+                    continue
+                message = next_message.result()
+                if message is EVICTED:
+                    await send({"type": "http.response.body", "body": b"event: evicted\ndata: {}\n\n"})
+                    return
+                await send({"type": "http.response.body", "body": message, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+
+    @staticmethod
+    async def wait_for_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    async def reject(send, status, body, retry_after=None):
+        headers = [(b"content-type", b"application/json")]
+        if status == 401:
+            headers.append((b"www-authenticate", b'Bearer realm="api"'))
+        if retry_after is not None:
+            headers.append((b"retry-after", str(retry_after).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": json.dumps(body).encode()})
@@ -0,0 +1,137 @@
+import asyncio
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from real_estate_listing.models import RealEstateItem
+from users.models import BaseUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare gunicorn WSGI workers serving the DRF listing view with one uvicorn "
+        "ASGI worker serving the async view, under many slow concurrent clients. Needs gunicorn and "
+        "uvicorn of requirements-bench.txt, the bench user and its listings are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=200)
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument("--wsgi-workers", type=int, default=4)
+        parser.add_argument(
+            "--client-delay",
+            type=float,
+            default=0.05,
+            help="Seconds every client waits between the two halves of its request headers.",
+        )
+        parser.add_argument("--rows", type=int, default=200)
+        parser.add_argument("--port", type=int, default=8801)
+
+    def handle(self, *args, **options):
+        missing = [name for name in ("gunicorn", "uvicorn") if importlib.util.find_spec(name) is None]
+        if missing:
+            raise CommandError(f"bench_asgi needs {' and '.join(missing)}: pip install -r requirements-bench.txt")
+
+        owner = BaseUser.objects.create(email="bench-asgi@example.com", username="")
+        try:
+            RealEstateItem.objects.bulk_create(
+                RealEstateItem(description=f"Bench listing {i}", address=f"{i} Bench Street", price=i, created_by=owner)
+                for i in range(options["rows"])
+            )
+            token = str(AccessToken.for_user(owner))
+            servers = (
+                (
+                    f"wsgi x{options['wsgi_workers']}",
+                    [
+                        sys.executable, "-m", "gunicorn", "user_listing_proj.wsgi:application",
+                        "--workers", str(options["wsgi_workers"]), "--bind", f"127.0.0.1:{options['port']}",
+                        "--log-level", "warning",
+                    ],
+                    "/realestates/",
+                ),
+                (
+                    "asgi x1",
+                    [
+                        sys.executable, "-m", "uvicorn", "user_listing_proj.asgi:application",
+                        "--port", str(options["port"] + 1), "--workers", "1", "--log-level", "warning",
+                    ],
+                    "/async/realestates/",
+                ),
+            )
+            for port, (name, command, path) in enumerate(servers, start=options["port"]):
+                result = self.run_server(command, port, path, token, options)
+                self.stdout.write(
+                    f"{name:10} requests={result['requests']} errors={result['errors']} "
+                    f"req/sec={result['rps']:.0f} p50={result['p50'] * 1000:.1f}ms p99={result['p99'] * 1000:.1f}ms"
+                )
+        finally:
+            RealEstateItem.objects.filter(created_by=owner).delete()
+            owner.delete()
+
+    def run_server(self, command, port, path, token, options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "user_listing_proj.settings")}
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            self.wait_for_port(port)
+            return asyncio.run(self.load(port, path, token, options))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    @staticmethod
+    def wait_for_port(port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"The server on port {port} did not start")
+
+    async def load(self, port, path, token, options):
+        head = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n".encode("ascii")
+        rest = f"Authorization: Bearer {token}\r\nConnection: close\r\n\r\n".encode("ascii")
+        deadline = time.monotonic() + options["duration"]
+        latencies, errors = [], 0
+
+        async def client():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                    writer.write(head)
+                    await writer.drain()
+                    await asyncio.sleep(options["client_delay"])
+                    writer.write(rest)
+                    await writer.drain()
+                    response = await reader.read()
+                    writer.close()
+                except OSError:
+                    errors += 1
+                    continue
+                if response.startswith(b"HTTP/1.1 200"):
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options["clients"])))
+        elapsed = time.perf_counter() - started
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": len(latencies) / elapsed,
+            "p50": quantiles[49],
+            "p99": quantiles[98],
+        }
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from real_estate_listing.models import RealEstateItem
+from real_estate_listing.sheets import FakeSheetBackend, SheetSyncEngine, listing_row
+from users.models import BaseUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark per-listing sheet pushes against batched pushes, as the outbox "
+        "handler sends them, using the offline fake sheet. Synthetic listings are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--latency", type=float, default=0.005, help="Simulated seconds per sheet API call."
+        )
+
+    def handle(self, *args, **options):
+        rows, latency = options["rows"], options["latency"]
+        with transaction.atomic():
+            owner = BaseUser.objects.create(email="bench-gsheets@example.com", username="bench-gsheets")
+            items = RealEstateItem.objects.bulk_create(
+                RealEstateItem(
+                    description=f"Bench listing {i}", address=f"{i} Bench Street", price=i, created_by=owner
+                )
+                for i in range(rows)
+            )
+            ids = [item.id for item in items]
+
+            legacy = FakeSheetBackend(latency=latency)
+            started = time.perf_counter()
+            for listing_id in ids:
+                item = RealEstateItem.objects.select_related("created_by").get(id=listing_id)
+                legacy.append_rows([listing_row(item)])
+                legacy.get_all_values()
+            legacy_elapsed = time.perf_counter() - started
+
+            engine = SheetSyncEngine(FakeSheetBackend(latency=latency))
+            batch_size = options["batch_size"]
+            started = time.perf_counter()
+            for start in range(0, len(ids), batch_size):
+                engine.push(ids[start : start + batch_size])
+            batched_elapsed = time.perf_counter() - started
+
+            transaction.set_rollback(True)
+
+        for name, elapsed, backend in (
+            ("per-listing", legacy_elapsed, legacy),
+            ("batched", batched_elapsed, engine.backend),
+        ):
+            self.stdout.write(
+                f"{name:12} rows={rows} calls={backend.calls} "
+                f"seconds={elapsed:.3f} rows/sec={rows / elapsed:.0f}"
+            )
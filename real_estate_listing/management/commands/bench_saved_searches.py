@@ -0,0 +1,56 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from real_estate_listing.alerts import SavedSearchIndex, listing_terms
+
+WORDS = (
+    "house apartment plot villa corner garden garage furnished marble solar lawn park school "
+    "mosque market boulevard basement penthouse studio duplex farmhouse"
+).split()
+AREAS = "dha gulberg model town bahria johar iqbal cantt wapda valencia askari".split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Match random listings against an in-memory index of random saved searches "
+        "and report the time per listing. Touches no table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--searches", type=int, default=100_000)
+        parser.add_argument("--listings", type=int, default=1000)
+        parser.add_argument("--owners", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        searches = []
+        for pk in range(1, options["searches"] + 1):
+            low = rng.choice([None, rng.randrange(0, 500_000, 10_000)])
+            high = rng.choice([None, (low or 0) + rng.randrange(10_000, 1_000_000, 10_000)])
+            keywords = " ".join(rng.sample(WORDS + AREAS, rng.choice([0, 1, 1, 2, 2, 3])))
+            owner = rng.randrange(1, options["owners"]) if rng.random() < 0.05 else None
+            searches.append((pk, rng.randrange(1, options["owners"]), low, high, keywords, owner))
+
+        started = time.perf_counter()
+        index = SavedSearchIndex(searches)
+        self.stdout.write(f"indexed {len(index)} saved searches in {time.perf_counter() - started:.2f}s")
+
+        timings, matches = [], 0
+        for _ in range(options["listings"]):
+            description = " ".join(rng.sample(WORDS, 6))
+            address = f"{rng.randrange(1, 500)} {rng.choice(AREAS)} lahore"
+            price = rng.randrange(10_000, 2_000_000)
+            owner = rng.randrange(1, options["owners"])
+            started = time.perf_counter()
+            matched = index.match(price, listing_terms(description, address), owner)
+            timings.append(time.perf_counter() - started)
+            matches += len(matched)
+        quantiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f"matched {options['listings']} listings, {matches / options['listings']:.0f} alerts per listing, "
+            f"p50={quantiles[49] * 1000:.2f}ms p99={quantiles[98] * 1000:.2f}ms max={max(timings) * 1000:.2f}ms"
+        )
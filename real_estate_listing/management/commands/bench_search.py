@@ -0,0 +1,81 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from real_estate_listing.models import RealEstateItem
+from real_estate_listing.search import BasicSearchBackend, SQLiteFTS5Backend
+from users.models import BaseUser
+
+ADJECTIVES = ["sunny", "spacious", "renovated", "cozy", "modern", "quiet", "furnished", "corner", "luxury", "family"]
+KINDS = ["apartment", "villa", "flat", "house", "studio", "penthouse", "townhouse", "bungalow", "duplex", "cottage"]
+FEATURES = ["balcony", "garden", "pool", "garage", "terrace", "fireplace", "basement", "elevator", "gym", "view"]
+STREETS = ["park", "canal", "mall", "lake", "hill", "river", "market", "station", "college", "temple"]
+CITIES = ["lahore", "karachi", "islamabad", "multan", "peshawar", "quetta", "faisalabad", "sialkot"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark listing search with the FTS5 index against the LIKE based fallback "
+        "over synthetic listings. The synthetic rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--skip-basic", action="store_true", help="Only time the FTS5 backend.")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def synthetic_listing(self, rng, owner):
+        description = " ".join([
+            rng.choice(ADJECTIVES), rng.choice(KINDS), "with", rng.choice(FEATURES),
+            "and", rng.choice(FEATURES), f"ref{rng.randrange(100000)}",
+        ])
+        address = f"{rng.randrange(1, 500)} {rng.choice(STREETS)} road, {rng.choice(CITIES)}"
+        return RealEstateItem(
+            description=description, address=address, price=rng.randrange(10_000, 5_000_000), created_by=owner
+        )
+
+    def time_queries(self, backend, queries):
+        timings = []
+        for query, filters in queries:
+            started = time.perf_counter()
+            backend.search(query, filters, limit=20)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {
+            "p50_ms": round(statistics.median(timings), 2),
+            "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 2),
+            "max_ms": round(timings[-1], 2),
+        }
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            owner = BaseUser.objects.create(email="bench-search@example.com", username="bench-search")
+            started = time.perf_counter()
+            remaining = options["rows"]
+            while remaining:
+                batch = min(remaining, options["batch_size"])
+                RealEstateItem.objects.bulk_create(self.synthetic_listing(rng, owner) for _ in range(batch))
+                remaining -= batch
+            self.stdout.write(f"inserted {options['rows']} listings in {time.perf_counter() - started:.1f}s")
+
+            queries = []
+            for _ in range(options["queries"]):
+                query = f"{rng.choice(KINDS)} {rng.choice(FEATURES)} {rng.choice(CITIES)[:4]}"
+                filters = {}
+                if rng.random() < 0.5:
+                    low = rng.randrange(10_000, 2_000_000)
+                    filters = {"min_price": low, "max_price": low + 1_000_000}
+                queries.append((query, filters))
+
+            backends = [("fts5", SQLiteFTS5Backend())]
+            if not options["skip_basic"]:
+                backends.append(("basic", BasicSearchBackend()))
+            for name, backend in backends:
+                self.stdout.write(f"{name:6} {self.time_queries(backend, queries)}")
+            transaction.set_rollback(True)
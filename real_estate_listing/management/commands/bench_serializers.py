@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from real_estate_listing.models import RealEstateItem
+from real_estate_listing.serializers import RealEstateItemSerializer
+from user_listing_proj.fast_serialization import ValuesSerializer, render_json
+from users.models import BaseUser
+from users.serializers import UserListSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time DRF serializers plus JSONRenderer against the fast values_list/orjson path on "
+        "one page of listings and users. The rows are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                owner = BaseUser.objects.create(email="bench-serializers@example.com", username="")
+                RealEstateItem.objects.bulk_create(
+                    RealEstateItem(
+                        description=f"Bench listing {i} ✓",
+                        address=f"{i} Bench Street",
+                        price=i * 1.25,
+                        created_by=owner,
+                    )
+                    for i in range(options["rows"])
+                )
+                BaseUser.objects.bulk_create(
+                    BaseUser(email=f"bench-serializers-{i}@example.com", username=f"bench-serializers-{i}",
+                             first_name=f"First {i}", last_name=f"Last {i}")
+                    for i in range(options["rows"])
+                )
+                self.compare("listings", RealEstateItemSerializer, RealEstateItem.objects.filter(created_by=owner), options)
+                users = BaseUser.objects.filter(email__startswith="bench-serializers-").order_by("id")
+                self.compare("users", UserListSerializer, users, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def compare(self, name, serializer_class, queryset, options):
+        renderer = JSONRenderer()
+        fast = ValuesSerializer.for_serializer(serializer_class)
+
+        def drf():
+            return renderer.render(serializer_class(list(queryset), many=True).data)
+
+        def values():
+            return render_json(*fast.serialize(list(fast.rows(queryset))))
+
+        if drf() != values():
+            raise CommandError(f"The fast {name} output differs from the DRF output")
+        timings = {}
+        for label, render in (("drf", drf), ("fast", values)):
+            started = time.perf_counter()
+            for _ in range(options["repeat"]):
+                render()
+            timings[label] = (time.perf_counter() - started) / options["repeat"]
+        self.stdout.write(
+            f"{name:9} rows={options['rows']} drf={timings['drf'] * 1000:.1f}ms "
+            f"fast={timings['fast'] * 1000:.1f}ms speedup={timings['drf'] / timings['fast']:.1f}x"
+        )
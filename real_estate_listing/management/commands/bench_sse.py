@@ -0,0 +1,139 @@
+import asyncio
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from real_estate_listing.models import RealEstateItem
+from users.models import BaseUser
+
+from .bench_asgi import Command as AsgiBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Open thousands of idle Server-Sent Events connections to one uvicorn worker, report its "
+        "memory, then create listings through the same worker and measure how long the events take "
+        "to reach every client. Needs uvicorn, the bench user and its listings are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=2000)
+        parser.add_argument("--events", type=int, default=20)
+        parser.add_argument("--port", type=int, default=8811)
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec("uvicorn") is None:
+            raise CommandError("bench_sse needs uvicorn: pip install uvicorn")
+
+        owner = BaseUser.objects.create(email="bench-sse@example.com", username="")
+        try:
+            token = str(AccessToken.for_user(owner))
+            command = [
+                sys.executable, "-m", "uvicorn", "user_listing_proj.asgi:application",
+                "--port", str(options["port"]), "--workers", "1", "--log-level", "warning",
+                "--backlog", str(max(2048, options["clients"])),
+            ]
+            env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "user_listing_proj.settings")}
+            server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+            try:
+                AsgiBenchmark.wait_for_port(options["port"])
+                result = asyncio.run(self.load(server.pid, token, options))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+        finally:
+            RealEstateItem.objects.filter(created_by=owner).delete()
+            owner.delete()
+        self.stdout.write(
+            f"connected={result['connected']}/{options['clients']} "
+            f"rss idle={result['rss_before'] / 1024:.1f}MiB connected={result['rss_after'] / 1024:.1f}MiB "
+            f"({result['per_client']:.1f}KiB per client)"
+        )
+        self.stdout.write(
+            f"events={options['events']} delivered={result['delivered']} "
+            f"fan-out p50={result['p50'] * 1000:.1f}ms p99={result['p99'] * 1000:.1f}ms"
+        )
+
+    @staticmethod
+    def rss(pid):
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+        return 0
+
+    async def load(self, pid, token, options):
+        port = options["port"]
+        rss_before = self.rss(pid)
+        received, sent_at, ready = [], {}, asyncio.Event()
+        connected = 0
+
+        async def client():
+            nonlocal connected
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(
+                f"GET /realestates/events/ HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+                f"Authorization: Bearer {token}\r\nAccept: text/event-stream\r\n\r\n".encode("ascii")
+            )
+            await writer.drain()
+            if not (await reader.readline()).startswith(b"HTTP/1.1 200"):
+                writer.close()
+                return
+            connected += 1
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        return
+                    if line.startswith(b"data: {") and b'"id"' in line:
+                        # Chunked framing, the data line is a whole event.
+                        received.append((json.loads(line[6:])["id"], time.perf_counter()))
+            except (asyncio.CancelledError, ConnectionError):
+                writer.close()
+                raise
+
+        clients = []
+        for start in range(0, options["clients"], 200):
+            clients += [asyncio.create_task(client()) for _ in range(start, min(start + 200, options["clients"]))]
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(2)
+        rss_after = self.rss(pid)
+
+        for i in range(options["events"]):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            body = json.dumps({"description": f"SSE bench {i}", "address": f"{i} Stream Street", "price": "100.00"})
+            writer.write(
+                f"POST /realestates/ HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nAuthorization: Bearer {token}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n{body}".encode()
+            )
+            started = time.perf_counter()
+            response = await reader.read()
+            writer.close()
+            if response.startswith(b"HTTP/1.1 201"):
+                payload = json.loads(response.split(b"\r\n\r\n", 1)[1])
+                sent_at[payload["id"]] = started
+            await asyncio.sleep(0.2)
+        await asyncio.sleep(2)
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+
+        latencies = [at - sent_at[pk] for pk, at in received if pk in sent_at]
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+        return {
+            "connected": connected,
+            "rss_before": rss_before,
+            "rss_after": rss_after,
+            "per_client": (rss_after - rss_before) / max(connected, 1),
+            "delivered": len(latencies),
+            "p50": quantiles[49],
+            "p99": quantiles[98],
+        }
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from real_estate_listing.changes import compact_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete listing tombstones older than CHANGE_FEED['TOMBSTONE_RETENTION_DAYS']. "
+        "Change feed cursors older than the retention are answered with 410 either way."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float, help="Retention to use instead of the setting.")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        retention = timedelta(days=options["days"]) if options["days"] is not None else None
+        deleted = compact_tombstones(retention=retention, batch_size=options["batch_size"])
+        self.stdout.write(f"deleted {deleted} tombstones")
@@ -0,0 +1,65 @@
+import argparse
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from real_estate_listing import exporting
+
+
+def price(value):
+    try:
+        parsed = Decimal(value)
+    except InvalidOperation:
+        parsed = None
+    if parsed is None or not parsed.is_finite():
+        raise argparse.ArgumentTypeError(f"{value!r} is not a number")
+    return parsed
+
+
+def timestamp(value):
+    parsed = exporting.parse_timestamp(value)
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f"{value!r} is not an ISO 8601 datetime")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Stream listings to a CSV or NDJSON file with constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="-", help="File to write, - for stdout.")
+        parser.add_argument("--type", choices=exporting.FORMATS, default="csv")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--owner", help="Only export listings of the user with this email.")
+        parser.add_argument("--created-after", type=timestamp, help="ISO 8601 datetime, UTC without an offset.")
+        parser.add_argument("--created-before", type=timestamp, help="ISO 8601 datetime, UTC without an offset.")
+        parser.add_argument("--min-price", type=price)
+        parser.add_argument("--max-price", type=price)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        filters = {name: options[name] for name in ("created_after", "created_before", "min_price", "max_price")}
+        if options["owner"]:
+            try:
+                filters["owner"] = get_user_model().objects.get(email=options["owner"]).id
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['owner']}")
+
+        rows = exporting.export_rows(chunk_size=options["chunk_size"], **filters)
+        chunks = exporting.export_chunks(rows, options["type"])
+        if options["gzip"]:
+            chunks = exporting.gzip_chunks(chunks)
+
+        started, written = time.perf_counter(), 0
+        output = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        self.stderr.write(f"wrote {written} bytes in {time.perf_counter() - started:.2f}s")
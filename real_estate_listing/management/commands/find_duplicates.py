@@ -0,0 +1,42 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from real_estate_listing.dedup import cluster_duplicates, get_lsh
+from real_estate_listing.models import RealEstateItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Cluster near-duplicate listings across the whole table with the MinHash LSH index. "
+        "Prints one JSON line per cluster of listing ids."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild", action="store_true", help="Recompute the signatures of every listing first."
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--max-bucket-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["rebuild"]:
+            indexed, batch = 0, []
+            queryset = RealEstateItem.objects.order_by().only("id", "description", "address")
+            for item in queryset.iterator(chunk_size=options["chunk_size"]):
+                batch.append(item)
+                if len(batch) >= options["chunk_size"]:
+                    indexed += get_lsh().index(batch)
+                    batch = []
+            indexed += get_lsh().index(batch)
+            self.stderr.write(f"indexed {indexed} listings in {time.perf_counter() - started:.2f}s")
+
+        clusters, skipped = cluster_duplicates(max_bucket_size=options["max_bucket_size"])
+        for cluster in clusters:
+            self.stdout.write(json.dumps({"listings": cluster}))
+        self.stderr.write(
+            f"{len(clusters)} clusters, {sum(map(len, clusters))} listings, {skipped} oversized buckets "
+            f"skipped in {time.perf_counter() - started:.2f}s"
+        )
@@ -0,0 +1,117 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from real_estate_listing.models import RealEstateItem
+from real_estate_listing.signals import listings_bulk_created
+
+CITIES = ["lahore", "karachi", "islamabad", "rawalpindi", "faisalabad", "multan", "peshawar", "quetta"]
+STREETS = ["Main Boulevard", "Canal Road", "Mall Road", "Garden Town", "Model Town", "Civic Center", "Park Avenue"]
+KINDS = ["house", "apartment", "flat", "villa", "plot", "penthouse", "studio", "shop"]
+FEATURES = [
+    "corner", "furnished", "renovated", "garden", "parking", "balcony", "marble floors", "servant quarter",
+    "near school", "near market", "gas connection", "solar panels", "boundary wall", "lift", "basement",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate users and listings for load tests, with bulk_create and one password hashed once. "
+        "Users are <prefix>-<n>@example.com with --password, the same --seed generates the same data. "
+        "Listings are neither geocoded nor sent to Google Sheets, run geocode_listings for coordinates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--listings", type=int, default=10_000)
+        parser.add_argument("--prefix", default="load")
+        parser.add_argument("--password", default="load-test-password")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--no-signals",
+            action="store_true",
+            help="Skip listings_bulk_created (price summaries, duplicate index), "
+                 "run rebuild_price_stats and find_duplicates --rebuild afterwards.",
+        )
+        parser.add_argument("--delete", action="store_true", help="Delete the users of --prefix and their listings.")
+
+    def handle(self, *args, **options):
+        UserModel = get_user_model()
+        generated = UserModel.objects.filter(email__startswith=f"{options['prefix']}-", email__endswith="@example.com")
+        if options["delete"]:
+            listings = RealEstateItem.objects.filter(created_by__in=generated)
+            count = listings.count()
+            listings.delete()
+            users = generated.delete()[1].get(UserModel._meta.label, 0)
+            self.stdout.write(f"Deleted {users} users and {count} listings")
+            return
+        if generated.exists():
+            raise CommandError(f"Users with the prefix {options['prefix']!r} exist, pass --delete first")
+        if options["users"] < 1 and options["listings"]:
+            raise CommandError("Listings need at least one user")
+
+        generator = random.Random(options["seed"])
+        started = time.perf_counter()
+        users = self.create_users(options)
+        users_done = time.perf_counter()
+        listings = self.create_listings(generator, users, options)
+        finished = time.perf_counter()
+        self.stdout.write(
+            f"Created {len(users)} users in {users_done - started:.2f}s "
+            f"and {listings} listings in {finished - users_done:.2f}s "
+            f"({listings / max(finished - users_done, 1e-9):.0f} listings/sec)"
+        )
+
+    def create_users(self, options):
+        UserModel = get_user_model()
+        # Hashed once: PBKDF2 per user would cost more than all the inserts.
+        password = make_password(options["password"])
+        users = [
+            UserModel(
+                email=f"{options['prefix']}-{number}@example.com",
+                username="",
+                first_name="Load",
+                last_name=f"User {number}",
+                password=password,
+            )
+            for number in range(options["users"])
+        ]
+        with transaction.atomic():
+            UserModel.objects.bulk_create(users, batch_size=options["batch_size"])
+        # bulk_create only sets ids on backends supporting RETURNING, read them back.
+        emails = [user.email for user in users]
+        return list(UserModel.objects.filter(email__in=emails).order_by("id").values_list("id", flat=True))
+
+    def create_listings(self, generator, users, options):
+        created = 0
+        while created < options["listings"]:
+            size = min(options["batch_size"], options["listings"] - created)
+            items = [self.listing(generator, users) for _ in range(size)]
+            with transaction.atomic():
+                items = RealEstateItem.objects.bulk_create(items)
+                if not options["no_signals"]:
+                    listings_bulk_created.send(sender=RealEstateItem, items=items)
+            created += size
+            self.stdout.write(f"{created}/{options['listings']} listings", ending="\r")
+        self.stdout.write("")
+        return created
+
+    @staticmethod
+    def listing(generator, users):
+        kind = generator.choice(KINDS)
+        city = generator.choice(CITIES)
+        features = generator.sample(FEATURES, generator.randint(1, 4))
+        # Log-normal around 15 million, like the spread of real asking prices.
+        price = Decimal(round(generator.lognormvariate(16.5, 0.8), -3)).quantize(Decimal("0.01"))
+        return RealEstateItem(
+            description=f"{generator.randint(1, 6)} bed {kind} with {', '.join(features)}",
+            address=f"{generator.randint(1, 999)} {generator.choice(STREETS)}, {city}",
+            price=min(price, Decimal("99999999.99")),
+            created_by_id=generator.choice(users),
+        )
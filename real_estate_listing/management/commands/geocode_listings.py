@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from real_estate_listing.changes import stamp_changes
+from real_estate_listing.geo import get_geocoding_service
+from real_estate_listing.models import RealEstateItem
+
+
+class Command(BaseCommand):
+    help = "Geocode listings that have no coordinates yet, or all listings with --all."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        service = get_geocoding_service()
+        queryset = RealEstateItem.objects.only("id", "address", "latitude", "longitude", "geohash", "modified")
+        if not options["all"]:
+            queryset = queryset.filter(geohash="")
+        batch, updated = [], 0
+        for item in queryset.order_by("id").iterator(chunk_size=options["batch_size"]):
+            batch.append(item)
+            if len(batch) >= options["batch_size"]:
+                updated += self.geocode_batch(service, batch)
+                batch = []
+        if batch:
+            updated += self.geocode_batch(service, batch)
+        self.stdout.write(f"geocoded {updated} listings")
+
+    def geocode_batch(self, service, batch):
+        service.apply(*batch)
+        modified = timezone.now()
+        for item in batch:
+            # bulk_update skips save(): bump modified and leave the change version to stamp_changes.
+            item.modified, item.change_version = modified, None
+        updated = RealEstateItem.objects.bulk_update(
+            batch, ["latitude", "longitude", "geohash", "modified", "change_version"]
+        )
+        stamp_changes()
+        return updated
+
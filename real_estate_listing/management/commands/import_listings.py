@@ -0,0 +1,31 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from real_estate_listing.importing import FORMATS, ListingImporter, decode_lines, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk import listings for one owner from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--owner", required=True, help="Email of the owner of the imported listings.")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            owner = get_user_model().objects.get(email=options["owner"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['owner']}")
+        data_format = options["format"] or options["path"].rsplit(".", 1)[-1].lower()
+        if data_format == "jsonl":
+            data_format = "ndjson"
+        if data_format not in FORMATS:
+            raise CommandError("Pass --format csv or --format ndjson")
+        importer = ListingImporter(owner, chunk_size=options["chunk_size"])
+        with open(options["path"], "rb") as source:
+            report = importer.run(iter_rows(decode_lines(source), data_format))
+        self.stdout.write(json.dumps(report, indent=2, default=str))
@@ -0,0 +1,257 @@
+import http.client
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench_asgi import Command as AsgiBenchmark
+
+ENDPOINTS = ("login", "create", "list", "detail", "patch", "delete")
+SERVERS = {
+    "gunicorn": [sys.executable, "-m", "gunicorn", "user_listing_proj.wsgi:application", "--bind", "{host}:{port}"],
+    "uvicorn": [
+        sys.executable, "-m", "uvicorn", "user_listing_proj.asgi:application", "--host", "{host}", "--port", "{port}",
+    ],
+}
+
+
+class Client:
+    """One virtual user on a keep-alive connection, running the scenario in a loop."""
+
+    def __init__(self, url, email, password, generator, relogin):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.email, self.password = email, password
+        self.generator = generator
+        self.relogin = relogin
+        self.connection = None
+        self.token = None
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def request(self, endpoint, method, path, body=None, expected=200):
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        if self.token is not None:
+            headers["Authorization"] = f"Bearer {self.token}"
+        payload = json.dumps(body).encode() if body is not None else None
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+            if response.getheader("Connection", "").lower() == "close":
+                self.close()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            status, content = "connection_error", b""
+        self.samples[endpoint].append(time.perf_counter() - started)
+        self.statuses[endpoint][str(status)] += 1
+        if status != expected:
+            return None
+        return json.loads(content) if content else {}
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def login(self):
+        self.token = None
+        data = self.request("login", "POST", "/auth/login/", {"email": self.email, "password": self.password})
+        self.token = data["token"]["access"] if data else None
+        return self.token is not None
+
+    def iteration(self, number):
+        if self.token is None or (self.relogin and number % self.relogin == 0):
+            if not self.login():
+                return
+        listing = self.request(
+            "create",
+            "POST",
+            "/realestates/",
+            {
+                "description": f"Load test listing {self.generator.randint(1, 10**6)}",
+                "address": f"{self.generator.randint(1, 999)} Load Street, lahore",
+                "price": str(self.generator.randint(10**5, 10**8)),
+            },
+            expected=201,
+        )
+        self.request("list", "GET", "/realestates/")
+        if listing is None or "id" not in listing:
+            return
+        path = f"/realestates/{listing['id']}/"
+        self.request("detail", "GET", path)
+        self.request("patch", "PATCH", path, {"price": str(self.generator.randint(10**5, 10**8))})
+        self.request("delete", "DELETE", path, expected=202)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive login, create, list, detail, patch and delete against a local server at a fixed "
+        "concurrency and print throughput and p50/p95/p99 per endpoint as JSON. Logs in as the users "
+        "of generate_data, with --server the command starts gunicorn or uvicorn itself."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--server", choices=sorted(SERVERS), help="Start this server on --url first.")
+        parser.add_argument("--workers", type=int, default=2, help="Worker processes of --server.")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run, after the warmup.")
+        parser.add_argument("--warmup", type=float, default=3.0, help="Seconds run first and left out of the results.")
+        parser.add_argument("--relogin", type=int, default=10, help="Log in again every N iterations, 0 for never.")
+        parser.add_argument("--prefix", default="load")
+        parser.add_argument("--password", default="load-test-password")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        emails = list(
+            get_user_model().objects.filter(email__startswith=f"{options['prefix']}-", email__endswith="@example.com")
+            .order_by("id").values_list("email", flat=True)[: options["concurrency"]]
+        )
+        if not emails:
+            raise CommandError(f"No {options['prefix']}-* users, run generate_data first")
+
+        server = self.start_server(options) if options["server"] else None
+        try:
+            report = self.run(emails, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        self.stdout.write(output)
+
+    def start_server(self, options):
+        if importlib.util.find_spec(options["server"]) is None:
+            raise CommandError(f"--server {options['server']} needs: pip install -r requirements-bench.txt")
+        parts = urlsplit(options["url"])
+        command = [part.format(host=parts.hostname, port=parts.port or 80) for part in SERVERS[options["server"]]]
+        command += ["--workers", str(options["workers"]), "--log-level", "warning"]
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "user_listing_proj.settings"),
+        }
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            AsgiBenchmark.wait_for_port(parts.port or 80)
+        except CommandError:
+            server.terminate()
+            raise
+        return server
+
+    def run(self, emails, options):
+        clients = [
+            Client(
+                options["url"],
+                emails[number % len(emails)],
+                options["password"],
+                random.Random(options["seed"] * 1000 + number),
+                options["relogin"],
+            )
+            for number in range(options["concurrency"])
+        ]
+        measuring = threading.Event()
+        stop = threading.Event()
+
+        def drive(client):
+            number, warming_up = 0, True
+            while not stop.is_set():
+                if warming_up and measuring.is_set():
+                    client.samples.clear()
+                    client.statuses.clear()
+                    warming_up = False
+                client.iteration(number)
+                number += 1
+            client.close()
+
+        threads = [threading.Thread(target=drive, args=(client,), daemon=True) for client in clients]
+        for thread in threads:
+            thread.start()
+        time.sleep(options["warmup"])
+        measuring.set()
+        started = time.perf_counter()
+        time.sleep(options["duration"])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        endpoints = {}
+        for endpoint in ENDPOINTS:
+            samples = [sample for client in clients for sample in client.samples[endpoint]]
+            statuses = sum((client.statuses[endpoint] for client in clients), Counter())
+            endpoints[endpoint] = self.summary(samples, statuses, elapsed)
+        samples = [sample for client in clients for values in client.samples.values() for sample in values]
+        statuses = sum((status for client in clients for status in client.statuses.values()), Counter())
+        return {
+            "meta": {
+                "commit": self.commit(),
+                "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "url": options["url"],
+                "server": options["server"],
+                "workers": options["workers"] if options["server"] else None,
+                "concurrency": options["concurrency"],
+                "duration": round(elapsed, 3),
+                "warmup": options["warmup"],
+                "relogin": options["relogin"],
+                "seed": options["seed"],
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+            },
+            "endpoints": endpoints,
+            "total": self.summary(samples, statuses, elapsed),
+        }
+
+    @staticmethod
+    def summary(samples, statuses, elapsed):
+        ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+        if len(samples) > 1:
+            quantiles = statistics.quantiles(samples, n=100, method="inclusive")
+            p50, p95, p99 = quantiles[49], quantiles[94], quantiles[98]
+        else:
+            p50 = p95 = p99 = samples[0] if samples else 0.0
+        return {
+            "requests": len(samples),
+            "errors": len(samples) - ok,
+            "rps": round(len(samples) / elapsed, 2),
+            "p50_ms": round(p50 * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "p99_ms": round(p99 * 1000, 2),
+            "max_ms": round(max(samples, default=0.0) * 1000, 2),
+            "statuses": dict(sorted(statuses.items())),
+        }
+
+    @staticmethod
+    def commit():
+        try:
+            result = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            return result.stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
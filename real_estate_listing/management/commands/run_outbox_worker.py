@@ -0,0 +1,32 @@
+import json
+import signal
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import autodiscover_modules
+
+from real_estate_listing.outbox import OutboxWorker
+
+
+class Command(BaseCommand):
+    help = "Run outbox tasks (Google Sheets pushes and other deferred side effects)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, help="Number of handler threads.")
+        parser.add_argument("--batch-size", type=int, help="Tasks passed to one handler call.")
+        parser.add_argument("--max-attempts", type=int, help="Attempts before a task is marked failed.")
+        parser.add_argument("--poll-interval", type=float, help="Longest sleep when the outbox is empty.")
+        parser.add_argument("--stats-interval", type=float, default=60)
+        parser.add_argument("--drain", action="store_true", help="Exit once no task is runnable.")
+
+    def handle(self, *args, **options):
+        autodiscover_modules("tasks")
+        worker = OutboxWorker(
+            concurrency=options["concurrency"],
+            batch_size=options["batch_size"],
+            max_attempts=options["max_attempts"],
+            poll_interval=options["poll_interval"],
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+        stats = worker.run(drain=options["drain"], stats_interval=options["stats_interval"])
+        self.stdout.write(json.dumps(stats, indent=2))
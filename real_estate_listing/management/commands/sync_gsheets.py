@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from real_estate_listing.sheets import get_sync_engine
+
+
+class Command(BaseCommand):
+    help = "Diff the RealEstateData sheet against the database and write only changed rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        result = get_sync_engine().resync(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            "updated={updated} appended={appended} unchanged={unchanged} "
+            "migrated={migrated} legacy={legacy}".format(**result)
+        )
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.5 on 2026-10-17 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_estate_listing", "0002_outboxtask"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="realestateitem",
+            options={"ordering": ["created", "id"]},
+        ),
+        migrations.AddIndex(
+            model_name="realestateitem",
+            index=models.Index(
+                fields=["created_by", "created", "id"],
+                name="realestate_owner_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.5 on 2026-10-17 22:41
+
+from django.db import migrations
+
+from real_estate_listing.fts import CREATE_TABLE_SQL, DROP_SQL, REBUILD_SQL, TRIGGERS_SQL, run_on_sqlite
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_estate_listing", "0003_realestateitem_owner_created_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_sqlite([CREATE_TABLE_SQL, *TRIGGERS_SQL.values(), REBUILD_SQL]), run_on_sqlite(DROP_SQL)
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.1.5 on 2026-10-17 22:42
+
+from django.db import migrations, models
+
+from real_estate_listing.fts import restore_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_estate_listing", "0004_listing_fts_index"),
+    ]
+
+    operations = [
+        # Adding geohash with a default copies the listing table on SQLite, which drops the
+        # FTS5 triggers of 0004: recreate them after the copy, and after removing it again.
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers()),
+        migrations.CreateModel(
+            name="GeocodeCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("normalized_address", models.TextField(unique=True)),
+                ("latitude", models.FloatField(null=True)),
+                ("longitude", models.FloatField(null=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="realestateitem",
+            name="geohash",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=12
+            ),
+        ),
+        migrations.AddField(
+            model_name="realestateitem",
+            name="latitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="realestateitem",
+            name="longitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="realestateitem",
+            index=models.Index(
+                fields=["created_by", "geohash"], name="realestate_owner_geohash_idx"
+            ),
+        ),
+        migrations.RunPython(restore_triggers(), migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.1.5 on 2026-10-17 23:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_estate_listing", "0006_pricesummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListingSignature",
+            fields=[
+                (
+                    "listing",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="signature",
+                        serialize=False,
+                        to="real_estate_listing.realestateitem",
+                    ),
+                ),
+                ("signature", models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="LSHBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.BigIntegerField()),
+                (
+                    "listing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="real_estate_listing.realestateitem",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="lshbucket",
+            index=models.Index(fields=["bucket"], name="lsh_bucket_idx"),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.1.5 on 2026-10-17 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_estate_listing", "0008_saved_searches"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListingTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("listing_id", models.BigIntegerField()),
+                ("owner_id", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="realestateitem",
+            index=models.Index(
+                fields=["created_by", "modified", "id"],
+                name="realestate_owner_modified_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listingtombstone",
+            index=models.Index(
+                fields=["owner_id", "deleted_at", "id"],
+                name="tombstone_owner_deleted_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listingtombstone",
+            index=models.Index(fields=["deleted_at"], name="tombstone_deleted_idx"),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.1.5 on 2026-10-17 23:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_estate_listing", "0009_listing_change_feed"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceDelta",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("owner_id", models.BigIntegerField()),
+                ("price", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("change", models.SmallIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="realestateitem",
+            index=models.Index(fields=["price"], name="realestate_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="realestateitem",
+            index=models.Index(
+                fields=["created_by", "price"], name="realestate_owner_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pricedelta",
+            index=models.Index(fields=["owner_id"], name="price_delta_owner_idx"),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.1.5 on 2026-10-17 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_estate_listing", "0010_price_deltas"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("value", models.BigIntegerField(default=0)),
+                ("compacted_through", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name="listingtombstone",
+            name="tombstone_owner_deleted_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="realestateitem",
+            name="realestate_owner_modified_idx",
+        ),
+        migrations.AddField(
+            model_name="listingtombstone",
+            name="change_version",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="realestateitem",
+            name="change_version",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="listingtombstone",
+            index=models.Index(
+                fields=["owner_id", "change_version", "id"],
+                name="tombstone_owner_version_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listingtombstone",
+            index=models.Index(
+                condition=models.Q(("change_version__isnull", True)),
+                fields=["id"],
+                name="tombstone_unversioned_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="realestateitem",
+            index=models.Index(
+                fields=["created_by", "change_version", "id"],
+                name="realestate_owner_version_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="realestateitem",
+            index=models.Index(
+                condition=models.Q(("change_version__isnull", True)),
+                fields=["id"],
+                name="realestate_unversioned_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.5 on 2026-10-17 23:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_estate_listing", "0011_listing_change_versions"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="listingtombstone",
+            index=models.Index(fields=["change_version"], name="tombstone_version_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="realestateitem",
+            index=models.Index(
+                fields=["change_version"], name="realestate_version_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.5 on 2026-10-17 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_estate_listing", "0012_change_version_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="searchalert",
+            name="claim_expires",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="searchalert",
+            name="claimed_by",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+    ]
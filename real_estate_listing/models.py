@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from django_extensions.db.models import TimeStampedModel
 
 from users.models import BaseUser
@@ -14,6 +16,181 @@ class RealEstateItem(TimeStampedModel):
     created_by = models.ForeignKey(
         BaseUser, on_delete=models.CASCADE, verbose_name="owner of Item"
     )
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+    # Position in the change feed, cleared by every save and assigned once the write committed.
+    change_version = models.BigIntegerField(null=True, blank=True, editable=False)
 
     class Meta:
-        ordering = ["created"]
+        ordering = ["created", "id"]
+        indexes = [
+            models.Index(fields=["created_by", "created", "id"], name="realestate_owner_created_idx"),
+            models.Index(fields=["created_by", "geohash"], name="realestate_owner_geohash_idx"),
+            models.Index(fields=["created_by", "change_version", "id"], name="realestate_owner_version_idx"),
+            models.Index(fields=["id"], condition=Q(change_version__isnull=True), name="realestate_unversioned_idx"),
+            # Listings changed since a refresh of the valuation matrix.
+            models.Index(fields=["change_version"], name="realestate_version_idx"),
+            # Min and max price of a summary scope after its bound was removed.
+            models.Index(fields=["price"], name="realestate_price_idx"),
+            models.Index(fields=["created_by", "price"], name="realestate_owner_price_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.change_version = None
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "change_version"}
+        super().save(*args, **kwargs)
+
+
+class GeocodeCache(models.Model):
+    """
+    Geocoder result per normalized address, a null location records a miss
+    """
+    normalized_address = models.TextField(unique=True)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class OutboxTask(TimeStampedModel):
+    """
+    Side effect recorded in the same transaction as the change that caused it
+    and executed later by the outbox worker.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (FAILED, "Failed"),
+    ]
+
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "available_at"])]
+
+
+class PriceSummary(models.Model):
+    """
+    Incrementally maintained price statistics for one owner, or for every
+    listing when owner is null
+    """
+    GLOBAL_SCOPE = "global"
+
+    scope = models.CharField(max_length=32, unique=True)
+    owner = models.ForeignKey(
+        BaseUser, null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+    count = models.PositiveBigIntegerField(default=0)
+    total = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    histogram = models.JSONField(default=list)
+    sketch = models.JSONField(default=dict)
+    modified = models.DateTimeField(auto_now=True)
+
+
+class PriceDelta(models.Model):
+    """
+    Listing price added (change 1) or removed (change -1) since the summaries were last folded
+    """
+    owner_id = models.BigIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    change = models.SmallIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["owner_id"], name="price_delta_owner_idx")]
+
+
+class ListingSignature(models.Model):
+    """
+    MinHash signature of the description and address of a listing
+    """
+    listing = models.OneToOneField(
+        RealEstateItem, on_delete=models.CASCADE, primary_key=True, related_name="signature"
+    )
+    signature = models.BinaryField()
+
+
+class LSHBucket(models.Model):
+    """
+    One band of a listing signature, listings sharing a bucket are duplicate candidates
+    """
+    listing = models.ForeignKey(RealEstateItem, on_delete=models.CASCADE, related_name="+")
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["bucket"], name="lsh_bucket_idx")]
+
+
+class SavedSearch(TimeStampedModel):
+    """
+    Listing criteria a user wants alerts for, every given criterion must match
+    """
+    user = models.ForeignKey(BaseUser, on_delete=models.CASCADE, related_name="saved_searches")
+    name = models.CharField(max_length=100, blank=True, default='')
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    keywords = models.CharField(max_length=255, blank=True, default='')
+    owner = models.ForeignKey(
+        BaseUser, null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+    active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ["id"]
+
+
+class SearchAlert(models.Model):
+    """
+    New listing matching a saved search, delivered_at is set once the user was notified
+    """
+    saved_search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name="alerts")
+    listing = models.ForeignKey(RealEstateItem, on_delete=models.CASCADE, related_name="+")
+    created = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    # Delivery claimed by one worker until claim_expires, like OutboxTask.claimed_by.
+    claimed_by = models.CharField(max_length=64, blank=True, default='')
+    claim_expires = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        constraints = [
+            models.UniqueConstraint(fields=["saved_search", "listing"], name="unique_search_alert"),
+        ]
+
+
+class ListingTombstone(models.Model):
+    """
+    Deleted listing, kept for the change feed until it is compacted away
+    """
+    listing_id = models.BigIntegerField()
+    owner_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+    change_version = models.BigIntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner_id", "change_version", "id"], name="tombstone_owner_version_idx"),
+            models.Index(fields=["id"], condition=Q(change_version__isnull=True), name="tombstone_unversioned_idx"),
+            models.Index(fields=["change_version"], name="tombstone_version_idx"),
+            models.Index(fields=["deleted_at"], name="tombstone_deleted_idx"),
+        ]
+
+
+class ChangeSequence(models.Model):
+    """
+    Last change version handed out, and the newest version of the compacted tombstones
+    """
+    value = models.BigIntegerField(default=0)
+    compacted_through = models.BigIntegerField(default=0)
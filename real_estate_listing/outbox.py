@@ -0,0 +1,243 @@
+"""Transactional outbox: record side effects with the data, run them in a worker."""
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .models import OutboxTask
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def handler(topic):
+    """Register ``func(payloads)`` as the handler for a topic.
+
+    Handlers receive a list of payloads so that one call can serve a batch.
+    Raising marks the whole batch for retry.
+    """
+
+    def decorator(func):
+        _handlers[topic] = func
+        return func
+
+    return decorator
+
+
+def enqueue(topic, payload):
+    """Record a task. Call inside the transaction that writes the data it refers to."""
+    return OutboxTask.objects.create(topic=topic, payload=payload)
+
+
+def enqueue_many(topic, payloads, batch_size=500):
+    return OutboxTask.objects.bulk_create(
+        (OutboxTask(topic=topic, payload=payload) for payload in payloads),
+        batch_size=batch_size,
+    )
+
+
+def outbox_setting(name):
+    defaults = {
+        "CONCURRENCY": 4,
+        "BATCH_SIZE": 100,
+        "MAX_ATTEMPTS": 8,
+        "BACKOFF_BASE": 2,
+        "BACKOFF_MAX": 300,
+        "LEASE_SECONDS": 300,
+        "POLL_INTERVAL": 1,
+    }
+    return getattr(settings, "OUTBOX", {}).get(name, defaults[name])
+
+
+class LatencyStats:
+    """Per topic task counters with a window of recent latencies for percentiles."""
+
+    def __init__(self, window=2048):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: {"run": deque(maxlen=window), "lag": deque(maxlen=window)})
+        self._counts = defaultdict(lambda: {"ok": 0, "retried": 0, "failed": 0})
+
+    def record(self, topic, outcome, tasks, run_seconds, lag_seconds=()):
+        with self._lock:
+            self._counts[topic][outcome] += tasks
+            self._samples[topic]["run"].append(run_seconds)
+            self._samples[topic]["lag"].extend(lag_seconds)
+
+    @staticmethod
+    def _percentiles(samples):
+        if not samples:
+            return {}
+        ordered = sorted(samples)
+        last = len(ordered) - 1
+        return {
+            name: round(ordered[round(last * fraction)] * 1000, 2)
+            for name, fraction in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99), ("max_ms", 1))
+        }
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                topic: {
+                    **counts,
+                    "run": self._percentiles(self._samples[topic]["run"]),
+                    "lag": self._percentiles(self._samples[topic]["lag"]),
+                }
+                for topic, counts in self._counts.items()
+            }
+
+
+class OutboxWorker:
+    """Claim pending outbox tasks and run their handlers on a thread pool.
+
+    Tasks are claimed with a conditional UPDATE and a lease, so several worker
+    processes can share one table and tasks of a crashed worker are picked up
+    again once their lease expires. Failed batches are retried with jittered
+    exponential backoff until ``max_attempts`` is reached, an expired lease
+    counts as a failed attempt. Settling a batch only touches the tasks still
+    leased by the claim that ran it.
+    """
+
+    def __init__(
+        self,
+        concurrency=None,
+        batch_size=None,
+        max_attempts=None,
+        backoff_base=None,
+        backoff_max=None,
+        lease_seconds=None,
+        poll_interval=None,
+    ):
+        self.concurrency = concurrency or outbox_setting("CONCURRENCY")
+        self.batch_size = batch_size or outbox_setting("BATCH_SIZE")
+        self.max_attempts = max_attempts or outbox_setting("MAX_ATTEMPTS")
+        self.backoff_base = backoff_base or outbox_setting("BACKOFF_BASE")
+        self.backoff_max = backoff_max or outbox_setting("BACKOFF_MAX")
+        self.lease_seconds = lease_seconds or outbox_setting("LEASE_SECONDS")
+        self.poll_interval = poll_interval or outbox_setting("POLL_INTERVAL")
+        self.stats = LatencyStats()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def claim(self):
+        """Lease up to ``concurrency * batch_size`` runnable tasks, return them grouped by topic."""
+        now = timezone.now()
+        runnable = Q(status=OutboxTask.PENDING) | Q(status=OutboxTask.RUNNING)
+        candidate_ids = list(
+            OutboxTask.objects.filter(runnable, available_at__lte=now)
+            .order_by("id")
+            .values_list("id", flat=True)[: self.concurrency * self.batch_size]
+        )
+        if not candidate_ids:
+            return {}
+        token = uuid.uuid4().hex
+        # The run of an expired lease crashed or hung: it is an attempt, possibly the last one.
+        OutboxTask.objects.filter(
+            id__in=candidate_ids,
+            status=OutboxTask.RUNNING,
+            available_at__lte=now,
+            attempts__gte=self.max_attempts - 1,
+        ).update(
+            status=OutboxTask.FAILED,
+            attempts=F("attempts") + 1,
+            claimed_by="",
+            last_error="Lease expired before the task was settled",
+        )
+        OutboxTask.objects.filter(runnable, id__in=candidate_ids, available_at__lte=now).update(
+            status=OutboxTask.RUNNING,
+            attempts=F("attempts") + Case(When(status=OutboxTask.RUNNING, then=Value(1)), default=Value(0)),
+            claimed_by=token,
+            available_at=now + timedelta(seconds=self.lease_seconds),
+        )
+        grouped = defaultdict(list)
+        for task in OutboxTask.objects.filter(claimed_by=token).order_by("id"):
+            grouped[task.topic].append(task)
+        return grouped
+
+    def run_batch(self, topic, tasks):
+        started = time.perf_counter()
+        try:
+            func = _handlers.get(topic)
+            if func is None:
+                raise LookupError(f"No outbox handler registered for topic {topic!r}")
+            func([task.payload for task in tasks])
+        except Exception as exc:
+            logger.exception("Outbox batch of %d %r tasks failed", len(tasks), topic)
+            retried = self._retry(tasks, exc)
+            self.stats.record(topic, "retried" if retried else "failed", len(tasks), time.perf_counter() - started)
+        else:
+            self.leased(tasks).delete()
+            finished = timezone.now()
+            self.stats.record(
+                topic,
+                "ok",
+                len(tasks),
+                time.perf_counter() - started,
+                [(finished - task.created).total_seconds() for task in tasks],
+            )
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def leased(tasks):
+        """The tasks still leased by the claim that returned them, another worker may own the others by now."""
+        return OutboxTask.objects.filter(id__in=[task.id for task in tasks], claimed_by=tasks[0].claimed_by)
+
+    def _retry(self, tasks, exc):
+        attempts = max(task.attempts for task in tasks) + 1
+        if attempts >= self.max_attempts:
+            status, delay = OutboxTask.FAILED, 0
+        else:
+            status = OutboxTask.PENDING
+            delay = min(self.backoff_max, self.backoff_base ** attempts) * random.uniform(0.5, 1.0)
+        self.leased(tasks).update(
+            status=status,
+            attempts=attempts,
+            claimed_by="",
+            available_at=timezone.now() + timedelta(seconds=delay),
+            last_error=repr(exc)[:2000],
+        )
+        return status == OutboxTask.PENDING
+
+    def run_once(self, executor):
+        """Claim and run one round of tasks, return the number of tasks run."""
+        grouped = self.claim()
+        futures = [
+            executor.submit(self.run_batch, topic, tasks[start:start + self.batch_size])
+            for topic, tasks in grouped.items()
+            for start in range(0, len(tasks), self.batch_size)
+        ]
+        for future in wait(futures).done:
+            if future.exception() is not None:
+                logger.error("Outbox batch could not be settled", exc_info=future.exception())
+        return sum(len(tasks) for tasks in grouped.values())
+
+    def run(self, drain=False, stats_interval=60):
+        """Process tasks until stopped, or until the outbox is empty when ``drain`` is set."""
+        idle_sleep = 0.05
+        last_report = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="outbox") as executor:
+            while not self._stop.is_set():
+                processed = self.run_once(executor)
+                if time.monotonic() - last_report >= stats_interval:
+                    logger.info("Outbox stats: %s", self.stats.snapshot())
+                    last_report = time.monotonic()
+                if processed:
+                    idle_sleep = 0.05
+                    continue
+                if drain:
+                    break
+                self._stop.wait(idle_sleep)
+                idle_sleep = min(idle_sleep * 2, self.poll_interval)
+        return self.stats.snapshot()
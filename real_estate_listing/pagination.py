@@ -0,0 +1,143 @@
+"""Keyset pagination for the listing endpoints."""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ListingCursorPagination(BasePagination):
+    """
+    Paginate listings by their ``(created, id)`` position.
+
+    Each page is fetched with ``WHERE (created, id) > cursor ORDER BY created, id
+    LIMIT n``, which the ``(created_by, created, id)`` index answers without
+    scanning the rows before the cursor, so deep pages cost the same as the
+    first one. Passing ``?page=`` switches to the regular page number
+    pagination for older clients. Requests without ``cursor``,
+    ``page_size`` or ``page`` are not paginated and keep getting the bare
+    list of every listing, the shape of the API before pagination.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_number_query_param = "page"
+    max_page_size = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE
+        self.page_number_paginator = None
+
+    def paginates(self, request):
+        params = (self.cursor_query_param, self.page_size_query_param, self.page_number_query_param)
+        return any(param in request.query_params for param in params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.paginates(request):
+            return None
+        if self.page_number_query_param in request.query_params:
+            self.page_number_paginator = PageNumberPagination()
+            return self.page_number_paginator.paginate_queryset(
+                queryset.order_by("created", "id"), request, view
+            )
+
+        return self.finish_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """Async variant for views running on the async ORM, cursor pagination only."""
+        return self.finish_page([item async for item in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        """Return the query for the page after the request cursor, one row longer than the page."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.position = self.decode_cursor(request)
+        self.reverse = self.position is not None and self.position[2]
+
+        if self.position is not None:
+            created, pk, _ = self.position
+            if self.reverse:
+                queryset = queryset.filter(
+                    Q(created__lt=created) | Q(created=created, id__lt=pk), created__lte=created
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created__gt=created) | Q(created=created, id__gt=pk), created__gte=created
+                )
+        ordering = ("-created", "-id") if self.reverse else ("created", "id")
+        return queryset.order_by(*ordering)[: self.page_size + 1]
+
+    def finish_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            direction, created, pk = base64.urlsafe_b64decode(encoded.encode("ascii")).decode("ascii").split("|")
+            return datetime.fromisoformat(created), int(pk), direction == "r"
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item, reverse):
+        raw = "|".join(("r" if reverse else "f", item.created.isoformat(), str(item.id)))
+        return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii")
+
+    def get_next_link(self):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1], False))
+
+    def get_previous_link(self):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_previous_link()
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[0], True))
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
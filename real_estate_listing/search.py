@@ -0,0 +1,131 @@
+"""Full-text search over listing descriptions and addresses."""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .fts import FTS_TABLE
+from .models import RealEstateItem
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def query_terms(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+class SearchHit:
+    def __init__(self, item, rank, snippet):
+        self.item = item
+        self.rank = rank
+        self.snippet = snippet
+
+
+class BaseSearchBackend:
+    """
+    Search listings whose text contains every term of the query.
+
+    ``filters`` is a dict with optional ``min_price``, ``max_price`` and
+    ``owner`` keys. Backends return a list of ``SearchHit`` in result order.
+    """
+
+    def search(self, query, filters, limit, offset=0):
+        raise NotImplementedError
+
+    @staticmethod
+    def filter_q(filters):
+        q = Q()
+        if filters.get("min_price") is not None:
+            q &= Q(price__gte=filters["min_price"])
+        if filters.get("max_price") is not None:
+            q &= Q(price__lte=filters["max_price"])
+        if filters.get("owner") is not None:
+            q &= Q(created_by=filters["owner"])
+        return q
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    Search the FTS5 index kept in sync with the listing table by triggers.
+
+    Results are ordered by BM25 and carry a highlighted snippet of the best
+    matching column. The last term is matched as a prefix so that partial
+    words typed by a user still find results.
+    """
+
+    snippet_tokens = 12
+
+    @staticmethod
+    def match_expression(terms):
+        quoted = ['"%s"' % term.replace('"', '""') for term in terms]
+        quoted[-1] += "*"
+        return " ".join(quoted)
+
+    def search(self, query, filters, limit, offset=0):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        where, params = [f"{FTS_TABLE} MATCH %s"], [self.match_expression(terms)]
+        if filters.get("min_price") is not None:
+            where.append("item.price >= %s")
+            params.append(filters["min_price"])
+        if filters.get("max_price") is not None:
+            where.append("item.price <= %s")
+            params.append(filters["max_price"])
+        if filters.get("owner") is not None:
+            where.append("item.created_by_id = %s")
+            params.append(filters["owner"])
+        sql = f"""
+            SELECT item.id, bm25({FTS_TABLE}) AS rank,
+                   snippet({FTS_TABLE}, -1, '[', ']', '...', {self.snippet_tokens})
+            FROM {FTS_TABLE}
+            JOIN real_estate_listing_realestateitem AS item ON item.id = {FTS_TABLE}.rowid
+            WHERE {" AND ".join(where)}
+            ORDER BY rank
+            LIMIT %s OFFSET %s
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, limit, offset])
+            rows = cursor.fetchall()
+        items = RealEstateItem.objects.in_bulk([row[0] for row in rows])
+        return [SearchHit(items[pk], rank, snippet) for pk, rank, snippet in rows if pk in items]
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """
+    Portable fallback for databases without an FTS5 index.
+
+    Every term has to appear in the description or the address. Matches are
+    returned newest first, ``rank`` is minus the number of term occurrences.
+    """
+
+    snippet_chars = 80
+
+    def search(self, query, filters, limit, offset=0):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        queryset = RealEstateItem.objects.filter(self.filter_q(filters))
+        for term in terms:
+            queryset = queryset.filter(Q(description__icontains=term) | Q(address__icontains=term))
+        items = queryset.order_by("-created", "-id")[offset:offset + limit]
+        return [self.hit(item, terms) for item in items]
+
+    def hit(self, item, terms):
+        text = f"{item.description} {item.address}"
+        lowered = text.lower()
+        rank = -sum(lowered.count(term) for term in terms)
+        start = max(lowered.find(terms[0]) - self.snippet_chars // 2, 0)
+        return SearchHit(item, rank, text[start:start + self.snippet_chars])
+
+
+def get_search_backend():
+    """Return the backend named by ``settings.LISTING_SEARCH_BACKEND``, FTS5 by default on SQLite."""
+    path = getattr(settings, "LISTING_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == "sqlite":
+        return SQLiteFTS5Backend()
+    return BasicSearchBackend()
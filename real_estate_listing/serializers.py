@@ -1,14 +1,55 @@
 from rest_framework import serializers
 
+from user_listing_proj.metrics import TimedListSerializer, TimedSerializerMixin
 from users.serializers import UserListSerializer, UserSerializer
 
-from .models import RealEstateItem
+from .models import RealEstateItem, SavedSearch, SearchAlert
 
 
-class RealEstateItemSerializer(serializers.ModelSerializer):
+class RealEstateItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = RealEstateItem
-        fields = "__all__"
+        exclude = ["change_version"]
+        list_serializer_class = TimedListSerializer
+
+
+class RealEstateItemImportSerializer(RealEstateItemSerializer):
+    """Validates imported rows, the owner is set by the importer."""
+
+    class Meta(RealEstateItemSerializer.Meta):
+        exclude = None
+        fields = ["description", "address", "price"]
+
+
+class RealEstateItemDraftSerializer(RealEstateItemSerializer):
+    """Listing to estimate a price for."""
+
+    class Meta(RealEstateItemSerializer.Meta):
+        exclude = None
+        fields = ["description", "address"]
+
+
+class SavedSearchSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = SavedSearch
+        fields = ["id", "name", "min_price", "max_price", "keywords", "owner", "active", "created", "modified"]
+        list_serializer_class = TimedListSerializer
+
+    def validate(self, attrs):
+        min_price = attrs.get("min_price", getattr(self.instance, "min_price", None))
+        max_price = attrs.get("max_price", getattr(self.instance, "max_price", None))
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError("min_price must not be above max_price")
+        return attrs
+
+
+class SearchAlertSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    listing = RealEstateItemSerializer(read_only=True)
+
+    class Meta:
+        model = SearchAlert
+        fields = ["id", "saved_search", "listing", "created", "delivered_at"]
+        list_serializer_class = TimedListSerializer
 
 
 # class RealEstateItemGetSerializer(serializers.ModelSerializer):
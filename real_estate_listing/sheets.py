@@ -0,0 +1,207 @@
+"""Batched Google Sheets reporting for real estate listings."""
+import threading
+import time
+
+import gspread
+from django.conf import settings
+from django.utils.module_loading import import_string
+from oauth2client.service_account import ServiceAccountCredentials
+
+from user_listing_proj.metrics import timed_sheets_call
+
+from .models import RealEstateItem
+
+SHEET_HEADER = ["id", "owner", "description", "price", "address"]
+
+
+def listing_row(item):
+    """Return the sheet row for a listing, keyed on the listing id."""
+    return [str(item.id), item.created_by.email, item.description, str(item.price), item.address]
+
+
+def is_listing_row(row):
+    """Whether a sheet row has the id layout, legacy rows start with the owner's email."""
+    return bool(row) and row[0].isdigit()
+
+
+class GspreadSheetBackend:
+    """Sheet backend that keeps one authorized gspread client for the process."""
+
+    scope = [
+        "https://spreadsheets.google.com/feeds",
+        "https://www.googleapis.com/auth/spreadsheets",
+        "https://www.googleapis.com/auth/drive.file",
+        "https://www.googleapis.com/auth/drive",
+    ]
+
+    def __init__(self, credentials_file, spreadsheet):
+        self.credentials_file = str(credentials_file)
+        self.spreadsheet = spreadsheet
+        self._worksheet = None
+        self._lock = threading.Lock()
+
+    @property
+    def worksheet(self):
+        if self._worksheet is None:
+            with self._lock:
+                if self._worksheet is None:
+                    creds = ServiceAccountCredentials.from_json_keyfile_name(
+                        self.credentials_file, self.scope
+                    )
+                    client = gspread.authorize(creds)
+                    self._worksheet = client.open(self.spreadsheet).sheet1
+        return self._worksheet
+
+    def append_rows(self, rows):
+        self.worksheet.append_rows(rows, value_input_option="RAW")
+
+    def update_rows(self, updates):
+        """Overwrite rows in place, ``updates`` maps 1-based row numbers to rows."""
+        self.worksheet.batch_update(
+            [{"range": f"A{number}", "values": [row]} for number, row in updates.items()],
+            value_input_option="RAW",
+        )
+
+    def get_all_values(self):
+        return self.worksheet.get_all_values()
+
+
+class FakeSheetBackend:
+    """In-memory sheet used for tests and offline throughput benchmarks.
+
+    ``latency`` is slept on every call to stand in for the Google API round trip.
+    """
+
+    def __init__(self, latency=0.0, **kwargs):
+        self.latency = latency
+        self.rows = []
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def append_rows(self, rows):
+        self._call()
+        self.rows.extend([list(row) for row in rows])
+
+    def update_rows(self, updates):
+        self._call()
+        for number, row in updates.items():
+            self.rows[number - 1] = list(row)
+
+    def get_all_values(self):
+        self._call()
+        return [list(row) for row in self.rows]
+
+
+class SheetSyncEngine:
+    """Write listings to the sheet, one call per batch of listings.
+
+    Batching happens in the outbox: the ``gsheets.append`` handler pushes the
+    ids of every message it claimed at once.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+
+    def push(self, listing_ids):
+        """Append the given listings with one sheet call, return the number written."""
+        items = RealEstateItem.objects.filter(id__in=listing_ids).select_related("created_by")
+        rows = [listing_row(item) for item in items.order_by("id")]
+        if rows:
+            with self._lock, timed_sheets_call("append_rows"):
+                self.backend.append_rows(rows)
+        return len(rows)
+
+    def resync(self, chunk_size=2000):
+        """Rewrite only the sheet rows that differ from the database.
+
+        The sheet is read once, rows are matched on the id column, changed rows
+        are overwritten in place and missing listings are appended in one call.
+
+        Rows of the legacy layout (owner, description, price, address, no id)
+        are matched on their content instead, first exactly then on owner and
+        description, and rewritten in place in the id layout. Returns a dict
+        with the number of ``updated``, ``appended``, ``unchanged`` and
+        ``migrated`` rows and of ``legacy`` rows matching no listing, which
+        are left as they are.
+        """
+        with self._lock:
+            with timed_sheets_call("get_all_values"):
+                values = self.backend.get_all_values()
+            if not values:
+                with timed_sheets_call("append_rows"):
+                    self.backend.append_rows([SHEET_HEADER])
+                values = [SHEET_HEADER]
+            existing, legacy_exact, legacy_loose = {}, {}, {}
+            for number, row in enumerate(values, start=1):
+                if row[: len(SHEET_HEADER)] == SHEET_HEADER:
+                    continue
+                if is_listing_row(row):
+                    existing[row[0]] = (number, row)
+                elif any(row):
+                    legacy_exact.setdefault(tuple(row[:4]), []).append(number)
+                    legacy_loose.setdefault(tuple(row[:2]), []).append(number)
+
+            def claim_legacy(row):
+                for numbers, key in ((legacy_exact, tuple(row[1:])), (legacy_loose, tuple(row[1:3]))):
+                    while numbers.get(key):
+                        number = numbers[key].pop(0)
+                        if number not in updates:
+                            return number
+                return None
+
+            updates, appends, unchanged, migrated = {}, [], 0, 0
+            items = RealEstateItem.objects.select_related("created_by").order_by("id")
+            for item in items.iterator(chunk_size=chunk_size):
+                row = listing_row(item)
+                number, current = existing.get(row[0], (None, None))
+                if number is None:
+                    number = claim_legacy(row)
+                    if number is None:
+                        appends.append(row)
+                    else:
+                        updates[number] = row
+                        migrated += 1
+                elif current[: len(row)] != row:
+                    updates[number] = row
+                else:
+                    unchanged += 1
+            legacy = len({number for numbers in legacy_exact.values() for number in numbers} - set(updates))
+            if updates:
+                with timed_sheets_call("update_rows"):
+                    self.backend.update_rows(updates)
+            if appends:
+                with timed_sheets_call("append_rows"):
+                    self.backend.append_rows(appends)
+            return {
+                "updated": len(updates) - migrated,
+                "appended": len(appends),
+                "unchanged": unchanged,
+                "migrated": migrated,
+                "legacy": legacy,
+            }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def build_sync_engine(**overrides):
+    """Build a sync engine from ``settings.GSHEETS`` with optional overrides."""
+    config = {**settings.GSHEETS, **overrides}
+    backend_class = import_string(config["BACKEND"])
+    return SheetSyncEngine(backend_class(**config.get("OPTIONS", {})))
+
+
+def get_sync_engine():
+    """Return the process wide sync engine."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = build_sync_engine()
+    return _engine
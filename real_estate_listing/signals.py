@@ -0,0 +1,158 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import outbox
+from .caching import invalidate_listing, invalidate_owners
+from .changes import record_tombstone, stamp_changes
+from .dedup import get_lsh
+from .geo import get_geocoding_service
+from .live import CREATED, DELETED, UPDATED, publish_listings
+from .models import RealEstateItem
+from .stats import record_price_changes
+from .tasks import PRICE_STATS_FOLD
+from .valuation import mark_listings_changed
+
+# Sent with ``items`` after listings are inserted with bulk_create, which
+# skips the per instance save signals. Sent inside the inserting transaction.
+listings_bulk_created = Signal()
+
+
+@receiver(pre_save, sender=RealEstateItem)
+def geocode_listing(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None:
+        get_geocoding_service().apply(instance)
+
+
+@receiver(post_init, sender=RealEstateItem)
+def remember_loaded_price(sender, instance, **kwargs):
+    """Keep the owner and price the instance was loaded with, post_save applies the difference."""
+    loaded = instance.__dict__
+    if "price" in loaded and "created_by_id" in loaded:
+        instance._stored_price = (loaded["created_by_id"], loaded["price"])
+    else:
+        instance._stored_price = None
+
+
+@receiver(pre_save, sender=RealEstateItem)
+def remember_stored_price(sender, instance, raw=False, **kwargs):
+    """Instances loaded with a deferred price read the stored one, the others need no query."""
+    if not raw and not instance._state.adding and getattr(instance, "_stored_price", None) is None:
+        instance._stored_price = (
+            RealEstateItem.objects.filter(pk=instance.pk).values_list("created_by_id", "price").first()
+        )
+
+
+def record_prices(added=(), removed=()):
+    if record_price_changes(added, removed):
+        outbox.enqueue(PRICE_STATS_FOLD, {})
+
+
+@receiver(post_save, sender=RealEstateItem)
+def update_price_summaries(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    stored = None if created else getattr(instance, "_stored_price", None)
+    current = (instance.created_by_id, Decimal(instance.price))
+    # The instance may be saved again.
+    instance._stored_price = current
+    if stored is not None and (stored[0], Decimal(stored[1])) == current:
+        return
+    record_prices(added=[current], removed=[stored] if stored else [])
+
+
+@receiver(post_delete, sender=RealEstateItem)
+def remove_price_from_summaries(sender, instance, **kwargs):
+    record_prices(removed=[(instance.created_by_id, instance.price)])
+
+
+@receiver(listings_bulk_created, sender=RealEstateItem)
+def add_bulk_prices_to_summaries(sender, items, **kwargs):
+    record_prices(added=[(item.created_by_id, item.price) for item in items])
+
+
+@receiver(post_save, sender=RealEstateItem)
+@receiver(post_delete, sender=RealEstateItem)
+def invalidate_cached_responses(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    pk, owners = instance.pk, {instance.created_by_id}
+    stored = getattr(instance, "_stored_price", None)
+    if stored is not None:
+        owners.add(stored[0])
+    # After commit, so that a concurrent read cannot cache the old rows again.
+    transaction.on_commit(lambda: invalidate_listing(pk, *owners))
+
+
+@receiver(listings_bulk_created, sender=RealEstateItem)
+def invalidate_bulk_created_owners(sender, items, **kwargs):
+    owners = {item.created_by_id for item in items}
+    transaction.on_commit(lambda: invalidate_owners(*owners))
+
+
+@receiver(post_save, sender=RealEstateItem)
+@receiver(post_delete, sender=RealEstateItem)
+@receiver(listings_bulk_created, sender=RealEstateItem)
+def refresh_valuation_matrix(sender, raw=False, **kwargs):
+    if not raw:
+        mark_listings_changed()
+
+
+@receiver(post_init, sender=RealEstateItem)
+def remember_loaded_text(sender, instance, **kwargs):
+    """Keep the description and address the instance was loaded with, unchanged text is not indexed again."""
+    loaded = instance.__dict__
+    if "description" in loaded and "address" in loaded:
+        instance._stored_text = (loaded["description"], loaded["address"])
+    else:
+        instance._stored_text = None
+
+
+@receiver(post_save, sender=RealEstateItem)
+def index_listing_text(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {"description", "address"} & set(update_fields)):
+        return
+    current = (instance.description, instance.address)
+    if not created and getattr(instance, "_stored_text", None) == current:
+        return
+    get_lsh().index([instance])
+    # The instance may be saved again.
+    instance._stored_text = current
+
+
+@receiver(listings_bulk_created, sender=RealEstateItem)
+def index_bulk_created_text(sender, items, **kwargs):
+    get_lsh().index(items)
+
+
+@receiver(post_delete, sender=RealEstateItem)
+def record_listing_tombstone(sender, instance, **kwargs):
+    """Recorded in the deleting transaction, for clients following the change feed."""
+    record_tombstone(instance)
+
+
+@receiver(post_save, sender=RealEstateItem)
+@receiver(post_delete, sender=RealEstateItem)
+@receiver(listings_bulk_created, sender=RealEstateItem)
+def stamp_listing_changes(sender, raw=False, **kwargs):
+    """Give the change feed versions to the rows of the writing transaction once it committed."""
+    if not raw:
+        transaction.on_commit(stamp_changes)
+
+
+@receiver(post_save, sender=RealEstateItem)
+def publish_saved_listing(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        publish_listings(CREATED if created else UPDATED, [instance])
+
+
+@receiver(post_delete, sender=RealEstateItem)
+def publish_deleted_listing(sender, instance, **kwargs):
+    publish_listings(DELETED, [instance])
+
+
+@receiver(listings_bulk_created, sender=RealEstateItem)
+def publish_bulk_created_listings(sender, items, **kwargs):
+    publish_listings(CREATED, items)
@@ -0,0 +1,289 @@
+"""
+Incrementally maintained listing price statistics.
+
+Listing writes only append ``PriceDelta`` rows. ``fold_price_deltas``, run
+by the outbox worker, applies them to the ``PriceSummary`` rows and deletes
+them, so writers never wait on the summary rows. Reads apply a bounded number
+of the deltas not folded yet on top of the stored summary.
+"""
+import math
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Max, Min
+
+from .models import PriceDelta, PriceSummary, RealEstateItem
+
+DEFAULT_HISTOGRAM_EDGES = [0, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000]
+PERCENTILES = (50, 90, 95, 99)
+
+
+def histogram_edges():
+    return getattr(settings, "PRICE_HISTOGRAM_EDGES", DEFAULT_HISTOGRAM_EDGES)
+
+
+def owner_scope(owner_id):
+    return f"owner:{owner_id}"
+
+
+class PriceSketch:
+    """
+    Mergeable quantile sketch with bounded relative error (DDSketch style).
+
+    Prices fall into logarithmic buckets ``ceil(log_gamma(price))`` so every
+    estimated percentile is within ``relative_accuracy`` of an actual price.
+    Buckets are plain counters, which makes the sketch cheap to update, to
+    decrement when a listing goes away and to merge across owners.
+    """
+
+    relative_accuracy = 0.01
+
+    def __init__(self, buckets=None, zero_count=0):
+        self.gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = defaultdict(int, {int(key): value for key, value in (buckets or {}).items()})
+        self.zero_count = zero_count
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data.get("buckets"), data.get("zero", 0))
+
+    def to_json(self):
+        return {"zero": self.zero_count, "buckets": {str(key): value for key, value in self.buckets.items() if value}}
+
+    def _key(self, price):
+        return math.ceil(math.log(float(price)) / self.log_gamma)
+
+    def add(self, price, count=1):
+        if price <= 0:
+            self.zero_count += count
+        else:
+            self.buckets[self._key(price)] += count
+
+    def remove(self, price):
+        self.add(price, -1)
+
+    def merge(self, other):
+        self.zero_count += other.zero_count
+        for key, value in other.buckets.items():
+            self.buckets[key] += value
+
+    def quantile(self, fraction):
+        total = self.zero_count + sum(self.buckets.values())
+        if total <= 0:
+            return None
+        rank = fraction * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class SummaryState:
+    """In-memory view of a ``PriceSummary`` row that price changes are applied to."""
+
+    def __init__(self, summary):
+        self.summary = summary
+        edges = histogram_edges()
+        self.histogram = list(summary.histogram) or [0] * len(edges)
+        self.sketch = PriceSketch.from_json(summary.sketch)
+        self.needs_bounds = False
+
+    def add(self, price):
+        summary = self.summary
+        summary.count += 1
+        summary.total += price
+        if summary.min_price is None or price < summary.min_price:
+            summary.min_price = price
+        if summary.max_price is None or price > summary.max_price:
+            summary.max_price = price
+        self.histogram[max(bisect_right(histogram_edges(), price) - 1, 0)] += 1
+        self.sketch.add(price)
+
+    def remove(self, price):
+        summary = self.summary
+        summary.count = max(summary.count - 1, 0)
+        summary.total -= price
+        if price in (summary.min_price, summary.max_price):
+            self.needs_bounds = True
+        bucket = max(bisect_right(histogram_edges(), price) - 1, 0)
+        self.histogram[bucket] = max(self.histogram[bucket] - 1, 0)
+        self.sketch.remove(price)
+
+    def apply(self, price, change):
+        if change > 0:
+            self.add(price)
+        else:
+            self.remove(price)
+
+    def settle(self):
+        """Bring the summary fields up to date, without saving them."""
+        summary = self.summary
+        if self.needs_bounds:
+            # Only removing the current minimum or maximum needs the bounds of the scope,
+            # answered from the price indexes.
+            listings = RealEstateItem.objects.all()
+            if summary.owner_id is not None:
+                listings = listings.filter(created_by_id=summary.owner_id)
+            bounds = listings.aggregate(min_price=Min("price"), max_price=Max("price"))
+            summary.min_price, summary.max_price = bounds["min_price"], bounds["max_price"]
+            self.needs_bounds = False
+        if summary.count == 0:
+            summary.total = Decimal(0)
+            summary.min_price = summary.max_price = None
+        summary.histogram = self.histogram
+        summary.sketch = self.sketch.to_json()
+        return summary
+
+    def save(self):
+        self.settle().save()
+
+
+def _locked_state(scope, owner_id, create):
+    queryset = PriceSummary.objects.select_for_update()
+    if create:
+        summary, _ = queryset.get_or_create(scope=scope, defaults={"owner_id": owner_id})
+    else:
+        summary = queryset.filter(scope=scope).first()
+        if summary is None:
+            return None
+    return SummaryState(summary)
+
+
+def record_price_changes(added=(), removed=()):
+    """
+    Record listing changes as price deltas in the current transaction, return how many.
+
+    ``added`` and ``removed`` are iterables of ``(owner_id, price)``. An update
+    is the removal of the old values plus the addition of the new ones.
+    """
+    deltas = [PriceDelta(owner_id=owner_id, price=price, change=-1) for owner_id, price in removed]
+    deltas += [PriceDelta(owner_id=owner_id, price=price, change=1) for owner_id, price in added]
+    PriceDelta.objects.bulk_create(deltas)
+    return len(deltas)
+
+
+def fold_price_deltas(batch_size=5000):
+    """Apply the oldest pending deltas to the summaries and delete them, return how many were folded."""
+    with transaction.atomic():
+        # Folders take turns on the global row, listing writes never touch it.
+        states = {PriceSummary.GLOBAL_SCOPE: _locked_state(PriceSummary.GLOBAL_SCOPE, None, True)}
+        deltas = list(PriceDelta.objects.order_by("id")[:batch_size])
+        if not deltas:
+            return 0
+        adding = {delta.owner_id for delta in deltas if delta.change > 0}
+        for owner_id in {delta.owner_id for delta in deltas}:
+            states[owner_id] = _locked_state(owner_scope(owner_id), owner_id, owner_id in adding)
+        for delta in deltas:
+            for key in (PriceSummary.GLOBAL_SCOPE, delta.owner_id):
+                if states[key] is not None:
+                    states[key].apply(delta.price, delta.change)
+        for state in states.values():
+            if state is not None:
+                state.save()
+        PriceDelta.objects.filter(id__in=[delta.id for delta in deltas]).delete()
+    return len(deltas)
+
+
+def current_summary(owner_id=None, max_deltas=None):
+    """
+    The summary of an owner, or the global one, with the pending deltas applied.
+    Nothing is written, ``None`` when the scope has neither a summary nor deltas.
+
+    At most ``max_deltas`` (``PRICE_SUMMARY_MAX_READ_DELTAS``) of the oldest
+    pending deltas are applied, so a backlog the outbox has not folded yet
+    makes the summary lag behind instead of making every read slower.
+    """
+    if max_deltas is None:
+        max_deltas = getattr(settings, "PRICE_SUMMARY_MAX_READ_DELTAS", 1000)
+    scope = PriceSummary.GLOBAL_SCOPE if owner_id is None else owner_scope(owner_id)
+    deltas = PriceDelta.objects.order_by("id")
+    if owner_id is not None:
+        deltas = deltas.filter(owner_id=owner_id)
+    # One transaction, so a fold in between cannot drop deltas from both reads.
+    with transaction.atomic():
+        summary = PriceSummary.objects.filter(scope=scope).first()
+        deltas = list(deltas.values_list("price", "change")[:max_deltas])
+    if not deltas:
+        return summary
+    if summary is None:
+        summary = PriceSummary(scope=scope, owner_id=owner_id, count=0, total=Decimal(0), histogram=[], sketch={})
+    state = SummaryState(summary)
+    for price, change in deltas:
+        state.apply(price, change)
+    return state.settle()
+
+
+def rebuild_price_summaries(chunk_size=5000):
+    """
+    Recompute every summary with one pass over the listing table, return the number of scopes.
+
+    The high-water mark of the deltas and the scan share one transaction,
+    which starts by writing so it holds the database write lock: listing
+    writes wait for the rebuild, and the scan sees exactly the changes of
+    the deltas up to the mark, which it replaces.
+    """
+    using = router.db_for_write(PriceSummary)
+    states = defaultdict(
+        lambda: SummaryState(PriceSummary(count=0, total=Decimal(0), histogram=[], sketch={}))
+    )
+    with transaction.atomic(using=using):
+        PriceSummary.objects.using(using).all().delete()
+        folded_through = PriceDelta.objects.using(using).aggregate(last=Max("id"))["last"] or 0
+        rows = RealEstateItem.objects.using(using).order_by().values_list("created_by_id", "price")
+        for owner_id, price in rows.iterator(chunk_size=chunk_size):
+            states[PriceSummary.GLOBAL_SCOPE].add(price)
+            states[owner_id].add(price)
+        # The global summary exists even when there are no listings.
+        states[PriceSummary.GLOBAL_SCOPE]
+        summaries = []
+        for key, state in states.items():
+            summary = state.summary
+            if key == PriceSummary.GLOBAL_SCOPE:
+                summary.scope, summary.owner_id = key, None
+            else:
+                summary.scope, summary.owner_id = owner_scope(key), key
+            summary.histogram = state.histogram
+            summary.sketch = state.sketch.to_json()
+            summaries.append(summary)
+        PriceSummary.objects.using(using).bulk_create(summaries, batch_size=500)
+        PriceDelta.objects.using(using).filter(id__lte=folded_through).delete()
+    return len(summaries)
+
+
+def _price(value):
+    """Render prices as strings with two decimals, like the listing serializer does."""
+    return None if value is None else str(Decimal(value).quantize(Decimal("0.01")))
+
+
+def summary_report(summary):
+    """Return the API representation of a summary, computed without touching the listing table."""
+    edges = histogram_edges()
+    if summary is None or not summary.count:
+        return {"count": 0, "min": None, "max": None, "mean": None, "percentiles": {}, "histogram": []}
+    sketch = PriceSketch.from_json(summary.sketch)
+    histogram = list(summary.histogram) or [0] * len(edges)
+    return {
+        "count": summary.count,
+        "min": _price(summary.min_price),
+        "max": _price(summary.max_price),
+        "mean": _price(summary.total / summary.count),
+        "percentiles": {
+            # Sketch estimates are bucket midpoints, keep them inside the exact bounds.
+            f"p{percentile}": _price(
+                min(max(Decimal(sketch.quantile(percentile / 100)), summary.min_price), summary.max_price)
+            )
+            for percentile in PERCENTILES
+        },
+        "histogram": [
+            {"min": edge, "max": edges[index + 1] if index + 1 < len(edges) else None, "count": histogram[index]}
+            for index, edge in enumerate(edges)
+        ],
+    }
@@ -0,0 +1,45 @@
+"""Outbox task handlers, discovered by the ``run_outbox_worker`` command."""
+from django.db import transaction
+
+from . import outbox
+from .alerts import deliver_alerts, match_listings
+from .sheets import get_sync_engine
+from .stats import fold_price_deltas
+
+GSHEETS_APPEND = "gsheets.append"
+SAVED_SEARCH_MATCH = "saved_search.match"
+ALERT_DELIVER = "saved_search.deliver"
+PRICE_STATS_FOLD = "price_stats.fold"
+ALERTS_PER_DELIVERY = 500
+
+
+@outbox.handler(GSHEETS_APPEND)
+def push_listings_to_sheet(payloads):
+    """Append the listings to the RealEstateData sheet with one call."""
+    get_sync_engine().push(list(dict.fromkeys(payload["listing_id"] for payload in payloads)))
+
+
+@outbox.handler(SAVED_SEARCH_MATCH)
+def match_saved_searches(payloads):
+    """Match new listings against every saved search and queue the delivery of the alerts."""
+    with transaction.atomic():
+        alert_ids = match_listings(list(dict.fromkeys(payload["listing_id"] for payload in payloads)))
+        outbox.enqueue_many(
+            ALERT_DELIVER,
+            (
+                {"alert_ids": alert_ids[start:start + ALERTS_PER_DELIVERY]}
+                for start in range(0, len(alert_ids), ALERTS_PER_DELIVERY)
+            ),
+        )
+
+
+@outbox.handler(ALERT_DELIVER)
+def deliver_saved_search_alerts(payloads):
+    deliver_alerts([alert_id for payload in payloads for alert_id in payload["alert_ids"]])
+
+
+@outbox.handler(PRICE_STATS_FOLD)
+def fold_price_statistics(payloads):
+    """Fold every pending price delta into the summaries, whichever write queued the task."""
+    while fold_price_deltas():
+        pass
@@ -1,3 +1,1408 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import subprocess
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from real_estate_listing import caching, outbox
+from real_estate_listing.alerts import IntervalTree, claim_alerts, deliver_alerts, match_listings
+from real_estate_listing.analytics import ListingSnapshot, read_pointer, refresh_snapshot
+from real_estate_listing.changes import changes_since, compact_tombstones, encode_cursor, stamp_changes
+from real_estate_listing.dedup import MinHashLSH, cluster_duplicates, find_duplicates, shingles
+from real_estate_listing.fts import FTS_TABLE
+from real_estate_listing.geo import MAX_QUERY_CELLS, covering_cells, encode_geohash, haversine_km, within_radius
+from real_estate_listing.importing import ListingImporter, decode_lines, iter_rows
+from real_estate_listing.live import CREATED, EVICTED, ListingBroker
+from real_estate_listing.models import (
+    ChangeSequence,
+    ListingTombstone,
+    OutboxTask,
+    PriceDelta,
+    PriceSummary,
+    RealEstateItem,
+    SavedSearch,
+    SearchAlert,
+)
+from real_estate_listing.search import SQLiteFTS5Backend
+from real_estate_listing.sheets import SHEET_HEADER, FakeSheetBackend, SheetSyncEngine, listing_row
+from real_estate_listing.stats import (
+    PriceSketch,
+    current_summary,
+    fold_price_deltas,
+    owner_scope,
+    rebuild_price_summaries,
+    summary_report,
+)
+from real_estate_listing.valuation import ValuationEngine
+from user_listing_proj import metrics, routers
+from user_listing_proj.limiter import ConcurrencyLimiter, GradientLimit
+from user_listing_proj.metrics import (
+    AGGREGATE_FILE,
+    MetricsRegistry,
+    collected_snapshots,
+    merge,
+    process_start,
+    render,
+)
+from users.models import BaseUser
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TestCase):
+    """The ``replica`` alias is a second SQLite file holding different rows than the primary."""
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        routers.metrics.reset()
+        routers.health.mark_up("replica")
+        self.user = BaseUser.objects.create(email="owner@example.com", username="")
+        BaseUser.objects.using("replica").create(pk=self.user.pk, email="owner@example.com", username="")
+        self.primary_item = RealEstateItem.objects.create(
+            description="On the primary", address="Lahore", price=100, created_by=self.user
+        )
+        RealEstateItem.objects.using("replica").create(
+            description="On the replica", address="Lahore", price=200, created_by_id=self.user.pk
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def descriptions(self, response):
+        return [item["description"] for item in response.json()]
+
+    def test_safe_requests_read_from_replica(self):
+        response = self.client.get("/realestates/")
+        self.assertEqual(self.descriptions(response), ["On the replica"])
+        self.assertGreater(routers.query_metrics()["aliases"]["replica"]["queries"], 0)
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(
+            list(RealEstateItem.objects.values_list("description", flat=True)), ["On the primary"]
+        )
+
+    def test_other_models_read_from_primary(self):
+        response = self.client.get("/realestates/stats/?owner=me")
+        fold_price_deltas()
+        summary = PriceSummary.objects.get(scope=owner_scope(self.user.pk))
+        self.assertEqual(response.json()["count"], summary.count)
+        self.assertFalse(PriceSummary.objects.using("replica").exists())
+
+    def test_user_reads_primary_after_write(self):
+        response = self.client.post(
+            "/realestates/", {"description": "New", "address": "Lahore", "price": "50.00"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(RealEstateItem.objects.using("replica").filter(description="New").exists())
+        response = self.client.get("/realestates/")
+        self.assertEqual(self.descriptions(response), ["On the primary", "New"])
+
+    def test_write_is_seen_by_another_process(self):
+        self.client.patch(f"/realestates/{self.primary_item.pk}/", {"price": "120.00"}, format="json")
+        # The next request lands on a worker whose cache never saw the write.
+        cache.clear()
+        response = self.client.get("/realestates/")
+        self.assertEqual(self.descriptions(response), ["On the primary"])
+
+    def test_write_is_remembered_for_clients_without_cookies(self):
+        self.client.patch(f"/realestates/{self.primary_item.pk}/", {"price": "120.00"}, format="json")
+        self.client.cookies.clear()
+        response = self.client.get("/realestates/")
+        self.assertEqual(self.descriptions(response), ["On the primary"])
+
+    def test_unsigned_sticky_cookie_is_ignored(self):
+        self.client.cookies[routers.routing_setting("STICKY_COOKIE", "db_sticky")] = str(self.user.pk)
+        response = self.client.get("/realestates/")
+        self.assertEqual(self.descriptions(response), ["On the replica"])
+
+    def test_sticky_window_expires(self):
+        with override_settings(REPLICA_ROUTING={"STICKY_SECONDS": 5}):
+            self.client.patch(f"/realestates/{self.primary_item.pk}/", {"price": "120.00"}, format="json")
+        cache.delete(routers.sticky_key(self.user.pk))
+        self.client.cookies.clear()
+        response = self.client.get("/realestates/")
+        self.assertEqual(self.descriptions(response), ["On the replica"])
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        routers.health.mark_down("replica")
+        response = self.client.get("/realestates/")
+        self.assertEqual(self.descriptions(response), ["On the primary"])
+        self.assertGreater(routers.query_metrics()["fallbacks"], 0)
+
+    def test_replica_is_probed_again_after_retry(self):
+        with override_settings(REPLICA_ROUTING={"RETRY_SECONDS": 0}):
+            routers.health.mark_down("replica")
+            self.assertTrue(routers.health.is_healthy("replica"))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        response = self.client.get("/realestates/")
+        self.assertEqual(self.descriptions(response), ["On the primary"])
+
+
+def setUpModule():
+    # Metrics files of the requests made by the tests go to a temporary directory.
+    global metrics_directory, metrics_settings
+    metrics_directory = tempfile.TemporaryDirectory()
+    metrics_settings = override_settings(METRICS={**settings.METRICS, "DIR": metrics_directory.name})
+    metrics_settings.enable()
+
+
+def tearDownModule():
+    metrics_settings.disable()
+    metrics_directory.cleanup()
+    metrics.registry.reset()
+
+
+class FastSerializationTests(TestCase):
+    """The fast list path must return exactly the bytes of the DRF serializers."""
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.user = BaseUser.objects.create(email="fast@example.com", username="")
+        rows = [
+            ("Plain", "1 Mall Road", Decimal("100"), 31.5204, 74.3587),
+            ("Ünïcode ✓ 日本", "Line\u2028separator\u2029", Decimal("0.5"), None, None),
+            ('Quotes " \\ and \x00\x1f controls\n\t', "</script>", Decimal("99999999.99"), 0.0, -0.0),
+            ("Tiny and huge floats", "", Decimal("1.10"), 1e-7, 1.5e16),
+            ("Emoji 🏠", "Path/with/slashes", Decimal("12345.6"), -33.8688, 151.2093),
+        ]
+        items = RealEstateItem.objects.bulk_create(
+            RealEstateItem(description=description, address=address, price=price, created_by=self.user)
+            for description, address, price, _, _ in rows
+        )
+        for item, (_, _, _, latitude, longitude) in zip(items, rows):
+            RealEstateItem.objects.filter(pk=item.pk).update(latitude=latitude, longitude=longitude)
+        # A timestamp without microseconds is formatted without the fraction.
+        RealEstateItem.objects.filter(pk=items[0].pk).update(modified=timezone.now().replace(microsecond=0))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # The async views authenticate the bearer token themselves.
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def fetch(self, path, fast):
+        cache.clear()
+        with override_settings(FAST_SERIALIZATION=fast):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertSameBytes(self, path):
+        slow, fast = self.fetch(path, False), self.fetch(path, True)
+        self.assertEqual(fast.content, slow.content)
+        self.assertEqual(fast["Content-Type"], slow["Content-Type"])
+        return fast
+
+    def test_listing_cursor_pages(self):
+        response = self.assertSameBytes("/realestates/?page_size=2")
+        next_link = response.json()["next"]
+        self.assertIsNotNone(next_link)
+        self.assertSameBytes(next_link)
+
+    def test_listing_page_numbers(self):
+        self.assertSameBytes("/realestates/?page=1&page_size=3")
+
+    def test_listing_without_unsafe_floats(self):
+        RealEstateItem.objects.filter(description="Tiny and huge floats").delete()
+        self.assertSameBytes("/realestates/")
+
+    def test_async_listing(self):
+        self.assertSameBytes("/async/realestates/?page_size=2")
+
+    def test_other_time_zone(self):
+        with timezone.override("Asia/Karachi"):
+            self.assertSameBytes("/realestates/")
+
+    def test_indented_json_uses_renderer(self):
+        with override_settings(FAST_SERIALIZATION=True):
+            response = self.client.get("/realestates/?page_size=2", HTTP_ACCEPT="application/json; indent=4")
+        self.assertTrue(response.content.startswith(b'{\n    "next"'))
+
+
+class SheetResyncTests(TestCase):
+    def setUp(self):
+        self.user = BaseUser.objects.create(email="sheet@example.com", username="")
+        self.first, self.second, self.third = (
+            RealEstateItem.objects.create(description=name, address="Lahore", price=price, created_by=self.user)
+            for name, price in (("First", 100), ("Second", 200), ("Third", 300))
+        )
+        for item in (self.first, self.second, self.third):
+            item.refresh_from_db()
+        self.backend = FakeSheetBackend()
+        self.engine = SheetSyncEngine(self.backend)
+
+    def test_rows_are_matched_on_id(self):
+        self.backend.rows = [SHEET_HEADER, listing_row(self.first), [str(self.second.id), "old", "", "", ""]]
+        result = self.engine.resync()
+        self.assertEqual((result["updated"], result["appended"], result["unchanged"]), (1, 1, 1))
+        self.assertEqual(self.backend.rows[1:], [listing_row(item) for item in (self.first, self.second, self.third)])
+
+    def test_legacy_rows_are_rewritten_in_place(self):
+        # The old code inserted [email, description, price, address] at the top of the sheet.
+        RealEstateItem.objects.filter(pk=self.second.pk).update(price=250)
+        self.backend.rows = [
+            ["sheet@example.com", "Second", "200.00", "Lahore"],
+            ["sheet@example.com", "First", "100.00", "Lahore"],
+            ["gone@example.com", "Deleted", "1.00", "Karachi"],
+        ]
+        result = self.engine.resync()
+        self.assertEqual(result, {"updated": 0, "appended": 1, "unchanged": 0, "migrated": 2, "legacy": 1})
+        self.second.refresh_from_db()
+        self.assertEqual(self.backend.rows[0], listing_row(self.second))
+        self.assertEqual(self.backend.rows[1], listing_row(self.first))
+        self.assertEqual(self.backend.rows[3], listing_row(self.third))
+        self.assertEqual(self.engine.resync()["unchanged"], 3)
+
+
+@mock.patch("real_estate_listing.outbox.close_old_connections", mock.Mock())
+class OutboxWorkerTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        handlers = {"test.ok": self.calls.append, "test.fail": mock.Mock(side_effect=RuntimeError("down"))}
+        patcher = mock.patch.dict(outbox._handlers, handlers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.worker = outbox.OutboxWorker(
+            concurrency=1, batch_size=10, max_attempts=3, backoff_base=2, lease_seconds=60
+        )
+
+    def test_claim_leases_tasks_once(self):
+        outbox.enqueue_many("test.ok", [{"n": 1}, {"n": 2}])
+        grouped = self.worker.claim()
+        self.assertEqual([task.payload for task in grouped["test.ok"]], [{"n": 1}, {"n": 2}])
+        task = OutboxTask.objects.first()
+        self.assertEqual(task.status, OutboxTask.RUNNING)
+        self.assertGreater(task.available_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(outbox.OutboxWorker().claim(), {})
+
+    def test_expired_lease_is_claimed_again(self):
+        outbox.enqueue("test.ok", {"n": 1})
+        first = self.worker.claim()["test.ok"][0].claimed_by
+        OutboxTask.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+        second = self.worker.claim()["test.ok"][0]
+        self.assertNotEqual(first, second.claimed_by)
+        # The expired run counts as an attempt.
+        self.assertEqual(second.attempts, 1)
+
+    def test_expired_lease_of_the_last_attempt_fails(self):
+        outbox.enqueue_many("test.ok", [{"n": 1}, {"n": 2}])
+        self.worker.claim()
+        OutboxTask.objects.filter(payload={"n": 1}).update(attempts=2)
+        OutboxTask.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([task.payload for task in self.worker.claim()["test.ok"]], [{"n": 2}])
+        failed = OutboxTask.objects.get(status=OutboxTask.FAILED)
+        self.assertEqual((failed.payload, failed.attempts, failed.claimed_by), ({"n": 1}, 3, ""))
+        self.assertIn("Lease expired", failed.last_error)
+
+    def test_batches_settle_only_their_own_lease(self):
+        outbox.enqueue("test.ok", {"n": 1})
+        outbox.enqueue("test.fail", {"n": 2})
+        stale = self.worker.claim()
+        OutboxTask.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+        current = self.worker.claim()
+        self.worker.run_batch("test.ok", stale["test.ok"])
+        with self.assertLogs("real_estate_listing.outbox"):
+            self.worker.run_batch("test.fail", stale["test.fail"])
+        tokens = dict(OutboxTask.objects.values_list("topic", "claimed_by"))
+        self.assertEqual(tokens, {topic: tasks[0].claimed_by for topic, tasks in current.items()})
+        self.assertFalse(OutboxTask.objects.exclude(status=OutboxTask.RUNNING).exists())
+        self.worker.run_batch("test.ok", current["test.ok"])
+        self.assertEqual(list(OutboxTask.objects.values_list("topic", flat=True)), ["test.fail"])
+
+    def test_claim_is_limited_to_one_round(self):
+        outbox.enqueue_many("test.ok", [{"n": n} for n in range(15)])
+        self.assertEqual(len(self.worker.claim()["test.ok"]), 10)
+
+    def test_successful_batch_is_deleted(self):
+        outbox.enqueue_many("test.ok", [{"n": 1}, {"n": 2}])
+        self.worker.run_batch("test.ok", self.worker.claim()["test.ok"])
+        self.assertEqual(self.calls, [[{"n": 1}, {"n": 2}]])
+        self.assertFalse(OutboxTask.objects.exists())
+
+    def test_failed_batch_backs_off(self):
+        outbox.enqueue("test.fail", {"n": 1})
+        with self.assertLogs("real_estate_listing.outbox"):
+            self.worker.run_batch("test.fail", self.worker.claim()["test.fail"])
+        task = OutboxTask.objects.get()
+        self.assertEqual((task.status, task.attempts, task.claimed_by), (OutboxTask.PENDING, 1, ""))
+        # backoff_base ** attempts seconds, jittered down to half.
+        delay = (task.available_at - timezone.now()).total_seconds()
+        self.assertTrue(0.5 < delay <= 2, delay)
+        self.assertIn("down", task.last_error)
+        self.assertEqual(self.worker.claim(), {})
+
+    def test_task_fails_after_max_attempts(self):
+        outbox.enqueue("test.fail", {"n": 1})
+        OutboxTask.objects.update(attempts=2)
+        with self.assertLogs("real_estate_listing.outbox"):
+            self.worker.run_batch("test.fail", self.worker.claim()["test.fail"])
+        self.assertEqual(OutboxTask.objects.get().status, OutboxTask.FAILED)
+        OutboxTask.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.worker.claim(), {})
+
+    def test_unknown_topic_is_retried(self):
+        outbox.enqueue("test.unknown", {})
+        with self.assertLogs("real_estate_listing.outbox"):
+            self.worker.run_batch("test.unknown", self.worker.claim()["test.unknown"])
+        self.assertIn("No outbox handler", OutboxTask.objects.get().last_error)
+
+
+class ListingCursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = BaseUser.objects.create(email="pages@example.com", username="")
+        items = RealEstateItem.objects.bulk_create(
+            RealEstateItem(description=f"Listing {n}", address="Lahore", price=n, created_by=self.user)
+            for n in range(7)
+        )
+        # Ties on created are ordered by id.
+        created = timezone.now()
+        RealEstateItem.objects.filter(pk__in=[item.pk for item in items[2:5]]).update(created=created)
+        self.expected = list(RealEstateItem.objects.order_by("created", "id").values_list("id", flat=True))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [item["id"] for item in data["results"]], data["next"], data["previous"]
+
+    def test_pages_forward_and_back(self):
+        seen, url, pages = [], "/realestates/?page_size=3", []
+        while url:
+            ids, url, previous = self.page(url)
+            seen += ids
+            pages.append((ids, previous))
+        self.assertEqual(seen, self.expected)
+        self.assertIsNone(pages[0][1])
+        ids, _, previous = self.page(pages[-1][1])
+        self.assertEqual(ids, pages[-2][0])
+        ids, _, previous = self.page(previous)
+        self.assertEqual(ids, pages[0][0])
+        self.assertIsNone(previous)
+
+    def test_rows_deleted_before_the_cursor_do_not_shift_pages(self):
+        ids, next_link, _ = self.page("/realestates/?page_size=3")
+        RealEstateItem.objects.filter(pk=ids[0]).delete()
+        cache.clear()
+        self.assertEqual(self.page(next_link)[0], self.expected[3:6])
+
+    def test_page_size_is_clamped(self):
+        self.assertEqual(len(self.page("/realestates/?page_size=0")[0]), 1)
+        self.assertEqual(len(self.page("/realestates/?page_size=1000")[0]), 7)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/realestates/?cursor=not-a-cursor").status_code, 404)
+
+    def test_without_paging_parameters_the_list_is_bare(self):
+        response = self.client.get("/realestates/")
+        self.assertEqual([item["id"] for item in response.json()], self.expected)
+        self.assertEqual(self.page("/realestates/?page_size=3")[0], self.expected[:3])
+
+    async def test_async_list_without_paging_parameters_is_bare(self):
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        response = await self.async_client.get("/async/realestates/", AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual([item["id"] for item in response.json()], self.expected)
+
+    def test_page_numbers(self):
+        # Older clients get the page number pagination of the REST_FRAMEWORK settings.
+        response = self.client.get("/realestates/?page=1").json()
+        self.assertEqual(response["count"], 7)
+        self.assertEqual([item["id"] for item in response["results"]], self.expected)
+
+
+class FTSTriggerTests(TestCase):
+    """The FTS5 index follows inserts, updates and deletes of the listing table."""
+
+    def setUp(self):
+        self.user = BaseUser.objects.create(email="search@example.com", username="")
+        self.item = RealEstateItem.objects.create(
+            description="Corner villa with garden", address="Model Town, Lahore", price=100, created_by=self.user
+        )
+
+    def search(self, query):
+        return [hit.item.pk for hit in SQLiteFTS5Backend().search(query, {}, limit=10)]
+
+    def test_triggers_exist_after_migrate(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            names = {row[0] for row in cursor.fetchall()}
+        self.assertLessEqual({f"{FTS_TABLE}_ai", f"{FTS_TABLE}_ad", f"{FTS_TABLE}_au"}, names)
+
+    def test_insert_is_indexed(self):
+        self.assertEqual(self.search("villa lahore"), [self.item.pk])
+        self.assertEqual(self.search("gard"), [self.item.pk])
+
+    def test_update_replaces_old_text(self):
+        RealEstateItem.objects.filter(pk=self.item.pk).update(description="Penthouse with lift")
+        self.assertEqual(self.search("villa"), [])
+        self.assertEqual(self.search("penthouse"), [self.item.pk])
+        self.assertEqual(self.search("lahore"), [self.item.pk])
+
+    def test_price_update_keeps_the_entry(self):
+        RealEstateItem.objects.filter(pk=self.item.pk).update(price=200)
+        self.assertEqual(self.search("villa"), [self.item.pk])
+
+    def test_delete_removes_the_entry(self):
+        RealEstateItem.objects.filter(pk=self.item.pk).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'villa'")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class GeohashCoverTests(TestCase):
+    def test_cover_contains_every_point_of_the_box(self):
+        generator = random.Random(6)
+        for _ in range(200):
+            min_lat, max_lat = sorted(generator.uniform(-90, 90) for _ in range(2))
+            min_lng, max_lng = sorted(generator.uniform(-180, 180) for _ in range(2))
+            size = generator.choice([1e-4, 1e-2, 1, 100])
+            max_lat, max_lng = min(max_lat, min_lat + size), min(max_lng, min_lng + size)
+            cells = covering_cells(min_lat, min_lng, max_lat, max_lng)
+            self.assertLessEqual(len(cells), MAX_QUERY_CELLS)
+            for latitude, longitude in ((min_lat, min_lng), (max_lat, max_lng), (max_lat, min_lng)):
+                geohash = encode_geohash(latitude, longitude)
+                self.assertTrue(any(geohash.startswith(cell) for cell in cells), (geohash, cells))
+
+    def test_box_too_large_for_the_cell_limit_matches_every_cell(self):
+        self.assertEqual(covering_cells(-90, -180, 90, 180), {""})
+
+
+class LocationFilterTests(TestCase):
+    center = (31.5204, 74.3587)
+
+    def setUp(self):
+        cache.clear()
+        self.user = BaseUser.objects.create(email="geo@example.com", username="")
+        self.distances = {}
+        for n, (dlat, dlng) in enumerate([(0, 0), (0.02, 0), (0, 0.05), (0.03, 0.03), (0.2, 0.2), (-0.044, 0)]):
+            item = RealEstateItem.objects.create(description=f"Geo {n}", address="", price=1, created_by=self.user)
+            latitude, longitude = self.center[0] + dlat, self.center[1] + dlng
+            RealEstateItem.objects.filter(pk=item.pk).update(
+                latitude=latitude, longitude=longitude, geohash=encode_geohash(latitude, longitude)
+            )
+            self.distances[item.pk] = haversine_km(*self.center, latitude, longitude)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_radius_matches_great_circle_distance(self):
+        for radius_km in (0.5, 3, 4.8, 5, 6, 40):
+            found = within_radius(RealEstateItem.objects.all(), *self.center, radius_km)
+            found = set(found.values_list("id", flat=True))
+            expected = {pk for pk, distance in self.distances.items() if distance <= radius_km}
+            self.assertEqual(found, expected, radius_km)
+
+    def test_near_query(self):
+        response = self.client.get(f"/realestates/?near={self.center[0]},{self.center[1]}&radius_km=5")
+        self.assertEqual(len(response.json()), sum(distance <= 5 for distance in self.distances.values()))
+
+    def test_invalid_coordinates_are_rejected(self):
+        for query in (
+            "bbox=0,0,1,inf",
+            "bbox=nan,0,1,1",
+            "bbox=0,0,91,1",
+            "bbox=0,-181,1,1",
+            "bbox=1,0,0,1",
+            "bbox=0,0,1",
+            "bbox=0,0,1,1,1",
+            "near=0,nan",
+            "near=95,0",
+            "near=0,0&radius_km=inf",
+            "near=0,0&radius_km=-1",
+            "near=0,0&radius_km=1e9",
+        ):
+            response = self.client.get(f"/realestates/?{query}")
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn("errors", response.json())
+
+
+class PriceSketchTests(TestCase):
+    def test_merge_equals_sketch_of_all_prices(self):
+        generator = random.Random(7)
+        prices = [round(generator.lognormvariate(13, 1), 2) for _ in range(3000)]
+        parts = [PriceSketch(), PriceSketch(), PriceSketch()]
+        for index, price in enumerate(prices):
+            parts[index % 3].add(price)
+        merged = PriceSketch()
+        for part in parts:
+            merged.merge(PriceSketch.from_json(part.to_json()))
+        whole = PriceSketch()
+        for price in prices:
+            whole.add(price)
+        self.assertEqual(merged.to_json(), whole.to_json())
+        ordered = sorted(prices)
+        for fraction in (0.01, 0.5, 0.9, 0.99):
+            exact = ordered[round(fraction * (len(ordered) - 1))]
+            self.assertLessEqual(abs(merged.quantile(fraction) - exact), exact * PriceSketch.relative_accuracy)
+
+    def test_remove_undoes_add(self):
+        sketch = PriceSketch()
+        for price in (0, 10, 10, 2500):
+            sketch.add(price)
+        for price in (0, 10, 2500):
+            sketch.remove(price)
+        self.assertEqual(sketch.to_json(), {"zero": 0, "buckets": {str(sketch._key(10)): 1}})
+        self.assertIsNone(PriceSketch().quantile(0.5))
+
+
+class PriceSummaryTests(TestCase):
+    def setUp(self):
+        self.user = BaseUser.objects.create(email="prices@example.com", username="")
+        self.items = [
+            RealEstateItem.objects.create(description=f"Priced {price}", address="", price=price, created_by=self.user)
+            for price in (100, 200, 300)
+        ]
+
+    def report(self, owner_id=None):
+        return summary_report(current_summary(owner_id))
+
+    def test_writes_only_record_deltas(self):
+        self.assertFalse(PriceSummary.objects.exists())
+        self.assertEqual(PriceDelta.objects.count(), 3)
+        self.assertTrue(OutboxTask.objects.filter(topic="price_stats.fold").exists())
+        self.assertEqual(self.report(self.user.pk)["count"], 3)
+        self.assertEqual(self.report()["max"], "300.00")
+
+    def test_fold_matches_rebuild(self):
+        item = self.items[2]
+        item.price = 50
+        item.save()
+        self.items[0].delete()
+        pending = self.report(self.user.pk)
+        # Three additions, the update as a removal and an addition, then the removal.
+        self.assertEqual(fold_price_deltas(), 6)
+        self.assertFalse(PriceDelta.objects.exists())
+        folded = self.report(self.user.pk)
+        self.assertEqual(folded, pending)
+        self.assertEqual((folded["count"], folded["min"], folded["max"]), (2, "50.00", "200.00"))
+        rebuild_price_summaries()
+        self.assertEqual(self.report(self.user.pk), folded)
+        self.assertEqual(self.report(), folded)
+
+    def test_rebuild_replaces_the_pending_deltas(self):
+        self.assertEqual(rebuild_price_summaries(), 2)
+        self.assertFalse(PriceDelta.objects.exists())
+        self.assertEqual(self.report(self.user.pk)["count"], 3)
+        self.items[0].delete()
+        self.assertEqual(self.report()["count"], 2)
+
+    def test_reads_apply_a_bounded_number_of_deltas(self):
+        self.assertEqual(summary_report(current_summary(self.user.pk, max_deltas=2))["count"], 2)
+        with self.settings(PRICE_SUMMARY_MAX_READ_DELTAS=1):
+            self.assertEqual(self.report()["max"], "100.00")
+        with CaptureQueriesContext(connection) as queries:
+            current_summary(max_deltas=2)
+        reads = [query["sql"] for query in queries if "pricedelta" in query["sql"]]
+        self.assertEqual(len(reads), 1)
+        self.assertIn("LIMIT 2", reads[0])
+        fold_price_deltas()
+        self.assertEqual(self.report(self.user.pk)["count"], 3)
+
+    def test_save_does_not_read_the_stored_price(self):
+        item = RealEstateItem.objects.get(pk=self.items[0].pk)
+        item.price = 150
+        with CaptureQueriesContext(connection) as queries:
+            item.save()
+        reads = [
+            query["sql"] for query in queries if query["sql"].startswith("SELECT") and "realestateitem" in query["sql"]
+        ]
+        self.assertEqual(reads, [])
+        self.assertEqual(
+            list(PriceDelta.objects.order_by("id").values_list("price", "change"))[-2:],
+            [(Decimal("100"), -1), (Decimal("150"), 1)],
+        )
+
+    def test_deferred_price_is_read_before_saving(self):
+        item = RealEstateItem.objects.only("id", "description").get(pk=self.items[1].pk)
+        item.description = "Renamed"
+        item.save()
+        fold_price_deltas()
+        self.assertEqual(self.report(self.user.pk)["count"], 3)
+
+
+class ListingImportTests(TestCase):
+    url = "/realestates/import/"
+
+    def setUp(self):
+        self.user = BaseUser.objects.create(email="import@example.com", username="")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, body, content_type="application/x-ndjson", query=""):
+        return self.client.post(self.url + query, data=body, content_type=content_type)
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        body = "\n".join([
+            '{"description": "Good", "address": "Lahore", "price": "10"}',
+            "{not json",
+            '["not", "an", "object"]',
+            '{"description": "Bad price", "price": "ten"}',
+            "",
+            '{"description": "Also good", "price": "20"}',
+        ])
+        report = self.post(body.encode()).json()
+        self.assertEqual((report["rows"], report["created"], report["failed"]), (5, 2, 3))
+        self.assertEqual([error["row"] for error in report["errors"]], [2, 3, 4])
+        self.assertIn("Invalid JSON", report["errors"][0]["errors"]["non_field_errors"][0])
+        self.assertIn("price", report["errors"][2]["errors"])
+        self.assertEqual(
+            sorted(RealEstateItem.objects.filter(created_by=self.user).values_list("description", flat=True)),
+            ["Also good", "Good"],
+        )
+
+    def test_csv_rows(self):
+        body = "description,address,price\nFlat,Karachi,100\nHouse,Lahore,-\n"
+        report = self.post(body.encode(), content_type="text/csv").json()
+        self.assertEqual((report["created"], report["failed"]), (1, 1))
+        self.assertEqual(report["errors"][0]["row"], 2)
+
+    def test_invalid_utf8_is_replaced(self):
+        lines = list(decode_lines([b'{"description": "caf\xc3', b'\xa9 \xff"}\n']))
+        self.assertEqual(lines, ['{"description": "caf\u00e9 \ufffd"}\n'])
+
+    def test_errors_are_truncated(self):
+        rows = iter_rows(['{"price": "x"}\n'] * 5, "ndjson")
+        report = ListingImporter(self.user, max_errors=2).run(rows)
+        self.assertEqual((report["failed"], len(report["errors"]), report["errors_truncated"]), (5, 2, True))
+
+    def test_rejected_requests(self):
+        cases = [
+            (self.post(b"a,b", content_type="application/xml"), 400),
+            (self.post(b"", query="?chunk_size=lots"), 400),
+            (self.client.post(self.url, {}, format="multipart"), 400),
+            (self.post(b"{}", query="?owner=1"), 403),
+        ]
+        for response, expected in cases:
+            self.assertEqual(response.status_code, expected, response.content)
+            self.assertIn("errors", response.json())
+        self.assertFalse(RealEstateItem.objects.exists())
+
+
+class ResponseCacheTests(TestCase):
+    """Cached pages are checked against the database, writes that skip the signals are seen."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = BaseUser.objects.create(email="cache@example.com", username="")
+        self.item = RealEstateItem.objects.create(description="Cached", address="", price=100, created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def update_without_signals(self, **fields):
+        RealEstateItem.objects.filter(pk=self.item.pk).update(modified=timezone.now(), **fields)
+
+    def test_list_entry_is_not_served_after_a_silent_update(self):
+        first = self.client.get("/realestates/")
+        self.assertEqual(self.client.get("/realestates/").content, first.content)
+        self.update_without_signals(price=150)
+        second = self.client.get("/realestates/")
+        self.assertEqual(second.json()[0]["price"], "150.00")
+        self.assertNotEqual(second["ETag"], first["ETag"])
+
+    def test_detail_entry_is_not_served_after_a_silent_update(self):
+        url = f"/realestates/{self.item.pk}/"
+        self.client.get(url)
+        self.update_without_signals(description="Changed")
+        self.assertEqual(self.client.get(url).json()["description"], "Changed")
+
+    def test_unchanged_entry_answers_conditional_requests(self):
+        etag = self.client.get("/realestates/")["ETag"]
+        self.assertEqual(self.client.get("/realestates/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class AsyncListingViewTests(TestCase):
+    url = "/async/realestates/"
+
+    def setUp(self):
+        cache.clear()
+        self.user = BaseUser.objects.create(email="async@example.com", username="")
+        other = BaseUser.objects.create(email="async-other@example.com", username="")
+        for number in range(5):
+            RealEstateItem.objects.create(
+                description=f"Async {number}", address="Lahore", price=Decimal(100 + number), created_by=self.user
+            )
+        RealEstateItem.objects.create(description="Not mine", address="Lahore", price=Decimal(1), created_by=other)
+        self.token = str(AccessToken.for_user(self.user))
+
+    def get(self, token=None, **params):
+        return self.async_client.get(self.url, params, AUTHORIZATION=f"Bearer {token or self.token}")
+
+    async def test_concurrent_requests(self):
+        responses = await asyncio.gather(*[self.get(page_size=size) for size in (1, 2, 3, 2, 1)])
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        pages = [[item["description"] for item in response.json()["results"]] for response in responses]
+        self.assertEqual(pages[1], ["Async 0", "Async 1"])
+        self.assertEqual(pages[1], pages[3])
+        self.assertEqual(pages[2], ["Async 0", "Async 1", "Async 2"])
+        self.assertEqual(responses[0]["ETag"], responses[4]["ETag"])
+        self.assertNotEqual(responses[0]["ETag"], responses[1]["ETag"])
+
+    async def test_pages_are_served_from_the_cache(self):
+        response = await self.get(page_size=2)
+        key = await caching.alist_key(self.user.pk, QueryDict("page_size=2"))
+        self.assertEqual(await caching.acached_data(key, response["ETag"]), response.json())
+        cached = await self.get(page_size=2)
+        self.assertEqual(cached.content, response.content)
+        not_modified = await self.async_client.get(
+            self.url, {"page_size": 2}, AUTHORIZATION=f"Bearer {self.token}", IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_authentication_failures(self):
+        anonymous = await self.async_client.get(self.url)
+        self.assertEqual(anonymous.status_code, 401)
+        self.assertEqual(anonymous.json(), {"detail": "Authentication credentials were not provided."})
+        self.assertEqual(anonymous["WWW-Authenticate"], 'Bearer realm="api"')
+        forged = await self.get(token="not-a-token")
+        self.assertEqual(forged.status_code, 401)
+        self.assertEqual(forged.json()["code"], "token_not_valid")
+        posted = await self.async_client.post(self.url, AUTHORIZATION=f"Bearer {self.token}")
+        self.assertEqual(posted.status_code, 405)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = BaseUser.objects.create(email="export@example.com", username="")
+        self.other = BaseUser.objects.create(email="export-other@example.com", username="")
+        self.items = [
+            RealEstateItem.objects.create(
+                description=f"Listing {number}", address="Lahore", price=Decimal(price), created_by=owner
+            )
+            for number, (price, owner) in enumerate(
+                [("100.00", self.user), ("250.00", self.user), ("400.00", self.user), ("300.00", self.other)]
+            )
+        ]
+        RealEstateItem.objects.filter(pk=self.items[0].pk).update(created=datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        response = self.client.get("/realestates/export/", params)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv_streams_the_own_listings(self):
+        response, content = self.export(owner=self.other.pk)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(rows[0][:3], ["id", "created", "modified"])
+        self.assertEqual([row[3] for row in rows[1:]], ["Listing 0", "Listing 1", "Listing 2"])
+
+    def test_gzipped_ndjson(self):
+        response, content = self.export(type="ndjson", gzip="1")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="listings.ndjson.gz"')
+        rows = [json.loads(line) for line in gzip.decompress(content).splitlines()]
+        self.assertEqual([row["price"] for row in rows], ["100.00", "250.00", "400.00"])
+        self.assertEqual(rows[0]["created"], "2026-01-01T00:00:00Z")
+
+    def test_filters(self):
+        _, content = self.export(type="ndjson", min_price="150", max_price="400", created_after="2026-02-01T00:00:00")
+        self.assertEqual([json.loads(line)["description"] for line in content.splitlines()], ["Listing 1", "Listing 2"])
+        # Naive datetimes are UTC, aware ones keep their offset.
+        _, content = self.export(type="ndjson", created_before="2026-01-01T04:00:00")
+        self.assertEqual([json.loads(line)["description"] for line in content.splitlines()], ["Listing 0"])
+        self.assertEqual(self.export(type="ndjson", created_before="2026-01-01T04:00:00+05:00")[1], b"")
+
+    def test_bad_filters(self):
+        response = self.client.get(
+            "/realestates/export/", {"min_price": "cheap", "max_price": "NaN", "created_after": "2026-13-01T00:00"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["errors"],
+            ["created_after must be an ISO 8601 datetime", "min_price must be a number", "max_price must be a number"],
+        )
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "listings.csv"
+            call_command(
+                "export_listings", output=str(output), min_price="250", created_after="2026-02-01T00:00:00",
+                stderr=io.StringIO(),
+            )
+            rows = list(csv.reader(output.open()))
+        self.assertEqual([row[3] for row in rows[1:]], ["Listing 1", "Listing 2", "Listing 3"])
+        for option in ("--min-price=cheap", "--max-price=Infinity", "--created-before=yesterday"):
+            with self.subTest(option), self.assertRaises(CommandError):
+                call_command("export_listings", option, stderr=io.StringIO())
+
+
+class GenerateDataTests(TestCase):
+    def generate(self, *args, **options):
+        stdout = io.StringIO()
+        call_command("generate_data", *args, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_generates_and_deletes_only_its_rows(self):
+        keeper = BaseUser.objects.create(email="load-keeper@example.org", username="")
+        RealEstateItem.objects.create(description="Kept", address="Lahore", price=Decimal("10.00"), created_by=keeper)
+
+        self.generate(users=3, listings=25, batch_size=10, seed=7)
+        generated = BaseUser.objects.filter(email__startswith="load-", email__endswith="@example.com")
+        self.assertEqual(generated.count(), 3)
+        self.assertTrue(generated.first().check_password("load-test-password"))
+        self.assertEqual(RealEstateItem.objects.filter(created_by__in=generated).count(), 25)
+        with self.assertRaises(CommandError):
+            self.generate(users=1, listings=0)
+
+        output = self.generate(delete=True)
+        self.assertIn("Deleted 3 users and 25 listings", output)
+        self.assertEqual(list(BaseUser.objects.values_list("email", flat=True)), ["load-keeper@example.org"])
+        self.assertEqual(list(RealEstateItem.objects.values_list("description", flat=True)), ["Kept"])
+
+
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.user = BaseUser.objects.create(email="changes@example.com", username="")
+        self.other = BaseUser.objects.create(email="changes-other@example.com", username="")
+
+    def create(self, description, owner=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return RealEstateItem.objects.create(
+                description=description, address="Lahore", price=Decimal("10.00"), created_by=owner or self.user
+            )
+
+    def sync(self, cursor=None, page_size=100):
+        changed, deleted, cursor, has_more = changes_since(self.user.pk, cursor, page_size)
+        return [item.description for item in changed], deleted, cursor, has_more
+
+    def test_updates_and_deletes_follow_the_cursor(self):
+        first, second = self.create("First"), self.create("Second")
+        self.create("Not mine", owner=self.other)
+        changed, deleted, cursor, has_more = self.sync()
+        self.assertEqual((changed, deleted, has_more), (["First", "Second"], [], False))
+        self.assertEqual(self.sync(cursor)[:2], ([], []))
+
+        first.price = Decimal("12.00")
+        second_id = second.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save(update_fields=["price"])
+            second.delete()
+        changed, deleted, cursor, _ = self.sync(cursor)
+        self.assertEqual((changed, deleted), (["First"], [second_id]))
+        self.assertEqual(self.sync(cursor)[:2], ([], []))
+
+    def test_write_committed_after_the_cursor_is_not_skipped(self):
+        item = self.create("Slow")
+        cursor = self.sync()[2]
+        self.create("Fast")
+        cursor = self.sync(cursor)[2]
+        # A transaction that wrote an hour ago and only commits now.
+        RealEstateItem.objects.filter(pk=item.pk).update(
+            modified=timezone.now() - timedelta(hours=1), change_version=None
+        )
+        stamp_changes()
+        self.assertEqual(self.sync(cursor)[0], ["Slow"])
+
+    def test_pages_resume_where_they_stopped(self):
+        for number in range(5):
+            self.create(f"Listing {number}")
+        seen, cursor, has_more = [], None, True
+        while has_more:
+            changed, _, cursor, has_more = self.sync(cursor, page_size=2)
+            seen += changed
+        self.assertEqual(seen, [f"Listing {number}" for number in range(5)])
+
+    def test_compaction_expires_cursors_behind_it(self):
+        behind = self.sync()[2]
+        gone = self.create("Gone")
+        with self.captureOnCommitCallbacks(execute=True):
+            gone.delete()
+        caught_up = self.sync(behind)[2]
+        ListingTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=60))
+        self.assertEqual(compact_tombstones(), 1)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get("/realestates/changes/", {"since": encode_cursor(behind)})
+        self.assertEqual(response.status_code, 410)
+        response = client.get("/realestates/changes/", {"since": encode_cursor(caught_up)})
+        self.assertEqual(response.status_code, 200)
+
+    def test_timestamp_cursors_must_sync_again(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        old = base64.urlsafe_b64encode(b"1|2026-01-01T00:00:00+00:00|3|2026-01-01T00:00:00+00:00|0").decode()
+        self.assertEqual(client.get("/realestates/changes/", {"since": old}).status_code, 410)
+        self.assertEqual(client.get("/realestates/changes/", {"since": "garbage"}).status_code, 400)
+
+
+class ValuationRefreshTests(TestCase):
+    def setUp(self):
+        self.user = BaseUser.objects.create(email="valuation@example.com", username="")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items = [
+                RealEstateItem.objects.create(
+                    description=f"{number} bed house with garden", address="Model Town, lahore",
+                    price=Decimal(number * 100), created_by=self.user,
+                )
+                for number in range(1, 5)
+            ]
+        self.engine = ValuationEngine(dimensions=64)
+        self.engine.refresh()
+
+    def comparables(self):
+        result = self.engine.estimate("Model Town, lahore", "house with garden", k=10)
+        return sorted((item["id"], item["price"]) for item in result["comparables"])
+
+    def test_changes_and_deletes_are_applied(self):
+        first, second = self.items[0], self.items[1]
+        first.price = Decimal("150.00")
+        second_id = second.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+            second.delete()
+        self.engine.refresh()
+        self.assertEqual(
+            self.comparables(),
+            [(first.pk, "150.00"), (self.items[2].pk, "300.00"), (self.items[3].pk, "400.00")],
+        )
+
+    def test_deleted_rows_are_reclaimed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for item in self.items[:3]:
+                item.delete()
+        self.engine.refresh()
+        self.assertEqual(self.engine.size, 1)
+        self.assertEqual(self.engine.rows, {self.items[3].pk: 0})
+        self.assertEqual(self.comparables(), [(self.items[3].pk, "400.00")])
+
+    def test_compacted_tombstones_reload_everything(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items[0].delete()
+        ListingTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=60))
+        # Another process compacts the tombstone before this one refreshes.
+        compact_tombstones()
+        self.engine.refresh()
+        self.assertEqual(self.engine.size, 3)
+        self.assertNotIn(self.items[0].pk, self.engine.rows)
+
+
+class ListingSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = BaseUser.objects.create(email="snapshot@example.com", username="")
+        self.other = BaseUser.objects.create(email="snapshot-other@example.com", username="")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name)
+        self.items = [
+            self.create(price, owner, month)
+            for price, owner, month in [
+                ("40000.00", self.user, 1), ("60000.00", self.user, 1),
+                ("300000.00", self.user, 2), ("70000.00", self.other, 2),
+            ]
+        ]
+
+    def create(self, price, owner, month):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = RealEstateItem.objects.create(
+                description="House", address="Lahore", price=Decimal(price), created_by=owner
+            )
+        created = datetime(2026, month, 15, tzinfo=dt_timezone.utc)
+        RealEstateItem.objects.filter(pk=item.pk).update(created=created)
+        return item
+
+    def snapshot(self):
+        return ListingSnapshot(self.path, read_pointer(self.path))
+
+    def test_full_refresh_reads_every_row(self):
+        result = refresh_snapshot(path=self.path)
+        self.assertEqual((result["generation"], result["rows"], result["changed"]), (1, 4, 4))
+        snapshot = self.snapshot()
+        self.assertEqual(list(snapshot.columns["id"]), sorted(item.pk for item in self.items))
+        self.assertEqual(snapshot.version, ChangeSequence.objects.get().value)
+
+    def test_incremental_refresh_reads_only_the_changes(self):
+        refresh_snapshot(path=self.path)
+        first, second = self.items[0], self.items[1]
+        first.price = Decimal("45000.00")
+        second_id = second.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+            second.delete()
+        added = self.create("80000.00", self.other, 3)
+
+        result = refresh_snapshot(path=self.path)
+        self.assertEqual((result["rows"], result["changed"], result["removed"]), (4, 2, 1))
+        snapshot = self.snapshot()
+        self.assertNotIn(second_id, snapshot.columns["id"])
+        self.assertEqual(list(snapshot.columns["id"]), sorted([first.pk, self.items[2].pk, self.items[3].pk, added.pk]))
+        self.assertEqual(snapshot.aggregate(owner=self.user.pk)[0]["total"], Decimal("345000.00"))
+        self.assertEqual(refresh_snapshot(path=self.path)["changed"], 0)
+
+    def test_compacted_tombstones_read_everything(self):
+        refresh_snapshot(path=self.path)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items[0].delete()
+        ListingTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=60))
+        compact_tombstones()
+        result = refresh_snapshot(path=self.path)
+        self.assertEqual((result["rows"], result["changed"]), (3, 3))
+
+    def test_group_by_owner_month_and_band_with_filters(self):
+        refresh_snapshot(path=self.path)
+        snapshot = self.snapshot()
+        by_owner = snapshot.price_per_owner()
+        self.assertEqual(
+            [(row["owner"], row["count"], row["total"]) for row in by_owner],
+            [(self.user.pk, 3, Decimal("400000.00")), (self.other.pk, 1, Decimal("70000.00"))],
+        )
+        bands = snapshot.price_bands_by_month(owner=self.user.pk)
+        self.assertEqual(
+            [(row["month"], row["band"], row["count"]) for row in bands],
+            [("2026-01", 0, 1), ("2026-01", 50_000, 1), ("2026-02", 250_000, 1)],
+        )
+        filtered = snapshot.aggregate(
+            ("month",), price_min="50000", price_max="300000",
+            created_from=datetime(2026, 2, 1, tzinfo=dt_timezone.utc),
+        )
+        self.assertEqual(
+            [(row["month"], row["count"], row["mean"]) for row in filtered], [("2026-02", 1, 70000.0)]
+        )
+        self.assertEqual(snapshot.aggregate(owner=self.other.pk, price_min="100000"), [])
+        with self.assertRaises(ValueError):
+            snapshot.aggregate(("city",))
+
+
+class DuplicateDetectionTests(TestCase):
+    description = "Spacious 3 bed house with a large garden, marble floors and parking for two cars"
+
+    def setUp(self):
+        self.user = BaseUser.objects.create(email="dedup@example.com", username="")
+
+    def create(self, description, address="12 Canal Road, lahore"):
+        return RealEstateItem.objects.create(
+            description=description, address=address, price=Decimal("10.00"), created_by=self.user
+        )
+
+    def test_signature_similarity_estimates_jaccard(self):
+        lsh = MinHashLSH(num_perm=256, bands=64)
+        first = ("house with a garden near the park and a school in a quiet street", "Model Town")
+        second = ("house with a garden near the park and a market in a quiet street", "Model Town")
+        grams = shingles(*first), shingles(*second)
+        jaccard = len(grams[0] & grams[1]) / len(grams[0] | grams[1])
+        estimate = lsh.similarity(lsh.signature(*first), lsh.signature(*second)[None, :])[0]
+        self.assertAlmostEqual(estimate, jaccard, delta=0.1)
+        self.assertIsNone(lsh.signature("", ""))
+
+    def test_near_duplicates_are_found(self):
+        original = self.create(self.description)
+        copy = self.create(self.description + ".", address="12 canal road,  Lahore")
+        self.create("Corner shop on the main boulevard with a basement", address="Civic Center, karachi")
+        self.assertEqual([match["id"] for match in find_duplicates(original)], [copy.pk])
+        clusters, skipped = cluster_duplicates()
+        self.assertEqual((clusters, skipped), ([sorted([original.pk, copy.pk])], 0))
+
+    def test_text_is_indexed_again_only_when_it_changed(self):
+        item = self.create(self.description)
+        item = RealEstateItem.objects.get(pk=item.pk)
+        with mock.patch("real_estate_listing.signals.get_lsh") as get_lsh:
+            item.price = Decimal("20.00")
+            item.save()
+            get_lsh.return_value.index.assert_not_called()
+            item.description = "Renovated flat"
+            item.save()
+            get_lsh.return_value.index.assert_called_once_with([item])
+
+
+class IntervalTreeTests(TestCase):
+    def test_stab_matches_a_scan(self):
+        generator = random.Random(7)
+        starts, ends = [], []
+        for _ in range(500):
+            start = generator.choice([float("-inf"), generator.randint(0, 1000)])
+            end = generator.choice([float("inf"), generator.randint(0, 1000)])
+            start, end = (start, end) if start <= end else (end, start)
+            starts.append(start)
+            ends.append(end)
+        tree = IntervalTree(starts, ends, range(500))
+        for point in [-1, 0, 1000, 1001, *generator.sample(range(1000), 50), *starts[:20], *ends[:20]]:
+            if point in (float("inf"), float("-inf")):
+                continue
+            expected = sorted(value for value in range(500) if starts[value] <= point <= ends[value])
+            self.assertEqual(sorted(tree.stab(point).tolist()), expected, point)
+
+    def test_empty_tree(self):
+        self.assertEqual(IntervalTree([], [], []).stab(5).tolist(), [])
+
+
+@override_settings(SAVED_SEARCH_ALERTS={"BACKEND": "real_estate_listing.alerts.LogNotifier", "REFRESH_SECONDS": 0})
+class SavedSearchAlertTests(TestCase):
+    def setUp(self):
+        self.owner = BaseUser.objects.create(email="alerts-owner@example.com", username="")
+        self.user = BaseUser.objects.create(email="alerts@example.com", username="")
+        self.search = SavedSearch.objects.create(user=self.user, min_price=Decimal("50"), keywords="garden")
+        SavedSearch.objects.create(user=self.user, max_price=Decimal("10"))
+        self.listing = RealEstateItem.objects.create(
+            description="House with a garden", address="Lahore", price=Decimal("100.00"), created_by=self.owner
+        )
+
+    def test_only_new_alerts_are_returned(self):
+        alert_ids = match_listings([self.listing.pk])
+        alerts = list(SearchAlert.objects.values_list("id", "saved_search_id"))
+        self.assertEqual(alerts, [(alert_ids[0], self.search.pk)])
+        self.assertEqual(match_listings([self.listing.pk]), [])
+        other = RealEstateItem.objects.create(
+            description="Garden flat", address="Lahore", price=Decimal("60.00"), created_by=self.owner
+        )
+        self.assertEqual(match_listings([self.listing.pk, other.pk]), [SearchAlert.objects.get(listing=other).pk])
+
+    def test_claimed_alerts_are_delivered_once(self):
+        alert_ids = match_listings([self.listing.pk])
+        claim_alerts(alert_ids)
+        self.assertEqual(deliver_alerts(alert_ids), 0)
+        SearchAlert.objects.update(claim_expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(deliver_alerts(alert_ids), 1)
+        self.assertEqual(deliver_alerts(alert_ids), 0)
+        self.assertIsNotNone(SearchAlert.objects.get().delivered_at)
+
+    def test_failed_delivery_releases_the_claim(self):
+        alert_ids = match_listings([self.listing.pk])
+        with mock.patch("real_estate_listing.alerts.LogNotifier.send", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                deliver_alerts(alert_ids)
+        self.assertEqual(list(SearchAlert.objects.values_list("claimed_by", "delivered_at")), [("", None)])
+        self.assertEqual(deliver_alerts(alert_ids), 1)
+
+    def test_saved_searches_per_user_are_limited(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch("real_estate_listing.views.SavedSearchListCreateView.max_saved_searches", 3):
+            self.assertEqual(client.post("/realestates/saved-searches/", {"keywords": "villa"}).status_code, 201)
+            self.assertEqual(client.post("/realestates/saved-searches/", {"keywords": "flat"}).status_code, 400)
+        self.assertEqual(SavedSearch.objects.filter(user=self.user).count(), 3)
+
+
+class ListingBrokerTests(SimpleTestCase):
+    @staticmethod
+    def event(pk, owner=1, price="100.00"):
+        return {"id": pk, "owner": owner, "price": price}
+
+    @staticmethod
+    def drain(subscriber):
+        messages = []
+        while not subscriber.queue.empty():
+            messages.append(subscriber.queue.get_nowait())
+        return messages
+
+    def test_slow_subscriber_is_evicted(self):
+        async def scenario():
+            broker = ListingBroker(queue_size=2)
+            slow, fast = broker.subscribe(1), broker.subscribe(1)
+            for pk in range(3):
+                broker.publish(CREATED, self.event(pk))
+                await asyncio.sleep(0)
+                self.drain(fast)
+            await asyncio.sleep(0)
+            self.assertTrue(slow.evicted)
+            self.assertEqual(self.drain(slow), [EVICTED])
+            broker.publish(CREATED, self.event(3))
+            await asyncio.sleep(0)
+            self.assertEqual(self.drain(slow), [])
+            self.assertEqual(len(self.drain(fast)), 1)
+            broker.unsubscribe(slow)
+            broker.unsubscribe(fast)
+            return broker.stats()
+
+        self.assertEqual(asyncio.run(scenario()), {"subscribers": 0, "published": 4, "evicted": 1})
+
+    def test_events_are_filtered_per_subscriber(self):
+        async def scenario():
+            broker = ListingBroker()
+            own = broker.subscribe(1)
+            cheap = broker.subscribe(2, own_only=False, max_price=Decimal("50"))
+            broker.publish(CREATED, self.event(1, owner=1, price="100.00"))
+            broker.publish(CREATED, self.event(2, owner=3, price="40.00"))
+            await asyncio.sleep(0)
+            return self.drain(own), self.drain(cheap)
+
+        own, cheap = asyncio.run(scenario())
+        self.assertEqual(len(own), 1)
+        self.assertIn(b'"id":1', own[0])
+        self.assertEqual(len(cheap), 1)
+        self.assertIn(b'"id":2', cheap[0])
+
+    def test_full_broker_refuses_subscribers(self):
+        async def scenario():
+            broker = ListingBroker(max_subscribers=1)
+            return broker.subscribe(1) is not None, broker.subscribe(2)
+
+        self.assertEqual(asyncio.run(scenario()), (True, None))
+
+
+class ConcurrencyLimitTests(SimpleTestCase):
+    def saturate(self, limit, seconds, rounds=50):
+        """Run ``rounds`` rounds of as many concurrent requests as the limit admits, each taking ``seconds``."""
+        for _ in range(rounds):
+            admitted = 0
+            while limit.acquire():
+                admitted += 1
+            for _ in range(admitted):
+                limit.release(seconds)
+
+    def test_limit_grows_while_latency_is_flat(self):
+        limit = GradientLimit(initial_limit=10, max_limit=50)
+        self.saturate(limit, 0.01)
+        self.assertEqual(int(limit.limit), 50)
+        self.assertEqual(sum(limit.acquire() for _ in range(60)), 50)
+
+    def test_limit_shrinks_when_requests_queue(self):
+        limit = GradientLimit(initial_limit=40, min_limit=2)
+        self.saturate(limit, 0.01, rounds=5)
+        grown = limit.limit
+        self.saturate(limit, 0.2)
+        self.assertLess(limit.limit, grown / 2)
+        self.assertGreaterEqual(limit.limit, 2)
+
+    def test_failures_cut_the_limit(self):
+        limit = GradientLimit(initial_limit=20, min_limit=2, backoff=0.5)
+        for expected in (10, 5, 2.5, 2, 2):
+            self.assertTrue(limit.acquire())
+            limit.release(0.01, failed=True)
+            self.assertEqual(limit.limit, expected)
+        self.assertEqual(limit.state()["failed"], 5)
+
+    def test_requests_over_the_limit_are_rejected(self):
+        limit = GradientLimit(initial_limit=2)
+        self.assertEqual([limit.acquire() for _ in range(3)], [True, True, False])
+        limit.release(0.01)
+        self.assertTrue(limit.acquire())
+        self.assertEqual(limit.state()["rejected"], 1)
+
+    def test_classes_come_from_settings(self):
+        limiter = ConcurrencyLimiter(
+            settings.CONCURRENCY_LIMITS["CLASSES"], exempt=settings.CONCURRENCY_LIMITS["EXEMPT_PATH"]
+        )
+        factory = RequestFactory()
+        self.assertEqual(limiter.classify(factory.post("/auth/login/"))[0], "login")
+        self.assertEqual(limiter.classify(factory.patch("/realestates/1/"))[0], "write")
+        self.assertEqual(limiter.classify(factory.get("/realestates/"))[0], "read")
+        self.assertEqual(limiter.classify(factory.get("/admin/"))[0], None)
+        self.assertEqual(limiter.classify(factory.get("/metrics"))[0], None)
+
+
+class MetricsMergeTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        metrics_settings = override_settings(METRICS={"DIR": self.directory})
+        metrics_settings.enable()
+        self.addCleanup(metrics_settings.disable)
+
+    @staticmethod
+    def process(requests, **process):
+        registry = MetricsRegistry()
+        registry.inc("http_requests_total", {"route": "realestates/", "status": "200"}, requests)
+        registry.observe("http_request_duration_seconds", {"route": "realestates/"}, 0.02)
+        return {**registry.snapshot(), **process}
+
+    def write(self, snapshot):
+        path = self.directory / f"{snapshot['pid']}-{snapshot['process_id']}.json"
+        path.write_text(json.dumps(snapshot))
+        return path
+
+    @staticmethod
+    def exited_pid():
+        child = subprocess.Popen(["true"])
+        child.wait()
+        return child.pid
+
+    def requests_total(self):
+        counters, _ = merge(collected_snapshots())
+        return counters.get(("http_requests_total", (("route", "realestates/"), ("status", "200"))), 0)
+
+    def test_counters_and_histograms_add_up(self):
+        first, second = self.process(2), self.process(3)
+        counters, histograms = merge([first, second])
+        self.assertEqual(list(counters.values()), [5])
+        self.assertEqual(list(histograms.values())[0][2], 2)
+        text = render([first, second])
+        self.assertIn('http_requests_total{route="realestates/",status="200"} 5', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="realestates/",le="+Inf"} 2', text)
+
+    def test_exited_processes_are_folded_once(self):
+        parent = os.getppid()
+        live = self.write(self.process(2, pid=parent, started=process_start(parent)))
+        dead = self.write(self.process(3, pid=self.exited_pid()))
+        self.assertEqual(self.requests_total(), 5)
+        self.assertTrue(live.exists())
+        self.assertFalse(dead.exists())
+        self.assertEqual(self.requests_total(), 5)
+        self.assertEqual(len(json.loads((self.directory / AGGREGATE_FILE).read_text())["counters"]), 1)
+
+    def test_reused_pid_counts_as_exited(self):
+        parent = os.getppid()
+        dead = self.write(self.process(4, pid=parent, started=(process_start(parent) or 0) - 1))
+        self.assertEqual(self.requests_total(), 4)
+        self.assertFalse(dead.exists())
+
+    def test_file_left_after_folding_is_not_counted_twice(self):
+        snapshot = self.process(3, pid=self.exited_pid())
+        self.write(snapshot)
+        self.assertEqual(self.requests_total(), 3)
+        # A crash after the aggregate was written, before the file was removed.
+        dead = self.write(snapshot)
+        self.assertEqual(self.requests_total(), 3)
+        self.assertFalse(dead.exists())
+
+    def test_forked_process_starts_empty(self):
+        registry = MetricsRegistry()
+        registry.inc("http_requests_total", {"status": "200"})
+        process_id = registry.process_id
+        registry._start_process()
+        self.assertEqual(registry.counters, {})
+        self.assertNotEqual(registry.process_id, process_id)
+
+
+class MetricsAccessTests(TestCase):
+    def setUp(self):
+        self.staff = BaseUser.objects.create(email="ops@example.com", username="", is_staff=True)
+        self.user = BaseUser.objects.create(email="not-ops@example.com", username="")
+
+    def scrape(self, **headers):
+        return self.client.get("/metrics", REMOTE_ADDR="10.0.0.5", **headers)
+
+    def test_unknown_clients_are_refused(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 403)
+
+    def test_staff_allowed_addresses_and_the_token_may_scrape(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="127.0.0.1").status_code, 200)
+        token = AccessToken.for_user(self.staff)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 200)
+        with override_settings(METRICS={**settings.METRICS, "TOKEN": "scraper-secret"}):
+            self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer scraper-secret").status_code, 200)
+            self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+
+    def test_process_without_metrics_writes_no_file_at_exit(self):
+        registry = MetricsRegistry()
+        registry.flush_at_exit()
+        self.assertEqual(list(Path(settings.METRICS["DIR"]).glob(f"*{registry.process_id}*")), [])
+        registry.inc("http_requests_total", {"status": "200"})
+        registry.flush_at_exit()
+        self.assertTrue((Path(settings.METRICS["DIR"]) / registry.filename).exists())
@@ -0,0 +1,227 @@
+"""
+Suggested prices from comparable listings.
+
+``ValuationEngine`` keeps a feature matrix of every listing in memory: the
+normalized address tokens and bigrams and the description keywords, hashed
+into ``DIMENSIONS`` columns and L2 normalized, next to the listing prices.
+Drafts are hashed the same way and scored against the whole matrix with one
+matrix product per batch, the ``K`` most similar listings are the
+comparables and their similarity weighted mean price is the estimate.
+
+The matrix is refreshed incrementally at most every ``REFRESH_SECONDS``, or
+on the next query after a listing of this process changed: the listings and
+the tombstones of the change feed with a change version past the one of the
+previous refresh are applied, see ``changes.py``. Rows of deleted listings
+are filled with the last row, so the matrix never holds removed listings.
+"""
+import threading
+import time
+import zlib
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Q
+
+from .geo import normalize_address
+from .models import ChangeSequence, ListingTombstone, RealEstateItem
+from .search import query_terms
+
+STOPWORDS = frozenset(
+    "a an and are at for from has have in is it its near of on or the to with".split()
+)
+
+
+def valuation_setting(name, default):
+    return getattr(settings, "VALUATION", {}).get(name, default)
+
+
+def _price(value):
+    """Render prices as strings with two decimals, like the listing serializer does."""
+    return str(Decimal(float(value)).quantize(Decimal("0.01")))
+
+
+def draft_tokens(address, description):
+    """Features of one listing, address tokens are prefixed so they never match description words."""
+    # House and plot numbers say nothing about comparable prices.
+    words = [word for word in normalize_address(address or "").replace(",", " ").split() if not word.isdigit()]
+    tokens = [f"a:{word}" for word in words]
+    tokens += [f"a:{first} {second}" for first, second in zip(words, words[1:])]
+    tokens += [f"d:{word}" for word in query_terms(description or "") if len(word) > 2 and word not in STOPWORDS]
+    return tokens
+
+
+class ValuationEngine:
+    def __init__(self, dimensions=512, k=10, address_weight=2.0, refresh_seconds=30):
+        self.dimensions = dimensions
+        self.k = k
+        self.address_weight = address_weight
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.matrix = np.zeros((0, self.dimensions), dtype=np.float32)
+        self.prices = np.zeros(0, dtype=np.float64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.rows = {}
+        self.size = 0
+        self.version = None
+        self.refreshed_at = None
+        self.stale = True
+
+    def vectorize(self, drafts):
+        """Hashed, L2 normalized features of ``(address, description)`` pairs."""
+        vectors = np.zeros((len(drafts), self.dimensions), dtype=np.float32)
+        for row, (address, description) in enumerate(drafts):
+            for token in draft_tokens(address, description):
+                weight = self.address_weight if token.startswith("a:") else 1.0
+                # The sign bit keeps colliding tokens from adding up to a spurious similarity.
+                hashed = zlib.crc32(token.encode())
+                vectors[row, hashed % self.dimensions] += weight if hashed & 0x80000000 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=vectors, where=norms > 0)
+
+    def _grow(self, needed):
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name in ("matrix", "prices", "ids"):
+            current = getattr(self, name)
+            grown = np.zeros((capacity, *current.shape[1:]), dtype=current.dtype)
+            grown[: self.size] = current[: self.size]
+            setattr(self, name, grown)
+
+    def _upsert(self, listings):
+        if not listings:
+            return
+        vectors = self.vectorize([(address, description) for _, address, description, _ in listings])
+        self._grow(self.size + len(listings))
+        for (pk, _, _, price), vector in zip(listings, vectors):
+            row = self.rows.get(pk)
+            if row is None:
+                row = self.rows[pk] = self.size
+                self.size += 1
+            self.matrix[row], self.prices[row], self.ids[row] = vector, float(price), pk
+
+    def _remove(self, pks):
+        for pk in pks:
+            row = self.rows.pop(pk, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                moved = int(self.ids[last])
+                self.matrix[row], self.prices[row], self.ids[row] = self.matrix[last], self.prices[last], moved
+                self.rows[moved] = row
+            self.matrix[last], self.prices[last], self.ids[last] = 0, 0, 0
+            self.size = last
+
+    def refresh(self, full=False, chunk_size=5000):
+        """Load the listings changed since the last refresh, everything the first time."""
+        with self._lock:
+            using = router.db_for_read(RealEstateItem)
+            # Read first: rows versioned while loading are loaded again by the next refresh.
+            version, compacted_through = (
+                ChangeSequence.objects.using(using).filter(pk=1).values_list("value", "compacted_through").first()
+                or (0, 0)
+            )
+            if full or self.version is None or self.version < compacted_through:
+                # The tombstones of the deletes since the last refresh may be compacted away.
+                self._reset()
+            changed = Q() if self.version is None else Q(change_version__gt=self.version)
+            queryset = RealEstateItem.objects.using(using).filter(changed).order_by()
+            batch = []
+            for row in queryset.values_list("id", "address", "description", "price").iterator(chunk_size=chunk_size):
+                batch.append(row)
+                if len(batch) >= chunk_size:
+                    self._upsert(batch)
+                    batch = []
+            self._upsert(batch)
+            if self.version is not None:
+                tombstones = ListingTombstone.objects.using(using).filter(changed)
+                self._remove(tombstones.values_list("listing_id", flat=True).iterator(chunk_size=chunk_size))
+            self.version = version
+            self.refreshed_at = time.monotonic()
+            self.stale = False
+
+    def mark_stale(self):
+        self.stale = True
+
+    def ensure_fresh(self):
+        if self.stale or time.monotonic() - self.refreshed_at >= self.refresh_seconds:
+            self.refresh()
+
+    def estimate(self, address, description, k=None):
+        return self.estimate_many([(address, description)], k)[0]
+
+    def estimate_many(self, drafts, k=None, batch_size=512):
+        """
+        Estimate the price of every ``(address, description)`` draft.
+
+        Returns one dict per draft with the estimate (``None`` without any
+        comparable), the lowest and highest comparable price and the
+        comparables themselves, most similar first.
+        """
+        self.ensure_fresh()
+        k = k or self.k
+        results = []
+        with self._lock:
+            matrix, prices, ids = self.matrix[: self.size], self.prices[: self.size], self.ids[: self.size]
+            for start in range(0, len(drafts), batch_size):
+                similarities = self.vectorize(drafts[start:start + batch_size]) @ matrix.T
+                results += [self._result(row, prices, ids, k) for row in similarities]
+        return results
+
+    @staticmethod
+    def _result(similarities, prices, ids, k):
+        top = min(k, len(similarities))
+        if top == 0:
+            return {"estimate": None, "low": None, "high": None, "comparables": []}
+        nearest = np.argpartition(-similarities, top - 1)[:top]
+        nearest = nearest[np.argsort(-similarities[nearest], kind="stable")]
+        # Unrelated and removed listings have a similarity of zero.
+        nearest = nearest[similarities[nearest] > 0]
+        if not len(nearest):
+            return {"estimate": None, "low": None, "high": None, "comparables": []}
+        weights, comparable_prices = similarities[nearest].astype(np.float64), prices[nearest]
+        estimate = weights @ comparable_prices / weights.sum()
+        return {
+            "estimate": _price(estimate),
+            "low": _price(comparable_prices.min()),
+            "high": _price(comparable_prices.max()),
+            "comparables": [
+                {"id": int(ids[row]), "price": _price(prices[row]), "similarity": round(float(similarities[row]), 4)}
+                for row in nearest
+            ],
+        }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def build_valuation_engine():
+    return ValuationEngine(
+        dimensions=valuation_setting("DIMENSIONS", 512),
+        k=valuation_setting("K", 10),
+        address_weight=valuation_setting("ADDRESS_WEIGHT", 2.0),
+        refresh_seconds=valuation_setting("REFRESH_SECONDS", 30),
+    )
+
+
+def get_valuation_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = build_valuation_engine()
+    return _engine
+
+
+def mark_listings_changed():
+    """Refresh the matrix of this process on its next query, once the change is committed."""
+    if _engine is not None:
+        transaction.on_commit(_engine.mark_stale)
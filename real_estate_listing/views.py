@@ -1,36 +1,95 @@
+from decimal import Decimal, InvalidOperation
 
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import (
+    GenericAPIView,
+    ListAPIView,
     ListCreateAPIView,
     RetrieveUpdateDestroyAPIView,
     get_object_or_404,
 )
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
+from user_listing_proj.fast_serialization import ValuesSerializer, fast_json_response, fast_serialization_enabled
+from users.authentication import CachedJWTAuthentication
 
-from .models import RealEstateItem
+from . import caching
+from . import outbox
+from . import exporting
+from .changes import CursorExpired, InvalidCursor, changes_since, decode_cursor, encode_cursor
+from .dedup import find_duplicates
+from .geo import LOCATION_ERROR, filter_location
+from .importing import FORMATS, ListingImporter, decode_lines, iter_rows
+from .models import RealEstateItem, SavedSearch, SearchAlert
+from .pagination import ListingCursorPagination
+from .search import get_search_backend
 from .serializers import (
+    RealEstateItemDraftSerializer,
     RealEstateItemSerializer,
+    SavedSearchSerializer,
+    SearchAlertSerializer,
 )
-from .utils import realestate_gs_marker
+from .stats import current_summary, summary_report
+from .tasks import GSHEETS_APPEND, SAVED_SEARCH_MATCH
+from .valuation import get_valuation_engine
 
 
 class LCRealEstateItemViewSet(ListCreateAPIView):
     serializer_class = RealEstateItemSerializer
     queryset = RealEstateItem.objects.all()
     permission_classes = (IsAuthenticated,)
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
+    pagination_class = ListingCursorPagination
 
     @swagger_auto_schema(tags=["RealEstateItems"])
     def get(self, request, *args, **kwargs):
-        query_set = RealEstateItem.objects.filter(created_by=request.user.id)
-        serializer = self.get_serializer(query_set, many=True)
-        return Response(serializer.data)
+        """
+        List the user's listings, a bare list of all of them unless the
+        request pages with ``cursor``, ``page_size`` or ``page``.
 
+        Responses carry an ETag built from ``max(modified)`` and the row count
+        of the filtered set, so updates, inserts and deletes all change it.
+        Pages are cached per owner and query string and served while their
+        ETag is current.
+        """
+        query_set = RealEstateItem.objects.filter(created_by=request.user.id)
+        try:
+            query_set = filter_location(query_set, request.query_params)
+        except ValueError:
+            return Response({"errors": [LOCATION_ERROR]}, status=status.HTTP_400_BAD_REQUEST)
+        state = query_set.aggregate(last_modified=Max("modified"), count=Count("id"))
+        etag = caching.make_etag(
+            "listings", request.user.id, state["last_modified"], state["count"], request.query_params.urlencode()
+        )
+        not_modified = caching.conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        key = caching.list_key(request.user.id, request.query_params)
+        data = caching.cached_data(key, etag)
+        if data is not None:
+            return caching.set_validators(Response(data), etag)
+        if fast_serialization_enabled(request):
+            fast = ValuesSerializer.for_serializer(self.get_serializer_class())
+            page = self.paginate_queryset(fast.rows(query_set))
+            data, orjson_safe = fast.serialize(fast.rows(query_set) if page is None else page)
+            if page is not None:
+                data = self.get_paginated_response(data).data
+            response = fast_json_response(data, orjson_safe)
+        else:
+            page = self.paginate_queryset(query_set)
+            serializer = self.get_serializer(query_set if page is None else page, many=True)
+            response = Response(serializer.data) if page is None else self.get_paginated_response(serializer.data)
+            data = response.data
+        caching.cache_response(key, etag, None, data)
+        return caching.set_validators(response, etag)
 
     @swagger_auto_schema(tags=["RealEstateItems"])
     def post(self, request, *args, **kwargs):
@@ -47,14 +106,13 @@ class LCRealEstateItemViewSet(ListCreateAPIView):
                 for error in serializer.errors
             ]
             return Response({"errors": error_list}, status=status.HTTP_400_BAD_REQUEST)
-        self.perform_create(serializer)
-
-        real_est_item = RealEstateItem.objects.get(pk=serializer.data["id"])
-        real_est_item.save()
+        with transaction.atomic():
+            self.perform_create(serializer)
+            outbox.enqueue(GSHEETS_APPEND, {"listing_id": serializer.instance.id})
+            outbox.enqueue(SAVED_SEARCH_MATCH, {"listing_id": serializer.instance.id})
 
-        response = RealEstateItemSerializer(real_est_item).data
-        headers = self.get_success_headers(serializer.data)
-        realestate_gs_marker.now(response)
+        response = {**serializer.data, "possible_duplicates": find_duplicates(serializer.instance)}
+        headers = self.get_success_headers(response)
         return Response(
             response, status=status.HTTP_201_CREATED, headers=headers
         )
@@ -66,11 +124,30 @@ class RUDRealEstateItemViewSet(RetrieveUpdateDestroyAPIView):
     queryset = RealEstateItem.objects.all()
 
     permission_classes = (IsAuthenticated,)
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
+
+    @staticmethod
+    def validators(pk, modified):
+        return caching.make_etag("listing", pk, modified.isoformat()), int(modified.timestamp())
 
     @swagger_auto_schema(tags=["RealEstateItems"])
     def get(self, request, *args, **kwargs):
-        return self.retrieve(request, *args, **kwargs)
+        """Answer ``If-None-Match``/``If-Modified-Since`` from ``modified`` before serializing anything."""
+        modified = RealEstateItem.objects.filter(pk=kwargs["pk"]).values_list("modified", flat=True).first()
+        if modified is None:
+            return self.retrieve(request, *args, **kwargs)
+        etag, last_modified = self.validators(kwargs["pk"], modified)
+        not_modified = caching.conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        key = caching.detail_key(kwargs["pk"])
+        data = caching.cached_data(key, etag)
+        if data is None:
+            instance = self.get_object()
+            etag, last_modified = self.validators(instance.pk, instance.modified)
+            data = self.get_serializer(instance).data
+            caching.cache_response(key, etag, last_modified, data)
+        return caching.set_validators(Response(data), etag, last_modified)
 
     @swagger_auto_schema(tags=["RealEstateItems"])
     def patch(self, request, *args, **kwargs):
@@ -114,3 +191,373 @@ class RUDRealEstateItemViewSet(RetrieveUpdateDestroyAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+
+class RealEstateItemSearchView(GenericAPIView):
+    """Ranked full-text search over listing descriptions and addresses."""
+
+    serializer_class = RealEstateItemSerializer
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (CachedJWTAuthentication,)
+    page_size = 20
+    max_page_size = 100
+
+    def get_filters(self, request):
+        filters, errors = {}, []
+        for name in ("min_price", "max_price"):
+            value = request.query_params.get(name)
+            if value:
+                try:
+                    filters[name] = Decimal(value)
+                except InvalidOperation:
+                    filters[name] = None
+                if filters[name] is None or not filters[name].is_finite():
+                    errors.append(f"{name} must be a number")
+        owner = request.query_params.get("owner")
+        if owner == "me":
+            filters["owner"] = request.user.id
+        elif owner:
+            if owner.isdigit():
+                filters["owner"] = int(owner)
+            else:
+                errors.append("owner must be a user id or me")
+        return filters, errors
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get("q", "").strip()
+        filters, errors = self.get_filters(request)
+        if not query:
+            errors.append("q is required")
+        try:
+            page = max(int(request.query_params.get("page", 1)), 1)
+            page_size = min(max(int(request.query_params.get("page_size", self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            errors.append("page and page_size must be numbers")
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        hits = get_search_backend().search(
+            query, filters, limit=page_size + 1, offset=(page - 1) * page_size
+        )
+        results = [
+            {**self.get_serializer(hit.item).data, "rank": hit.rank, "snippet": hit.snippet}
+            for hit in hits[:page_size]
+        ]
+        url = request.build_absolute_uri()
+        next_link = replace_query_param(url, "page", page + 1) if len(hits) > page_size else None
+        if page == 1:
+            previous_link = None
+        elif page == 2:
+            previous_link = remove_query_param(url, "page")
+        else:
+            previous_link = replace_query_param(url, "page", page - 1)
+        return Response({"next": next_link, "previous": previous_link, "results": results})
+
+
+class RealEstateItemStatsView(GenericAPIView):
+    """Price distribution of all listings, or of one owner with ``?owner=<id>|me``."""
+
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (CachedJWTAuthentication,)
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def get(self, request, *args, **kwargs):
+        owner = request.query_params.get("owner")
+        if owner == "me":
+            owner_id = request.user.id
+        elif owner:
+            if not owner.isdigit():
+                return Response(
+                    {"errors": ["owner must be a user id or me"]}, status=status.HTTP_400_BAD_REQUEST
+                )
+            owner_id = int(owner)
+        else:
+            owner_id = None
+        return Response(summary_report(current_summary(owner_id)))
+
+
+class RealEstateItemChangesView(GenericAPIView):
+    """
+    Listings of the user changed since ``?since=<cursor>`` and the ids of the deleted ones.
+
+    Start without ``since`` to get every listing, then keep passing the
+    returned ``cursor``. Keep fetching while ``has_more`` is true. A cursor
+    older than the tombstone retention answers 410, sync again from scratch.
+    """
+
+    serializer_class = RealEstateItemSerializer
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (CachedJWTAuthentication,)
+    page_size = 100
+    max_page_size = 1000
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def get(self, request, *args, **kwargs):
+        try:
+            page_size = min(max(int(request.query_params.get("page_size", self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            return Response({"errors": ["page_size must be a number"]}, status=status.HTTP_400_BAD_REQUEST)
+        since = request.query_params.get("since")
+        try:
+            cursor = decode_cursor(since) if since else None
+            changed, deleted, next_cursor, has_more = changes_since(request.user.id, cursor, page_size)
+        except InvalidCursor as e:
+            return Response({"errors": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        except CursorExpired as e:
+            return Response({"errors": [str(e)]}, status=status.HTTP_410_GONE)
+        return Response({
+            "changed": self.get_serializer(changed, many=True).data,
+            "deleted": deleted,
+            "cursor": encode_cursor(next_cursor),
+            "has_more": has_more,
+        })
+
+
+class RealEstateItemEstimateView(GenericAPIView):
+    """
+    Suggested price of a draft listing from its most comparable listings.
+
+    ``GET ?address=...&description=...`` or ``POST`` a draft estimate one
+    listing, ``POST {"drafts": [...]}`` estimates up to ``max_drafts`` at once.
+    """
+
+    serializer_class = RealEstateItemDraftSerializer
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (CachedJWTAuthentication,)
+    max_drafts = 5000
+    max_k = 50
+
+    def get_k(self, request):
+        k = request.query_params.get("k")
+        if k is None:
+            return None
+        if not k.isdigit() or not 1 <= int(k) <= self.max_k:
+            raise ValidationError({"errors": [f"k must be a number between 1 and {self.max_k}"]})
+        return int(k)
+
+    def estimate(self, data, k, many=False):
+        serializer = self.get_serializer(data=data, many=many)
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        drafts = serializer.validated_data if many else [serializer.validated_data]
+        results = get_valuation_engine().estimate_many(
+            [(draft.get("address", ""), draft.get("description", "")) for draft in drafts], k
+        )
+        return Response({"results": results} if many else results[0])
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def get(self, request, *args, **kwargs):
+        return self.estimate(request.query_params, self.get_k(request))
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def post(self, request, *args, **kwargs):
+        k = self.get_k(request)
+        if not isinstance(request.data, dict) or "drafts" not in request.data:
+            return self.estimate(request.data, k)
+        drafts = request.data["drafts"]
+        if not isinstance(drafts, list) or not 1 <= len(drafts) <= self.max_drafts:
+            return Response(
+                {"errors": [f"drafts must be a list of 1 to {self.max_drafts} listings"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return self.estimate(drafts, k, many=True)
+
+
+class SavedSearchListCreateView(ListCreateAPIView):
+    """The user's saved searches, new listings matching one of them raise an alert."""
+
+    serializer_class = SavedSearchSerializer
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (CachedJWTAuthentication,)
+    max_saved_searches = 100
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user)
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def post(self, request, *args, **kwargs):
+        with transaction.atomic():
+            # Locking the user row makes concurrent creates of one user count one after the other.
+            get_user_model().objects.select_for_update().filter(pk=request.user.pk).values_list("pk").first()
+            if self.get_queryset().count() >= self.max_saved_searches:
+                return Response(
+                    {"errors": [f"A user can keep at most {self.max_saved_searches} saved searches"]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return self.create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class SavedSearchDetailView(RetrieveUpdateDestroyAPIView):
+    http_method_names = ["get", "patch", "delete"]
+    serializer_class = SavedSearchSerializer
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (CachedJWTAuthentication,)
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user)
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def get(self, request, *args, **kwargs):
+        return self.retrieve(request, *args, **kwargs)
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def patch(self, request, *args, **kwargs):
+        return self.partial_update(request, *args, **kwargs)
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def delete(self, request, *args, **kwargs):
+        return self.destroy(request, *args, **kwargs)
+
+
+class SearchAlertListView(ListAPIView):
+    """Listings that matched the user's saved searches, newest first."""
+
+    serializer_class = SearchAlertSerializer
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (CachedJWTAuthentication,)
+
+    def get_queryset(self):
+        queryset = SearchAlert.objects.filter(saved_search__user=self.request.user).select_related("listing")
+        saved_search = self.request.query_params.get("saved_search")
+        if saved_search and saved_search.isdigit():
+            queryset = queryset.filter(saved_search_id=int(saved_search))
+        return queryset
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class RealEstateItemImportView(GenericAPIView):
+    """
+    Bulk import listings from a CSV or NDJSON body.
+
+    Send the rows as the request body with a ``text/csv`` or
+    ``application/x-ndjson`` content type, or upload them as the ``file`` part
+    of a multipart form. The body is parsed while it is read, admins can
+    import on behalf of another user with ``?owner=<id>``.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (CachedJWTAuthentication,)
+    content_types = {
+        "text/csv": "csv",
+        "application/csv": "csv",
+        "application/x-ndjson": "ndjson",
+        "application/ndjson": "ndjson",
+        "application/jsonl": "ndjson",
+    }
+    default_chunk_size = 500
+    max_chunk_size = 5000
+
+    def get_source(self, request):
+        """Return ``(format, byte line iterable)`` or raise ValueError with a client message."""
+        content_type = request.content_type.split(";")[0].strip().lower()
+        if content_type.startswith("multipart/"):
+            upload = request.FILES.get("file")
+            if upload is None:
+                raise ValueError("file is required")
+            extension = upload.name.rsplit(".", 1)[-1].lower()
+            data_format = "ndjson" if extension in ("ndjson", "jsonl") else extension
+            source = upload
+        else:
+            data_format = self.content_types.get(content_type)
+            source = request.stream
+            if source is None:
+                raise ValueError("The request body is empty")
+        if data_format not in FORMATS:
+            raise ValueError("Rows must be sent as CSV or NDJSON")
+        return data_format, source
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def post(self, request, *args, **kwargs):
+        owner = request.user
+        if request.query_params.get("owner"):
+            if not request.user.is_staff:
+                return Response(
+                    {"errors": ["Only admins can import listings for another owner"]},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            owner = get_object_or_404(get_user_model(), pk=request.query_params["owner"])
+        try:
+            chunk_size = int(request.query_params.get("chunk_size", self.default_chunk_size))
+        except ValueError:
+            return Response({"errors": ["chunk_size must be a number"]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data_format, source = self.get_source(request)
+        except ValueError as e:
+            return Response({"errors": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = ListingImporter(owner, chunk_size=min(max(chunk_size, 1), self.max_chunk_size))
+        report = importer.run(iter_rows(decode_lines(source), data_format))
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class RealEstateItemExportView(GenericAPIView):
+    """
+    Stream listings as CSV or NDJSON with ``?type=csv|ndjson`` and ``?gzip=1``.
+
+    Supports ``created_after``/``created_before`` (ISO datetimes, UTC unless
+    they carry an offset) and ``min_price``/``max_price`` filters. Admins
+    export every listing and can pick one owner with ``?owner=<id>``, other
+    users export their own listings.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (CachedJWTAuthentication,)
+    content_types = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+    def get_filters(self, request):
+        filters, errors = {}, []
+        owner = request.query_params.get("owner")
+        if not request.user.is_staff:
+            filters["owner"] = request.user.id
+        elif owner:
+            if owner.isdigit():
+                filters["owner"] = int(owner)
+            else:
+                errors.append("owner must be a user id")
+        for name in ("created_after", "created_before"):
+            value = request.query_params.get(name)
+            if value:
+                filters[name] = exporting.parse_timestamp(value)
+                if filters[name] is None:
+                    errors.append(f"{name} must be an ISO 8601 datetime")
+        for name in ("min_price", "max_price"):
+            value = request.query_params.get(name)
+            if value:
+                try:
+                    filters[name] = Decimal(value)
+                except InvalidOperation:
+                    filters[name] = None
+                if filters[name] is None or not filters[name].is_finite():
+                    errors.append(f"{name} must be a number")
+        return filters, errors
+
+    @swagger_auto_schema(tags=["RealEstateItems"])
+    def get(self, request, *args, **kwargs):
+        data_format = request.query_params.get("type", "csv")
+        filters, errors = self.get_filters(request)
+        if data_format not in exporting.FORMATS:
+            errors.append("type must be csv or ndjson")
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        chunks = exporting.export_chunks(exporting.export_rows(**filters), data_format)
+        filename = f"listings.{data_format}"
+        content_type = self.content_types[data_format]
+        if request.query_params.get("gzip") in ("1", "true"):
+            chunks = exporting.gzip_chunks(chunks)
+            filename += ".gz"
+            content_type = "application/gzip"
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
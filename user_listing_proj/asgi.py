@@ -2,6 +2,8 @@
 ASGI config for user_listing_proj project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests to ``/realestates/events/`` are served by the Server-Sent Events
+stream of ``real_estate_listing.live``, everything else by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -13,4 +15,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "user_listing_proj.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up.
+from real_estate_listing.live import ListingEventStream  # noqa: E402
+
+EVENTS_PATH = "/realestates/events/"
+events_application = ListingEventStream()
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == EVENTS_PATH:
+        await events_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
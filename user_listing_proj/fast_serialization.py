@@ -0,0 +1,189 @@
+"""
+Fast read-only serialization for list endpoints.
+
+``ValuesSerializer`` reads rows with ``values_list()`` and converts them with
+converters precompiled from a DRF ``ModelSerializer``, skipping the per
+instance field machinery. ``render_json`` renders the result with orjson when
+it is installed. Both produce exactly the bytes DRF's serializer and
+``JSONRenderer`` would, enable them with ``settings.FAST_SERIALIZATION``.
+"""
+import math
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import ISO_8601, fields, relations
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from .metrics import serializer_timer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson writes these floats without the exponent sign or in positional
+# notation where ``json`` uses ``1e-05`` or ``1e+16``.
+ORJSON_FLOAT_RANGE = (1e-4, 1e16)
+
+
+def fast_serialization_enabled(request=None):
+    """Whether to use the fast path, only for plain JSON responses of DRF requests."""
+    if not getattr(settings, "FAST_SERIALIZATION", False):
+        return False
+    if request is None:
+        return True
+    renderer = getattr(request, "accepted_renderer", None)
+    return isinstance(renderer, JSONRenderer) and "indent" not in (request.accepted_media_type or "")
+
+
+class _Render:
+    """Per call state shared by the converters."""
+
+    def __init__(self):
+        self.orjson_safe = orjson is not None
+        self.timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+
+
+def _passthrough(state, value):
+    return value
+
+
+def _string(state, value):
+    return str(value)
+
+
+def _float(state, value):
+    value = float(value)
+    if value and not ORJSON_FLOAT_RANGE[0] <= abs(value) < ORJSON_FLOAT_RANGE[1] or not math.isfinite(value):
+        state.orjson_safe = False
+    return value
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if output_format is None:
+        return _passthrough
+    field_timezone = getattr(field, "timezone", None)
+
+    def convert(state, value):
+        if isinstance(value, str):
+            return value
+        tz = field_timezone if field_timezone is not None else state.timezone
+        if tz is not None:
+            value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+        elif timezone.is_aware(value):
+            value = timezone.make_naive(value, timezone.utc)
+        if output_format.lower() == ISO_8601:
+            value = value.isoformat()
+            return value[:-6] + "Z" if value.endswith("+00:00") else value
+        return value.strftime(output_format)
+
+    return convert
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize:
+        return lambda state, value: field.to_representation(value)
+
+    def convert(state, value):
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        return "{:f}".format(field.quantize(value))
+
+    return convert
+
+
+def _converter(field):
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        if field.pk_field is not None:
+            raise ImproperlyConfigured("Related fields with pk_field are not supported")
+        return _passthrough
+    if isinstance(field, fields.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, fields.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, fields.FloatField):
+        return _float
+    if isinstance(field, fields.BooleanField):
+        return lambda state, value: bool(value)
+    if isinstance(field, fields.IntegerField):
+        return lambda state, value: int(value)
+    if isinstance(field, fields.CharField) and not isinstance(field, fields.ChoiceField):
+        return _string
+    raise ImproperlyConfigured(f"{type(field).__name__} {field.field_name!r} has no fast converter")
+
+
+class ValuesSerializer:
+    """
+    Read-only twin of a ``ModelSerializer`` working on ``values_list()`` rows.
+
+    Supports the plain model field types the list serializers use, building
+    the twin of a serializer with anything else raises ImproperlyConfigured.
+    """
+
+    _instances = {}
+
+    def __init__(self, serializer_class):
+        self.names, self.sources, self.converters = [], [], []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if "." in field.source or field.source == "*":
+                raise ImproperlyConfigured(f"Field {name!r} has an unsupported source {field.source!r}")
+            self.names.append(name)
+            self.sources.append(field.source)
+            self.converters.append(_converter(field))
+
+    @classmethod
+    def for_serializer(cls, serializer_class):
+        if serializer_class not in cls._instances:
+            cls._instances[serializer_class] = cls(serializer_class)
+        return cls._instances[serializer_class]
+
+    def rows(self, queryset):
+        """Return ``queryset`` as named rows, their attributes are the model field names."""
+        return queryset.values_list(*self.sources, named=True)
+
+    def serialize(self, rows):
+        """Return ``(data, orjson_safe)`` for the rows, ``data`` being what ``many=True`` serializers return."""
+        state = _Render()
+        names, converters = self.names, self.converters
+        with serializer_timer():
+            data = [
+                {
+                    name: None if value is None else convert(state, value)
+                    for name, convert, value in zip(names, converters, row)
+                }
+                for row in rows
+            ]
+        return data, state.orjson_safe
+
+
+_renderer = JSONRenderer()
+
+
+def render_json(data, orjson_safe=True):
+    """
+    Render plain JSON data exactly like ``JSONRenderer``.
+
+    orjson output matches ``json.dumps`` with DRF's settings for strings,
+    integers and the floats ``_float`` lets through. ``orjson_safe=False``
+    or data orjson cannot encode falls back to DRF's renderer.
+    """
+    if orjson_safe and orjson is not None and api_settings.COMPACT_JSON and api_settings.UNICODE_JSON:
+        try:
+            content = orjson.dumps(data)
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            return content.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+    return _renderer.render(data)
+
+
+def fast_json_response(data, orjson_safe=True, status=200):
+    return HttpResponse(render_json(data, orjson_safe), status=status, content_type="application/json")
@@ -0,0 +1,205 @@
+"""
+Adaptive concurrency limits per endpoint class.
+
+Requests are sorted into the classes of ``CONCURRENCY_LIMITS["CLASSES"]``
+(first match on method and path wins, paths matching ``EXEMPT_PATH`` and
+requests of no class are not limited) and each class admits at most
+``limit`` requests at a time, the others are answered at once with 503 and
+``Retry-After`` instead of queueing behind the slow ones.
+
+The limit follows the latency of the class, like a TCP congestion window:
+
+* the latency without load is the lowest short term average seen, raised
+  slowly while the class runs below half its limit, a short term average of
+  the response time is the current latency,
+* their ratio, the gradient, shrinks the limit when requests start to queue
+  and lets it grow by ``sqrt(limit)`` while latency stays flat,
+* responses failing with 5xx cut the limit multiplicatively.
+
+Limits are per process, every worker adapts to the load it sees.
+"""
+import math
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from .responses import json_response
+
+
+def limits_setting(name, default):
+    return getattr(settings, "CONCURRENCY_LIMITS", {}).get(name, default)
+
+
+class GradientLimit:
+    """Concurrency limit of one endpoint class, see the module docstring."""
+
+    def __init__(
+        self,
+        initial_limit=20,
+        min_limit=2,
+        max_limit=200,
+        smoothing=0.2,
+        tolerance=1.5,
+        long_window=500,
+        short_window=10,
+        backoff=0.9,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.long_alpha = 2 / (long_window + 1)
+        self.short_alpha = 2 / (short_window + 1)
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self.limit = float(initial_limit)
+        self.inflight = 0
+        self.long_rtt = None
+        self.short_rtt = None
+        self.accepted = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def acquire(self):
+        """Take a slot, ``False`` when the class is at its limit."""
+        with self._lock:
+            if self.inflight >= int(self.limit):
+                self.rejected += 1
+                return False
+            self.inflight += 1
+            self.accepted += 1
+            return True
+
+    def release(self, seconds, failed=False):
+        """Give the slot back with the response time of its request."""
+        with self._lock:
+            inflight = self.inflight
+            self.inflight -= 1
+            if failed:
+                self.failed += 1
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                return
+            if self.long_rtt is None:
+                self.long_rtt = self.short_rtt = seconds
+                return
+            self.short_rtt += self.short_alpha * (seconds - self.short_rtt)
+            if self.short_rtt < self.long_rtt:
+                self.long_rtt = self.short_rtt
+            if inflight < self.limit / 2:
+                # Not using the limit: the samples show the latency without queueing,
+                # but say nothing about a larger limit.
+                self.long_rtt += self.long_alpha * (self.short_rtt - self.long_rtt)
+                return
+            gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / max(self.short_rtt, 1e-6)))
+            target = self.limit * gradient + math.sqrt(self.limit)
+            limit = self.limit * (1 - self.smoothing) + target * self.smoothing
+            self.limit = max(self.min_limit, min(self.max_limit, limit))
+
+    def state(self):
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "inflight": self.inflight,
+                "latency_baseline_ms": round(self.long_rtt * 1000, 2) if self.long_rtt is not None else None,
+                "latency_recent_ms": round(self.short_rtt * 1000, 2) if self.short_rtt is not None else None,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "failed": self.failed,
+            }
+
+
+class ConcurrencyLimiter:
+    def __init__(self, classes, exempt=None):
+        self.exempt = re.compile(exempt) if exempt else None
+        self.classes = []
+        for name, options in classes.items():
+            limit = GradientLimit(
+                initial_limit=options.get("INITIAL_LIMIT", 20),
+                min_limit=options.get("MIN_LIMIT", 2),
+                max_limit=options.get("MAX_LIMIT", 200),
+                smoothing=options.get("SMOOTHING", 0.2),
+                tolerance=options.get("TOLERANCE", 1.5),
+            )
+            methods = {method.upper() for method in options.get("METHODS", ())}
+            self.classes.append((name, methods, re.compile(options.get("PATH", r"^/")), limit))
+
+    def classify(self, request):
+        """Return ``(class name, limit)``, ``(None, None)`` for requests that are not limited."""
+        if self.exempt is not None and self.exempt.match(request.path_info):
+            return None, None
+        for name, methods, path, limit in self.classes:
+            if (not methods or request.method in methods) and path.match(request.path_info):
+                return name, limit
+        return None, None
+
+    def state(self):
+        return {name: limit.state() for name, _, _, limit in self.classes}
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = ConcurrencyLimiter(limits_setting("CLASSES", {}), exempt=limits_setting("EXEMPT_PATH", None))
+    return _limiter
+
+
+def limiter_state():
+    return get_limiter().state()
+
+
+def overloaded(name):
+    return json_response(
+        {"errors": [f"Too many concurrent {name} requests, retry later"]},
+        status=503,
+        headers={"Retry-After": str(limits_setting("RETRY_AFTER", 1))},
+    )
+
+
+@sync_and_async_middleware
+def ConcurrencyLimitMiddleware(get_response):
+    """Admit requests within the limit of their class, see the module docstring."""
+    enabled = limits_setting("ENABLED", True)
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            name, limit = get_limiter().classify(request) if enabled else (None, None)
+            if limit is None:
+                return await get_response(request)
+            if not limit.acquire():
+                return overloaded(name)
+            started, failed = time.perf_counter(), True
+            try:
+                response = await get_response(request)
+                failed = response.status_code >= 500
+                return response
+            finally:
+                limit.release(time.perf_counter() - started, failed)
+
+    else:
+
+        def middleware(request):
+            name, limit = get_limiter().classify(request) if enabled else (None, None)
+            if limit is None:
+                return get_response(request)
+            if not limit.acquire():
+                return overloaded(name)
+            started, failed = time.perf_counter(), True
+            try:
+                response = get_response(request)
+                failed = response.status_code >= 500
+                return response
+            finally:
+                limit.release(time.perf_counter() - started, failed)
+
+    return middleware
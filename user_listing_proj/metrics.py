@@ -0,0 +1,466 @@
+"""
+Request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` records, per route pattern and method:
+
+* ``http_requests_total`` by status code,
+* ``http_request_duration_seconds``, a latency histogram,
+* ``http_request_db_queries`` and ``http_request_db_seconds``, histograms
+  of the queries of each request counted by an ``execute_wrapper`` on every
+  connection,
+* ``http_request_serializer_seconds``, the time spent building serializer
+  data, recorded by ``TimedSerializerMixin`` and the fast serialization path.
+
+``sheets_call_seconds`` times the Google Sheets calls wherever they run.
+
+``/metrics`` answers the clients of ``ALLOWED_IPS``, requests with the
+``Authorization: Bearer <TOKEN>`` header and staff users, 403 otherwise.
+
+Every process keeps its metrics in memory and writes them to its own file in
+``METRICS["DIR"]`` at most every ``FLUSH_SECONDS``, named after its pid and a
+random id drawn at start and again in forked children, so a reused pid never
+overwrites the file of an earlier process. ``/metrics`` adds up the files of
+all processes, so counters and histograms stay correct behind several
+workers. Files of processes that exited are folded into ``aggregate.json``
+and removed, like prometheus_client does, so counters never go backwards and
+the directory does not grow with every restart of a worker.
+"""
+import atexit
+import fcntl
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework import serializers
+from rest_framework.exceptions import APIException
+
+from users.authentication import CachedJWTAuthentication
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    "http_request_duration_seconds": ("Time to respond to the request.", LATENCY_BUCKETS),
+    "http_request_db_queries": ("Database queries run for the request.", QUERY_BUCKETS),
+    "http_request_db_seconds": ("Time spent in database queries for the request.", LATENCY_BUCKETS),
+    "http_request_serializer_seconds": ("Time spent serializing response data.", LATENCY_BUCKETS),
+    "sheets_call_seconds": ("Duration of Google Sheets API calls.", LATENCY_BUCKETS),
+}
+COUNTERS = {
+    "http_requests_total": "Requests answered, by status code.",
+    "sheets_call_errors_total": "Google Sheets API calls that raised.",
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+AGGREGATE_FILE = "aggregate.json"
+
+_current = ContextVar("request_metrics", default=None)
+
+
+def metrics_setting(name, default):
+    return getattr(settings, "METRICS", {}).get(name, default)
+
+
+class RequestMetrics:
+    """What one request spent, filled by the query wrapper and ``serializer_timer``."""
+
+    __slots__ = ("queries", "db_seconds", "serializer_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+
+def process_start(pid):
+    """Start time of a process in clock ticks since boot, ``None`` where ``/proc`` is not available."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as file:
+            # The command name may hold spaces, the fields after it are space separated.
+            return int(file.read().rsplit(b")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def process_alive(snapshot):
+    """Whether the process that wrote ``snapshot`` still runs, files of unknown processes count as exited."""
+    pid = snapshot.get("pid")
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    # Another process with the same pid started after the one that wrote the file exited.
+    started = snapshot.get("started")
+    return started is None or process_start(pid) == started
+
+
+class MetricsRegistry:
+    """Counters and histograms of this process, keyed on metric name and label values."""
+
+    def __init__(self):
+        self._start_process()
+
+    def _start_process(self):
+        """Start empty under a new id, also run in forked children, which must not count the parent's metrics."""
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._flushed_at = 0.0
+        self.pid = os.getpid()
+        self.process_id = uuid.uuid4().hex
+        self.started = process_start(self.pid)
+
+    @property
+    def filename(self):
+        return f"{self.pid}-{self.process_id}.json"
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # One count per bucket plus +Inf, then the sum.
+                histogram = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            for position, bound in enumerate(buckets):
+                if value <= bound:
+                    break
+            else:
+                position = len(buckets)
+            histogram[position] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": self.pid,
+                "process_id": self.process_id,
+                "started": self.started,
+                "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, labels, list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+    def flush(self, force=False):
+        """Write the metrics of this process to its file, at most every ``FLUSH_SECONDS``."""
+        directory = metrics_setting("DIR", None)
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed_at < metrics_setting("FLUSH_SECONDS", 1.0):
+            return
+        if not self._flush_lock.acquire(blocking=force):
+            # Another thread is writing the file right now.
+            return
+        try:
+            self._flushed_at = now
+            directory = Path(directory)
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / self.filename
+            temporary = path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(self.snapshot()))
+            os.replace(temporary, path)
+        finally:
+            self._flush_lock.release()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def flush_at_exit(self):
+        """Write the last metrics of this process, no file for processes that recorded nothing."""
+        if self.counters or self.histograms:
+            self.flush(force=True)
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush_at_exit)
+os.register_at_fork(after_in_child=registry._start_process)
+
+
+def _write_json(path, data):
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(data))
+    os.replace(temporary, path)
+
+
+def fold_dead_processes(directory, snapshots):
+    """
+    Add the snapshots of exited processes to the aggregate file and remove their files.
+
+    ``snapshots`` maps the process files to the snapshots read from them,
+    the directory lock must be held. The aggregate remembers the processes it
+    folded while their files exist, so a crash before a file was removed does
+    not count it twice. Returns the aggregate and the snapshots of the live processes.
+    """
+    path = directory / AGGREGATE_FILE
+    try:
+        aggregate = json.loads(path.read_text())
+    except (OSError, ValueError):
+        aggregate = {"counters": [], "histograms": [], "folded": []}
+    present = {snapshot.get("process_id") for snapshot in snapshots.values()}
+    folded = set(aggregate["folded"]) & present
+    dead = {}
+    for file, snapshot in snapshots.items():
+        if not process_alive(snapshot):
+            # Read again: the process may have written its last metrics at exit after the first read.
+            with suppress(OSError, ValueError):
+                snapshot = json.loads(file.read_text())
+            dead[file] = snapshot
+    new = [snapshot for snapshot in dead.values() if snapshot.get("process_id") not in folded]
+    if new or folded != set(aggregate["folded"]):
+        counters, histograms = merge([aggregate, *new])
+        aggregate = {
+            "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+            "histograms": [[name, labels, values] for (name, labels), values in histograms.items()],
+            "folded": sorted(folded | {snapshot.get("process_id") for snapshot in new}),
+        }
+        _write_json(path, aggregate)
+    for file in dead:
+        with suppress(FileNotFoundError):
+            file.unlink()
+    return aggregate, [snapshot for file, snapshot in snapshots.items() if file not in dead]
+
+
+def collected_snapshots():
+    """Snapshots of every process, this one read from memory, the exited ones folded into one."""
+    snapshots = [registry.snapshot()]
+    directory = metrics_setting("DIR", None)
+    if not directory or not Path(directory).is_dir():
+        return snapshots
+    directory = Path(directory)
+    with open(directory / ".lock", "a") as lock:
+        # One scrape at a time folds, the others wait and read the result.
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        files = {}
+        for path in directory.glob("*.json"):
+            if path.name in (registry.filename, AGGREGATE_FILE):
+                continue
+            try:
+                files[path] = json.loads(path.read_text())
+            except (OSError, ValueError):
+                # Removed or being replaced, it is read again on the next scrape.
+                continue
+        aggregate, live = fold_dead_processes(directory, files)
+    return [*snapshots, aggregate, *live]
+
+
+def merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot["histograms"]:
+            if name not in HISTOGRAMS or len(values) != len(HISTOGRAMS[name][1]) + 2:
+                continue
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for position, value in enumerate(values):
+                merged[position] += value
+    return counters, histograms
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    """Prometheus text exposition of the merged snapshots."""
+    counters, histograms = merge(snapshots)
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        lines += [
+            f"{name}{_labels(labels)} {_number(value)}"
+            for (metric, labels), value in sorted(counters.items())
+            if metric == name
+        ]
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*map(str, buckets), "+Inf"), values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels((*labels, ('le', bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(values[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def scrape_allowed(request):
+    if request.META.get("REMOTE_ADDR") in metrics_setting("ALLOWED_IPS", ()):
+        return True
+    token = metrics_setting("TOKEN", "")
+    if token and hmac.compare_digest(request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"):
+        return True
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except APIException:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def metrics_view(request):
+    """Serve the merged metrics of all processes."""
+    if not scrape_allowed(request):
+        return HttpResponse("Forbidden\n", status=403, content_type=CONTENT_TYPE)
+    registry.flush()
+    return HttpResponse(render(collected_snapshots()), content_type=CONTENT_TYPE)
+
+
+def record_query(execute, sql, params, many, context):
+    """``execute_wrapper`` adding the queries to the metrics of the current request."""
+    current = _current.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current.queries += 1
+        current.db_seconds += time.perf_counter() - started
+
+
+def instrument_connection(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# Connections are per thread: wrap every new one, async views query from other threads.
+connection_created.connect(instrument_connection, dispatch_uid="user_listing_proj.metrics")
+
+
+@contextmanager
+def serializer_timer():
+    """Count the time spent in the block as serializer time of the current request."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.serializer_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def timed_sheets_call(operation):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.inc("sheets_call_errors_total", {"operation": operation})
+        raise
+    finally:
+        registry.observe("sheets_call_seconds", {"operation": operation}, time.perf_counter() - started)
+        registry.flush()
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Count the time spent building ``.data`` as serializer time, use ``TimedListSerializer`` for lists."""
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+def route(request):
+    """Route pattern of the request, resolved here for responses sent before the URL was resolved."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return "unmatched"
+    return match.route
+
+
+def record(request, response, started, current):
+    labels = {"route": route(request), "method": request.method}
+    registry.inc("http_requests_total", {**labels, "status": str(response.status_code)})
+    registry.observe("http_request_duration_seconds", labels, time.perf_counter() - started)
+    registry.observe("http_request_db_queries", labels, current.queries)
+    registry.observe("http_request_db_seconds", labels, current.db_seconds)
+    registry.observe("http_request_serializer_seconds", labels, current.serializer_seconds)
+    registry.flush()
+
+
+def start(request):
+    for alias in connections:
+        instrument_connection(connections[alias])
+    return _current.set(RequestMetrics())
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    """Record the metrics of every request, see the module docstring."""
+    if not metrics_setting("ENABLED", True):
+        return get_response
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            started, token = time.perf_counter(), start(request)
+            try:
+                response = await get_response(request)
+                record(request, response, started, _current.get())
+                return response
+            finally:
+                _current.reset(token)
+
+    else:
+
+        def middleware(request):
+            started, token = time.perf_counter(), start(request)
+            try:
+                response = get_response(request)
+                record(request, response, started, _current.get())
+                return response
+            finally:
+                _current.reset(token)
+
+    return middleware
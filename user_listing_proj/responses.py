@@ -0,0 +1,7 @@
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+
+def json_response(data, status=200, headers=None):
+    """Render ``data`` like a DRF ``Response`` for plain Django (async) views."""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type="application/json", headers=headers)
@@ -0,0 +1,273 @@
+"""
+Read replica routing for request traffic.
+
+``ReplicaRoutingMiddleware`` remembers the current request, and
+``ReplicaRouter`` sends reads of the models in ``REPLICA_ROUTING["MODELS"]``
+made while serving a safe request (GET, HEAD, OPTIONS) to one of the aliases
+in ``settings.DATABASE_REPLICAS``. Everything else uses ``default``:
+
+* writes, and reads made while serving unsafe requests,
+* reads of a user for ``STICKY_SECONDS`` after one of their requests wrote,
+  so that users always see their own changes. The write is remembered in a
+  signed cookie, which reaches whichever process serves the next request,
+  and in the ``CACHE_ALIAS`` cache for clients that drop cookies, make it a
+  shared cache when running several processes,
+* reads while every replica is marked unhealthy.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from itertools import count
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import SimpleLazyObject, empty
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+DEFAULT_MODELS = ("real_estate_listing.realestateitem", "users.baseuser")
+
+_current_request = ContextVar("replica_routing_request", default=None)
+
+
+def routing_setting(name, default):
+    return getattr(settings, "REPLICA_ROUTING", {}).get(name, default)
+
+
+def replica_aliases():
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+class QueryMetrics:
+    """Number of queries, time spent and errors per database alias, for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._aliases = {}
+        self.fallbacks = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """``execute_wrapper`` installed on every connection the router hands out."""
+        alias = context["connection"].alias
+        started = time.perf_counter()
+        failed = False
+        try:
+            return execute(sql, params, many, context)
+        except DatabaseError:
+            failed = True
+            if alias in replica_aliases():
+                health.mark_down(alias)
+            raise
+        finally:
+            self.record(alias, time.perf_counter() - started, failed)
+
+    def record(self, alias, seconds, failed=False):
+        with self._lock:
+            metrics = self._aliases.setdefault(alias, {"queries": 0, "seconds": 0.0, "errors": 0})
+            metrics["queries"] += 1
+            metrics["seconds"] += seconds
+            metrics["errors"] += failed
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "aliases": {alias: dict(metrics) for alias, metrics in self._aliases.items()},
+                "fallbacks": self.fallbacks,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._aliases = {}
+            self.fallbacks = 0
+
+
+class ReplicaHealth:
+    """
+    Track replicas that failed and probe them again after ``RETRY_SECONDS``.
+
+    A replica is marked down when one of its queries raises a database error
+    or when a probe (``SELECT 1``) fails.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._down_until = {}
+
+    def mark_down(self, alias):
+        with self._lock:
+            self._down_until[alias] = time.monotonic() + routing_setting("RETRY_SECONDS", 30)
+
+    def mark_up(self, alias):
+        with self._lock:
+            self._down_until.pop(alias, None)
+
+    def is_healthy(self, alias):
+        with self._lock:
+            down_until = self._down_until.get(alias)
+        if down_until is None:
+            return True
+        if time.monotonic() < down_until:
+            return False
+        return self.probe(alias)
+
+    def probe(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except DatabaseError:
+            self.mark_down(alias)
+            return False
+        self.mark_up(alias)
+        return True
+
+
+metrics = QueryMetrics()
+health = ReplicaHealth()
+
+
+def query_metrics():
+    return metrics.snapshot()
+
+
+def instrument(alias):
+    connection = connections[alias]
+    if metrics not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics)
+    return alias
+
+
+def sticky_key(user_id):
+    return f"db:sticky:{user_id}"
+
+
+def known_user_id(request):
+    """Return the id of the authenticated user without triggering a lookup, ``None`` if unknown."""
+    user = request.__dict__.get("user")
+    if user is None or (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+        return None
+    return user.pk if user.is_authenticated else None
+
+
+def sticky_cache():
+    return caches[routing_setting("CACHE_ALIAS", "default")]
+
+
+def wrote_recently(request, user_id):
+    cookie = request.get_signed_cookie(
+        routing_setting("STICKY_COOKIE", "db_sticky"),
+        default=None,
+        salt=sticky_key(user_id),
+        max_age=routing_setting("STICKY_SECONDS", 5),
+    )
+    return cookie == str(user_id) or bool(sticky_cache().get(sticky_key(user_id)))
+
+
+def is_sticky(request):
+    user_id = known_user_id(request)
+    if user_id is None:
+        return False
+    sticky = request.__dict__.get("_replica_sticky")
+    if sticky is None or sticky[0] != user_id:
+        sticky = (user_id, wrote_recently(request, user_id))
+        request._replica_sticky = sticky
+    return sticky[1]
+
+
+def remember_write(request, response):
+    if request.method in SAFE_METHODS or response.status_code >= 400:
+        return
+    user_id = known_user_id(request)
+    if user_id is None:
+        return
+    seconds = routing_setting("STICKY_SECONDS", 5)
+    sticky_cache().set(sticky_key(user_id), True, seconds)
+    response.set_signed_cookie(
+        routing_setting("STICKY_COOKIE", "db_sticky"),
+        str(user_id),
+        salt=sticky_key(user_id),
+        max_age=seconds,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite="Lax",
+    )
+
+
+@sync_and_async_middleware
+def ReplicaRoutingMiddleware(get_response):
+    """Make the current request visible to ``ReplicaRouter`` and record the writes of each user."""
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = _current_request.set(request)
+            try:
+                response = await get_response(request)
+            finally:
+                _current_request.reset(token)
+            remember_write(request, response)
+            return response
+
+    else:
+
+        def middleware(request):
+            token = _current_request.set(request)
+            try:
+                response = get_response(request)
+            finally:
+                _current_request.reset(token)
+            remember_write(request, response)
+            return response
+
+    return middleware
+
+
+class ReplicaRouter:
+    """
+    Route reads as described in the module docstring.
+
+    Returns ``None`` for the primary so Django keeps following ``using()``
+    and instance hints as it does without this router, except that instances
+    read from a replica are always written to the primary.
+    """
+
+    def __init__(self):
+        self._next = count()
+
+    def db_for_read(self, model, **hints):
+        instrument(DEFAULT_DB_ALIAS)
+        replicas = replica_aliases()
+        request = _current_request.get()
+        if (
+            not replicas
+            or request is None
+            or request.method not in SAFE_METHODS
+            or model._meta.label_lower not in routing_setting("MODELS", DEFAULT_MODELS)
+            or is_sticky(request)
+        ):
+            return None
+        start = next(self._next)
+        for offset in range(len(replicas)):
+            alias = replicas[(start + offset) % len(replicas)]
+            if health.is_healthy(alias):
+                return instrument(alias)
+        metrics.record_fallback()
+        return None
+
+    def db_for_write(self, model, **hints):
+        instrument(DEFAULT_DB_ALIAS)
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in replica_aliases():
+            # Rows read from a replica are written back to the primary.
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
+import os
 from datetime import timedelta
 from pathlib import Path
 
@@ -44,11 +45,13 @@ INSTALLED_APPS = [
     "rest_framework_simplejwt",
     "django_rest_passwordreset",
     "real_estate_listing",
-    "background_task",
 ]
 
 MIDDLEWARE = [
+    "user_listing_proj.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "user_listing_proj.limiter.ConcurrencyLimitMiddleware",
+    "user_listing_proj.routers.ReplicaRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -85,7 +88,31 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+    },
+    # Stand-in read replica, only used when listed in DATABASE_REPLICAS.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db_replica.sqlite3",
+        "TEST": {"NAME": BASE_DIR / "test_db_replica.sqlite3"},
+    },
+}
+
+# Aliases that serve reads of safe requests, see user_listing_proj/routers.py.
+DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ["user_listing_proj.routers.ReplicaRouter"]
+
+REPLICA_ROUTING = {
+    "MODELS": ["real_estate_listing.realestateitem", "users.baseuser"],
+    # Reads of a user go to the primary this long after one of their requests wrote.
+    "STICKY_SECONDS": 5,
+    # Writes are remembered in this signed cookie and in this cache, which must be
+    # shared by the workers for clients that do not send cookies back.
+    "STICKY_COOKIE": "db_sticky",
+    "CACHE_ALIAS": "default",
+    # A replica that failed is probed again after this long.
+    "RETRY_SECONDS": 30,
 }
 
 
@@ -107,6 +134,9 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Worker processes hashing passwords for bulk registration, defaults to the CPU count.
+PASSWORD_HASHING_WORKERS = None
+
 
 SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
@@ -128,7 +158,7 @@ SIMPLE_JWT = {
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
@@ -136,6 +166,155 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "rest_framework.schemas.coreapi.AutoSchema",
 }
 
+# Serve list endpoints from values_list() rows with precompiled converters and
+# orjson (when installed). Responses are byte for byte the same as DRF's.
+FAST_SERIALIZATION = False
+
+GSHEETS = {
+    "BACKEND": "real_estate_listing.sheets.GspreadSheetBackend",
+    "OPTIONS": {
+        "credentials_file": BASE_DIR / "real_estate_listing" / "shujat_updated_gsheets.json",
+        "spreadsheet": "RealEstateData",
+    },
+}
+
+GEOCODER = {
+    "BACKEND": "real_estate_listing.geo.GazetteerGeocoder",
+    "OPTIONS": {"path": BASE_DIR / "real_estate_listing" / "data" / "gazetteer.csv"},
+    "CACHE_SIZE": 10000,
+}
+
+# Lower edges of the listing price histogram buckets, the last bucket is open ended.
+# Run ``manage.py rebuild_price_stats`` after changing them.
+PRICE_HISTOGRAM_EDGES = [0, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000]
+
+# Price summary reads apply at most this many of the deltas the outbox has not
+# folded yet, the summary lags behind a larger backlog until it is folded.
+PRICE_SUMMARY_MAX_READ_DELTAS = 1000
+
+OUTBOX = {
+    "CONCURRENCY": 4,
+    "BATCH_SIZE": 100,
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF_BASE": 2,
+    "BACKOFF_MAX": 300,
+    "LEASE_SECONDS": 300,
+    "POLL_INTERVAL": 1,
+}
+
+# Logins are counted in memory and written at most FLUSH_INTERVAL seconds or
+# MAX_PENDING logins later, which is also what a crashed worker can lose.
+LOGIN_COUNTER = {
+    "FLUSH_INTERVAL": 1,
+    "MAX_PENDING": 500,
+}
+
+# Users resolved from access tokens are cached per process. Saving or deleting
+# a user invalidates the entry in the process that did it, TTL bounds how long
+# other workers may keep using the old copy.
+JWT_USER_CACHE = {
+    "ENABLED": True,
+    "MAX_SIZE": 10000,
+    "TTL": 60,
+}
+
+# Listing responses are cached per process by default. Deployments running
+# several workers need a shared backend such as Redis or Memcached, otherwise
+# a worker keeps serving pages another worker has invalidated.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "user-listing",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+LISTING_CACHE = {
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": 300,
+}
+
+# Memory-mapped columnar snapshot read by real_estate_listing.analytics, written
+# by the snapshot_listings command. Incremental refreshes read the listings and
+# tombstones of the change feed since the previous generation.
+LISTING_SNAPSHOT = {
+    "PATH": BASE_DIR / "snapshots",
+}
+
+# Comparable listing price estimator of real_estate_listing.valuation, refreshed
+# from the listings and tombstones of the change feed since the previous refresh.
+VALUATION = {
+    "DIMENSIONS": 512,
+    "K": 10,
+    "ADDRESS_WEIGHT": 2.0,
+    "REFRESH_SECONDS": 30,
+}
+
+# MinHash LSH near-duplicate detection of real_estate_listing.dedup. Changing
+# NUM_PERM, BANDS, SHINGLE_SIZE or SEED needs find_duplicates --rebuild.
+DEDUP = {
+    "NUM_PERM": 128,
+    "BANDS": 32,
+    "SHINGLE_SIZE": 3,
+    "THRESHOLD": 0.7,
+    "SEED": 1,
+}
+
+# Saved search matching runs in the outbox worker, BACKEND notifies the users
+# (real_estate_listing.alerts.EmailNotifier sends one email per user and batch).
+SAVED_SEARCH_ALERTS = {
+    "BACKEND": "real_estate_listing.alerts.LogNotifier",
+    "REFRESH_SECONDS": 10,
+}
+
+# /realestates/changes/ pages through change versions assigned after commit,
+# see real_estate_listing/changes.py. Tombstones older than the retention are
+# removed by compact_tombstones, cursors that had not reached them answer 410.
+CHANGE_FEED = {
+    "TOMBSTONE_RETENTION_DAYS": 30,
+}
+
+# Server-Sent Events stream of listing changes served by asgi.py at
+# /realestates/events/. A client more than QUEUE_SIZE events behind is
+# disconnected, MAX_SUBSCRIBERS bounds the connections of one process.
+LISTING_EVENTS = {
+    "QUEUE_SIZE": 100,
+    "HEARTBEAT_SECONDS": 15,
+    "MAX_SUBSCRIBERS": 10000,
+}
+
+# Prometheus metrics served at /metrics. Every process writes its metrics to
+# DIR, at most every FLUSH_SECONDS, and /metrics adds up all the files. Files
+# of exited processes are folded into DIR/aggregate.json by the next scrape.
+# Scrapers connect from ALLOWED_IPS or send "Authorization: Bearer <TOKEN>",
+# staff users may read it with their JWT.
+METRICS = {
+    "ENABLED": True,
+    "DIR": BASE_DIR / "metrics",
+    "FLUSH_SECONDS": 1.0,
+    "ALLOWED_IPS": ["127.0.0.1", "::1"],
+    "TOKEN": os.environ.get("METRICS_TOKEN", ""),
+}
+
+# Adaptive per process concurrency limits, see user_listing_proj/limiter.py.
+# Classes are matched in order on method and path, requests over the limit of
+# their class get a 503 with Retry-After. State at /ops/concurrency/.
+CONCURRENCY_LIMITS = {
+    "ENABLED": True,
+    "RETRY_AFTER": 1,
+    "EXEMPT_PATH": r"^/(ops/|admin/|metrics$)",
+    "CLASSES": {
+        "login": {"METHODS": ["POST"], "PATH": r"^/auth/login/$", "INITIAL_LIMIT": 4, "MAX_LIMIT": 32},
+        "write": {
+            "METHODS": ["POST", "PUT", "PATCH", "DELETE"],
+            "PATH": r"^/(realestates|user|auth)/",
+            "INITIAL_LIMIT": 8,
+            "MAX_LIMIT": 64,
+        },
+        "read": {"METHODS": ["GET", "HEAD", "OPTIONS"], "PATH": r"^/", "INITIAL_LIMIT": 32, "MAX_LIMIT": 512},
+    },
+}
+
 SWAGGER_SETTINGS = {
     "SECURITY_DEFINITIONS": {
         "api_key": {"type": "apiKey", "in": "header", "name": "Authorization"}
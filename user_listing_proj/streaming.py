@@ -0,0 +1,20 @@
+"""Helpers for streaming large result sets without materializing them."""
+from django.core.serializers.json import DjangoJSONEncoder
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def ndjson_chunks(rows, rows_per_chunk=500):
+    """Encode an iterable of dicts as newline delimited JSON, a few hundred rows per chunk."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(row))
+        if len(lines) >= rows_per_chunk:
+            lines.append("")
+            yield "\n".join(lines).encode("utf-8")
+            lines = []
+    if lines:
+        lines.append("")
+        yield "\n".join(lines).encode("utf-8")
+
@@ -23,6 +23,8 @@ from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.routers import SimpleRouter
 from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
 
+from real_estate_listing import async_views as real_estate_async_views
+from users import async_views as users_async_views
 from users.views import (
     CustomResetPasswordConfirm,
     CustomResetPasswordRequestToken,
@@ -33,10 +35,22 @@ from users.views import (
     UserUpdateViewSet
 )
 from real_estate_listing.views import (
-    LCRealEstateItemViewSet, RUDRealEstateItemViewSet
+    LCRealEstateItemViewSet,
+    RealEstateItemChangesView,
+    RealEstateItemEstimateView,
+    RealEstateItemExportView,
+    RealEstateItemImportView,
+    RealEstateItemSearchView,
+    RealEstateItemStatsView,
+    RUDRealEstateItemViewSet,
+    SavedSearchDetailView,
+    SavedSearchListCreateView,
+    SearchAlertListView,
 )
 
 from .utils import BothHttpAndHttpsSchemaGenerator
+from .metrics import metrics_view
+from .views import ConcurrencyLimitsView
 
 
 router = SimpleRouter()
@@ -66,6 +80,11 @@ urlpatterns = (
                 UserRegisterViewSet.as_view({"post": "register_user"}),
                 name="register_user",
             ),
+            path(
+                "user/register/bulk/",
+                UserRegisterViewSet.as_view({"post": "register_users"}),
+                name="register_users",
+            ),
             path(
                 "user/fetch/",
                 UserViewSet.as_view({"get": "list"}),
@@ -100,10 +119,38 @@ urlpatterns = (
             path("accounts/", include("rest_framework.urls", namespace="rest_framework")),
             path("realestates/", LCRealEstateItemViewSet.as_view(),
                  name="realestate_list_create"),
+            path("realestates/search/", RealEstateItemSearchView.as_view(),
+                 name="realestate_search"),
+            path("realestates/export/", RealEstateItemExportView.as_view(),
+                 name="realestate_export"),
+            path("realestates/import/", RealEstateItemImportView.as_view(),
+                 name="realestate_import"),
+            path("realestates/stats/", RealEstateItemStatsView.as_view(),
+                 name="realestate_stats"),
+            path("realestates/changes/", RealEstateItemChangesView.as_view(),
+                 name="realestate_changes"),
+            path("realestates/estimate/", RealEstateItemEstimateView.as_view(),
+                 name="realestate_estimate"),
+            path("realestates/saved-searches/", SavedSearchListCreateView.as_view(),
+                 name="saved_search_list_create"),
+            path("realestates/saved-searches/<int:pk>/", SavedSearchDetailView.as_view(),
+                 name="saved_search_retrieve_update"),
+            path("realestates/alerts/", SearchAlertListView.as_view(),
+                 name="saved_search_alerts"),
             path(
                 "realestates/<int:pk>/", RUDRealEstateItemViewSet.as_view(),
                 name="realestate_retrieve_update",
             ),
+            # Native async read endpoints, for deployments served by an ASGI server.
+            path("async/realestates/", real_estate_async_views.listing_list, name="async_realestate_list"),
+            path(
+                "async/realestates/<int:pk>/", real_estate_async_views.listing_detail,
+                name="async_realestate_retrieve",
+            ),
+            path("async/user/fetch/", users_async_views.user_list, name="async_all_user"),
+            path("async/user/fetch/<int:pk>/", users_async_views.user_detail, name="async_one_user"),
+            path("ops/concurrency/", ConcurrencyLimitsView.as_view(), name="ops_concurrency"),
+            path("metrics", metrics_view, name="metrics"),
             path(
                 "swagger/",
                 schema_view.with_ui("swagger", cache_timeout=0),
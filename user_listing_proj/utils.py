@@ -14,6 +14,15 @@ def required_env_var(var_name):
     return var
 
 
+def prefix_range(prefix):
+    """Return ``(low, high)`` so that ``low <= value < high`` matches values starting with ``prefix``.
+
+    Unlike ``__startswith`` (a LIKE on SQLite, which ignores case and so
+    cannot use a plain index) a range lookup is answered from the column index.
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
 class BothHttpAndHttpsSchemaGenerator(OpenAPISchemaGenerator):
     def get_schema(self, request=None, public=False):
         schema = super().get_schema(request, public)
@@ -0,0 +1,21 @@
+"""Operational endpoints of the project."""
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from users.authentication import CachedJWTAuthentication
+
+from .limiter import limiter_state
+
+
+class ConcurrencyLimitsView(APIView):
+    """Current concurrency limit, in flight requests and counters of every endpoint class of this process."""
+
+    permission_classes = (IsAuthenticated, IsAdminUser)
+    authentication_classes = (CachedJWTAuthentication,)
+
+    @swagger_auto_schema(tags=["Ops"])
+    def get(self, request):
+        return Response(limiter_state(), status=status.HTTP_200_OK)
@@ -0,0 +1,60 @@
+"""Native async read endpoints for the user directory."""
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+
+from user_listing_proj.fast_serialization import ValuesSerializer, fast_json_response, fast_serialization_enabled
+from user_listing_proj.responses import json_response
+from users.authentication import async_jwt_authenticated
+from users.serializers import UserListSerializer, UserSerializer
+from users.views import UserDirectoryPagination, UserViewSet
+
+UserModel = get_user_model()
+
+
+@async_jwt_authenticated
+async def user_list(request):
+    """
+    Page through the user directory like ``UserViewSet.list``.
+
+    Cursors are compatible with the sync endpoint, but pages only link
+    forward and ``?stream=1`` is not available here.
+    """
+    drf_request = Request(request)
+    paginator = UserDirectoryPagination()
+    paginator.base_url = drf_request.build_absolute_uri()
+    page_size = paginator.get_page_size(drf_request)
+    try:
+        cursor = paginator.decode_cursor(drf_request)
+    except NotFound as e:
+        return json_response({"detail": e.detail}, status=404)
+    if cursor is not None and (cursor.reverse or cursor.offset):
+        return json_response({"errors": ["Only forward cursors are supported on this endpoint"]}, status=400)
+
+    queryset = UserViewSet.filter_queryset(drf_request, UserModel.objects.all())
+    if cursor is not None and cursor.position is not None:
+        queryset = queryset.filter(id__gt=cursor.position)
+    fast = ValuesSerializer.for_serializer(UserListSerializer) if fast_serialization_enabled() else None
+    queryset = queryset.order_by("id")
+    users = [user async for user in (fast.rows(queryset) if fast else queryset)[: page_size + 1]]
+    next_link = None
+    if len(users) > page_size:
+        users = users[:page_size]
+        next_link = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(users[-1].id)))
+    if fast:
+        results, orjson_safe = fast.serialize(users)
+        return fast_json_response({"next": next_link, "previous": None, "results": results}, orjson_safe)
+    return json_response(
+        {"next": next_link, "previous": None, "results": UserListSerializer(users, many=True).data}
+    )
+
+
+@async_jwt_authenticated
+async def user_detail(request, pk):
+    """Retrieve a user like ``UserViewSet.retrieve``."""
+    try:
+        user = await UserModel.objects.aget(pk=pk)
+    except UserModel.DoesNotExist:
+        return json_response({"detail": "Not found."}, status=404)
+    return json_response(UserSerializer(user).data)
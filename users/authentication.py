@@ -0,0 +1,169 @@
+"""JWT authentication that resolves users from an in-process cache."""
+import copy
+import functools
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from user_listing_proj.responses import json_response
+
+
+def user_cache_setting(name, default):
+    return getattr(settings, "JWT_USER_CACHE", {}).get(name, default)
+
+
+class UserCache:
+    """Bounded LRU cache of active users by id whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self._users = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._users[user_id] = user
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._users), "hits": self.hits, "misses": self.misses}
+
+
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    """Return the process wide user cache configured by ``settings.JWT_USER_CACHE``."""
+    global _user_cache
+    if _user_cache is None:
+        with _user_cache_lock:
+            if _user_cache is None:
+                _user_cache = UserCache(
+                    maxsize=user_cache_setting("MAX_SIZE", 10000), ttl=user_cache_setting("TTL", 60)
+                )
+    return _user_cache
+
+
+# Written by ``users.counters.LoginCounter`` with ``QuerySet.update()``, which
+# sends no signal: cached users load them from the database when read.
+VOLATILE_FIELDS = ("login_count", "last_login")
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that skips the user query for recently seen users.
+
+    Users are invalidated when they are saved or deleted, see
+    ``users.signals``, and when the login counter of the process flushes.
+    ``VOLATILE_FIELDS`` are deferred so other processes' logins are never
+    read from the cache. Every request gets its own copy of the cached user
+    so attributes set on ``request.user`` never leak into other requests. Set
+    ``JWT_USER_CACHE["ENABLED"]`` to ``False`` to always query the database.
+    """
+
+    @staticmethod
+    def user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def get_user(self, validated_token):
+        if not user_cache_setting("ENABLED", True):
+            return super().get_user(validated_token)
+        user_id = self.user_id(validated_token)
+        cache = get_user_cache()
+        user = cache.get(user_id)
+        if user is None:
+            try:
+                user = self.user_model.objects.defer(*VOLATILE_FIELDS).get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if not user.is_active:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            cache.set(user_id, user)
+        return copy.copy(user)
+
+    async def aauthenticate(self, request):
+        """Async ``authenticate`` for plain Django views, the user is read with the async ORM."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.user_id(validated_token)
+        cache = get_user_cache() if user_cache_setting("ENABLED", True) else None
+        user = cache.get(user_id) if cache is not None else None
+        if user is None:
+            try:
+                user = await self.user_model.objects.defer(*VOLATILE_FIELDS).aget(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if not user.is_active:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            if cache is not None:
+                cache.set(user_id, user)
+        return copy.copy(user)
+
+
+def async_jwt_authenticated(view):
+    """
+    Run an async read-only view for JWT authenticated users.
+
+    Mirrors what DRF does for ``IsAuthenticated`` views: only ``GET`` and
+    ``HEAD`` are allowed and failures get the same 401 bodies and
+    ``WWW-Authenticate`` header.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return json_response({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+        authentication = CachedJWTAuthentication()
+        try:
+            result = await authentication.aauthenticate(request)
+            if result is None:
+                raise NotAuthenticated()
+        except (AuthenticationFailed, NotAuthenticated) as e:
+            detail = e.detail if isinstance(e.detail, (list, dict)) else {"detail": e.detail}
+            return json_response(
+                detail, status=401, headers={"WWW-Authenticate": authentication.authenticate_header(request)}
+            )
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+
+    return wrapper
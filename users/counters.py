@@ -0,0 +1,136 @@
+"""Write-behind buffering of user login counters."""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+
+from users.authentication import get_user_cache
+
+logger = logging.getLogger(__name__)
+
+
+class LoginCounter:
+    """Buffer logins per user and write them with one ``UPDATE`` per flush.
+
+    Each flush adds the buffered number of logins to ``login_count`` with an
+    ``F()`` expression and stores the latest ``last_login``, so concurrent
+    logins never overwrite each other and a login never rewrites the whole
+    user row. A flush happens ``flush_interval`` seconds after the first
+    buffered login or once ``max_pending`` logins are buffered, which bounds
+    what a crashed process can lose. ``flush_interval=0`` writes every login
+    immediately.
+    """
+
+    def __init__(self, flush_interval=1.0, max_pending=500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._pending_logins = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def record(self, user_id, when):
+        """Buffer one login of ``user_id`` at ``when``.
+
+        Returns the number of logins of the user buffered up to and including
+        this one, which is what a user row read before the login is missing.
+        """
+        with self._lock:
+            count, last_login = self._pending.get(user_id, (0, when))
+            self._pending[user_id] = (count + 1, max(last_login, when))
+            self._pending_logins += 1
+            buffered = count + 1
+            full = not self.flush_interval or self._pending_logins >= self.max_pending
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._timer_flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+        return buffered
+
+    def _timer_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            # flush() has already logged the error and re-queued the logins.
+            pass
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Write every buffered login, return the number of users updated."""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending, self._pending_logins = {}, 0
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not pending:
+                return 0
+            try:
+                self.write(pending)
+            except Exception:
+                logger.exception("Writing %d buffered logins failed", sum(c for c, _ in pending.values()))
+                with self._lock:
+                    for user_id, (count, last_login) in pending.items():
+                        current, latest = self._pending.get(user_id, (0, last_login))
+                        self._pending[user_id] = (current + count, max(latest, last_login))
+                        self._pending_logins += count
+                raise
+            return len(pending)
+
+    @staticmethod
+    def write(pending):
+        """Apply ``{user_id: (logins, last_login)}`` with a single statement."""
+        user_ids = list(pending)
+        with transaction.atomic():
+            get_user_model().objects.filter(pk__in=user_ids).update(
+                login_count=F("login_count") + Case(
+                    *[When(pk=user_id, then=Value(count)) for user_id, (count, _) in pending.items()],
+                    default=Value(0),
+                ),
+                last_login=Case(
+                    *[When(pk=user_id, then=Value(last_login)) for user_id, (_, last_login) in pending.items()],
+                    default=F("last_login"),
+                ),
+            )
+            # The update sends no post_save, drop the cached users here.
+            transaction.on_commit(lambda: get_user_cache().invalidate(*user_ids))
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def build_login_counter(**overrides):
+    """Build a counter from ``settings.LOGIN_COUNTER`` with optional overrides."""
+    config = {**getattr(settings, "LOGIN_COUNTER", {}), **overrides}
+    return LoginCounter(
+        flush_interval=config.get("FLUSH_INTERVAL", 1.0),
+        max_pending=config.get("MAX_PENDING", 500),
+    )
+
+
+def get_login_counter():
+    """Return the process wide login counter."""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                _counter = build_login_counter()
+                atexit.register(_flush_at_exit, _counter)
+    return _counter
+
+
+def _flush_at_exit(counter):
+    try:
+        counter.flush()
+    except Exception:
+        logger.exception("Flushing buffered logins at exit failed")
@@ -0,0 +1,50 @@
+"""Password hashing in a pool of worker processes."""
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+
+def _setup_worker():
+    # Spawned workers start without Django, forked ones inherit it.
+    if not settings.configured:
+        import django
+
+        django.setup()
+
+
+def _hash_chunk(passwords):
+    return [make_password(password) for password in passwords]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """Return the process wide pool sized by ``settings.PASSWORD_HASHING_WORKERS``."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = getattr(settings, "PASSWORD_HASHING_WORKERS", None) or os.cpu_count()
+                _pool = ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker)
+                atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def hash_passwords(passwords, chunk_size=8):
+    """
+    Hash ``passwords`` in parallel and return the hashes in the same order.
+
+    Hashing with PBKDF2 costs tens of milliseconds of CPU per password, which
+    would otherwise hold a request thread and the GIL for the whole batch.
+    """
+    passwords = list(passwords)
+    if len(passwords) <= 1:
+        return _hash_chunk(passwords)
+    chunks = [passwords[start:start + chunk_size] for start in range(0, len(passwords), chunk_size)]
+    return [hashed for chunk in get_hashing_pool().map(_hash_chunk, chunks) for hashed in chunk]
@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from users.counters import get_login_counter
+from users.views import TokenObtainUserSerializer
+
+PASSWORD = "bench-login-password"
+
+
+class SaveOnLoginSerializer(TokenObtainUserSerializer):
+    """The previous login path: increment in Python and save the whole row."""
+
+    def validate(self, attrs):
+        data = TokenObtainPairSerializer.validate(self, attrs)
+        self.user.login_count = self.user.login_count + 1
+        self.user.save()
+        return data
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent logins saving the user row on every login against "
+        "the write-behind login counter. Bench users are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--logins", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument(
+            "--real-hasher",
+            action="store_true",
+            help="Keep the configured password hasher instead of MD5, hashing then dominates the timings.",
+        )
+
+    def handle(self, *args, **options):
+        UserModel = get_user_model()
+        hashers = None if options["real_hasher"] else ["django.contrib.auth.hashers.MD5PasswordHasher"]
+        with override_settings(**({"PASSWORD_HASHERS": hashers} if hashers else {})):
+            users = [
+                UserModel.objects.create_user(email=f"bench-login-{i}@example.com", password=PASSWORD, username="")
+                for i in range(options["users"])
+            ]
+            try:
+                for name, serializer_class in (
+                    ("save", SaveOnLoginSerializer),
+                    ("write-behind", TokenObtainUserSerializer),
+                ):
+                    self.run_mode(name, serializer_class, users, options)
+            finally:
+                UserModel.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def run_mode(self, name, serializer_class, users, options):
+        UserModel = get_user_model()
+        UserModel.objects.filter(pk__in=[user.pk for user in users]).update(login_count=0)
+        logins = options["logins"]
+
+        def login(number):
+            try:
+                serializer = serializer_class(
+                    data={"email": users[number % len(users)].email, "password": PASSWORD}
+                )
+                serializer.is_valid(raise_exception=True)
+                return True
+            except Exception:
+                return False
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            succeeded = sum(pool.map(login, range(logins)))
+        get_login_counter().flush()
+        elapsed = time.perf_counter() - started
+
+        counted = sum(UserModel.objects.filter(pk__in=[user.pk for user in users]).values_list("login_count", flat=True))
+        self.stdout.write(
+            f"{name:12} logins={logins} ok={succeeded} counted={counted} lost={succeeded - counted} "
+            f"seconds={elapsed:.3f} logins/sec={logins / elapsed:.0f}"
+        )
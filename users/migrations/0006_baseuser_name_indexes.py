@@ -0,0 +1,21 @@
+# Generated by Django 4.1.5 on 2026-10-17 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_baseuser_login_count_alter_baseuser_username"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="baseuser",
+            index=models.Index(fields=["first_name"], name="user_first_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="baseuser",
+            index=models.Index(fields=["last_name"], name="user_last_name_idx"),
+        ),
+    ]
@@ -2,7 +2,6 @@ from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from django.db import models
 from django.contrib.auth.base_user import BaseUserManager
-from django.contrib.auth.signals import user_logged_in
 
 
 class UserManager(BaseUserManager):
@@ -46,6 +45,12 @@ class BaseUser(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["first_name"], name="user_first_name_idx"),
+            models.Index(fields=["last_name"], name="user_last_name_idx"),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -55,11 +60,3 @@ class BaseUser(AbstractUser):
         """
         full_name = '%s %s' % (self.first_name, self.last_name)
         return full_name.strip()
-
-
-def login_user(sender, request, user, **kwargs):
-    BaseUser.login_count = BaseUser.login_count + 1
-    BaseUser.save()
-
-
-user_logged_in.connect(login_user)
@@ -1,10 +1,12 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
+from user_listing_proj.metrics import TimedListSerializer, TimedSerializerMixin
+
 UserModel = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer to get user instance."""
 
     class Meta:
@@ -12,9 +14,10 @@ class UserSerializer(serializers.ModelSerializer):
 
         model = UserModel
         fields = ["id", "first_name", "last_name", "email", "address", "phone_number", "login_count"]
+        list_serializer_class = TimedListSerializer
 
 
-class UserListSerializer(serializers.ModelSerializer):
+class UserListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer to get user instance."""
 
     class Meta:
@@ -22,6 +25,7 @@ class UserListSerializer(serializers.ModelSerializer):
 
         model = UserModel
         fields = ["id", "first_name", "last_name", "email", "address", "phone_number"]
+        list_serializer_class = TimedListSerializer
 
 
 class UserRegisterSerializer(serializers.ModelSerializer):
@@ -34,7 +38,14 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         fields = ["id", "email", "password", "first_name", "last_name", "address", "phone_number"]
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserBulkRegisterSerializer(UserRegisterSerializer):
+    """Row of a bulk registration, email uniqueness is checked once for the whole batch."""
+
+    class Meta(UserRegisterSerializer.Meta):
+        extra_kwargs = {"email": {"validators": []}}
+
+
+class UserUpdateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer to update user."""
 
     class Meta:
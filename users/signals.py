@@ -1,12 +1,20 @@
 from django.contrib.auth.signals import user_logged_in
-from users.models import BaseUser
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from users.authentication import get_user_cache
+from users.counters import get_login_counter
+from users.models import BaseUser
 
 
 @receiver(user_logged_in, sender=BaseUser)
 def login_user(sender, request, user, **kwargs):
-    BaseUser.login_count = BaseUser.login_count + 1
-    BaseUser.save()
+    """Count session logins (admin, browsable API) through the write-behind counter."""
+    get_login_counter().record(user.pk, user.last_login or timezone.now())
 
 
-user_logged_in.connect(login_user, sender=BaseUser,)
+@receiver(post_save, sender=BaseUser)
+@receiver(post_delete, sender=BaseUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    get_user_cache().invalidate(instance.pk)
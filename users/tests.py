@@ -1,3 +1,291 @@
-from django.test import TestCase
+import json
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user_listing_proj import metrics
+from users.authentication import CachedJWTAuthentication, get_user_cache
+from users.counters import LoginCounter, _flush_at_exit
+from users.hashing import hash_passwords
+from users.models import BaseUser
+from users.serializers import UserListSerializer
+
+
+def setUpModule():
+    # Metrics files of the requests made by the tests go to a temporary directory.
+    global metrics_directory, metrics_settings
+    metrics_directory = tempfile.TemporaryDirectory()
+    metrics_settings = override_settings(METRICS={**settings.METRICS, "DIR": metrics_directory.name})
+    metrics_settings.enable()
+
+
+def tearDownModule():
+    metrics_settings.disable()
+    metrics_directory.cleanup()
+    metrics.registry.reset()
+
+
+class FastSerializationTests(TestCase):
+    """The fast user directory path must return exactly the bytes of ``UserListSerializer``."""
+
+    def setUp(self):
+        names = [("Ali", "Khan"), ("Ünïcode", "名前"), ('Quote "', "Back\\slash"), ("Line\u2028", "Ctrl\x01"), ("", "")]
+        BaseUser.objects.bulk_create(
+            BaseUser(
+                email=f"user{i}@example.com",
+                username=f"user{i}",
+                first_name=first_name,
+                last_name=last_name,
+                address="Lahore 🏠",
+                phone_number="+92 300 0000000",
+            )
+            for i, (first_name, last_name) in enumerate(names)
+        )
+        self.client = APIClient()
+        user = BaseUser.objects.get(email="user0@example.com")
+        self.client.force_authenticate(user)
+        # The async views authenticate the bearer token themselves.
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+    def assertSameBytes(self, path):
+        responses = []
+        for fast in (False, True):
+            cache.clear()
+            with override_settings(FAST_SERIALIZATION=fast):
+                responses.append(self.client.get(path))
+        slow, fast = responses
+        self.assertEqual(slow.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_user_pages(self):
+        response = self.assertSameBytes("/user/fetch/?page_size=2")
+        self.assertSameBytes(response.json()["next"])
+
+    def test_filtered_users(self):
+        self.assertSameBytes("/user/fetch/?name=%C3%9C")
+
+    def test_async_users(self):
+        self.assertSameBytes("/async/user/fetch/?page_size=2")
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        get_user_cache().clear()
+        self.user = BaseUser.objects.create(email="cached@example.com", username="")
+        self.token = AccessToken.for_user(self.user)
+
+    def authenticate(self):
+        return CachedJWTAuthentication().get_user(self.token)
+
+    def test_login_counter_flush_invalidates_the_cached_user(self):
+        self.authenticate()
+        self.assertEqual(get_user_cache().stats()["size"], 1)
+        counter = LoginCounter(flush_interval=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            counter.record(self.user.pk, timezone.now())
+        self.assertEqual(get_user_cache().stats()["size"], 0)
+        self.assertEqual(self.authenticate().login_count, 1)
+
+    def test_counters_written_elsewhere_are_not_read_from_the_cache(self):
+        self.authenticate()
+        # Another process flushing its counter only invalidates its own cache.
+        when = timezone.now()
+        BaseUser.objects.filter(pk=self.user.pk).update(login_count=5, last_login=when)
+        user = self.authenticate()
+        self.assertEqual(get_user_cache().stats()["hits"], 1)
+        self.assertEqual((user.login_count, user.last_login), (5, when))
+
+
+class BulkRegistrationTests(TestCase):
+    password = "Sturdy-Passw0rd-42"
+
+    def setUp(self):
+        self.admin = BaseUser.objects.create(email="admin@example.com", username="", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def row(self, email, **fields):
+        return {
+            "email": email, "password": self.password, "first_name": "Sara", "last_name": "Malik",
+            "address": "Lahore", "phone_number": "+92 300 0000000", **fields,
+        }
+
+    def register(self, rows):
+        return self.client.post("/user/register/bulk/", rows, format="json")
+
+    def test_every_row_gets_a_result_in_order(self):
+        response = self.register([
+            self.row("one@example.com"), self.row("not-an-email"), "not an object", self.row("two@example.com"),
+        ])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["created"], body["failed"]), (2, 2))
+        self.assertEqual([result["row"] for result in body["results"]], [1, 2, 3, 4])
+        self.assertEqual(
+            [result["status"] for result in body["results"]], ["created", "error", "error", "created"]
+        )
+        self.assertEqual(body["results"][0]["user"]["email"], "one@example.com")
+        self.assertEqual(body["results"][2]["errors"], ["Each user must be a JSON object"])
+
+    def test_duplicate_emails_in_one_batch(self):
+        body = self.register([self.row("same@example.com"), self.row("same@example.com")]).json()
+        self.assertEqual([result["status"] for result in body["results"]], ["created", "error"])
+        self.assertEqual(body["results"][1]["errors"], ["user with this email address already exists."])
+        self.assertEqual(BaseUser.objects.filter(email="same@example.com").count(), 1)
+
+    def test_existing_email_is_a_row_error(self):
+        BaseUser.objects.create(email="taken@example.com", username="")
+        body = self.register([self.row("taken@example.com"), self.row("free@example.com")]).json()
+        self.assertEqual([result["status"] for result in body["results"]], ["error", "created"])
+
+    def test_email_registered_concurrently_conflicts(self):
+        def register_meanwhile(passwords):
+            BaseUser.objects.create(email="race@example.com", username="race")
+            return [make_password(password) for password in passwords]
+
+        with mock.patch("users.views.hash_passwords", side_effect=register_meanwhile):
+            response = self.register([self.row("race@example.com"), self.row("calm@example.com")])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(BaseUser.objects.filter(email="calm@example.com").exists())
+
+    def test_users_are_inserted_with_one_statement(self):
+        rows = [self.row(f"user{number}@example.com") for number in range(10)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.register(rows).json()["created"], 10)
+        inserts = [query["sql"] for query in queries if query["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+
+    def test_passwords_hashed_in_the_pool_check(self):
+        hashes = hash_passwords([f"{self.password}-{number}" for number in range(10)], chunk_size=3)
+        self.assertEqual(len(hashes), 10)
+        for number, hashed in enumerate(hashes):
+            self.assertTrue(check_password(f"{self.password}-{number}", hashed))
+        self.assertFalse(check_password(self.password, hashes[0]))
+
+        self.register([self.row("pooled@example.com"), self.row("pooled-too@example.com")])
+        user = BaseUser.objects.get(email="pooled-too@example.com")
+        self.assertTrue(user.check_password(self.password))
+
+
+class LoginCounterTests(TestCase):
+    def setUp(self):
+        self.users = [
+            BaseUser.objects.create(email=f"login{number}@example.com", username=f"login{number}") for number in range(3)
+        ]
+        self.counter = LoginCounter(flush_interval=60, max_pending=100)
+        self.addCleanup(self.counter.flush)
+
+    def counts(self):
+        users = BaseUser.objects.filter(pk__in=[user.pk for user in self.users]).order_by("pk")
+        return list(users.values_list("login_count", flat=True))
+
+    def test_one_update_per_flush(self):
+        when = timezone.now()
+        for user, logins in zip(self.users, (1, 2, 3)):
+            for login in range(1, logins + 1):
+                self.assertEqual(self.counter.record(user.pk, when), login)
+        self.assertEqual(self.counts(), [0, 0, 0])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.counter.flush(), 3)
+        updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertIn("CASE", updates[0])
+        self.assertEqual(self.counts(), [1, 2, 3])
+        self.assertEqual(BaseUser.objects.get(pk=self.users[0].pk).last_login, when)
+
+    def test_failed_flush_requeues_the_logins(self):
+        self.counter.record(self.users[0].pk, timezone.now())
+        with mock.patch.object(LoginCounter, "write", side_effect=RuntimeError("database is locked")):
+            with self.assertLogs("users.counters", "ERROR"), self.assertRaises(RuntimeError):
+                self.counter.flush()
+        self.counter.record(self.users[0].pk, timezone.now())
+        self.assertEqual(self.counter.flush(), 1)
+        self.assertEqual(self.counts(), [2, 0, 0])
+
+    def test_max_pending_forces_a_flush(self):
+        counter = LoginCounter(flush_interval=60, max_pending=3)
+        when = timezone.now()
+        counter.record(self.users[0].pk, when)
+        counter.record(self.users[1].pk, when)
+        self.assertEqual(self.counts(), [0, 0, 0])
+        counter.record(self.users[0].pk, when)
+        self.assertEqual(self.counts(), [2, 1, 0])
+        self.assertEqual(counter.flush(), 0)
+
+    def test_shutdown_writes_pending_logins_once(self):
+        self.counter.record(self.users[2].pk, timezone.now())
+        with mock.patch.object(LoginCounter, "write", side_effect=RuntimeError("database is locked")):
+            with self.assertLogs("users.counters", "ERROR"):
+                _flush_at_exit(self.counter)
+        self.assertEqual(self.counts(), [0, 0, 0])
+        _flush_at_exit(self.counter)
+        _flush_at_exit(self.counter)
+        self.assertEqual(self.counts(), [0, 0, 1])
+
+
+class UserDirectoryTests(TestCase):
+    def setUp(self):
+        BaseUser.objects.bulk_create(
+            BaseUser(email=email, username=email, first_name=first_name, last_name=last_name)
+            for email, first_name, last_name in [
+                ("john@example.com", "John", "Doe"), ("joan@example.com", "Joan", "Jordan"),
+                ("jo@other.com", "Amir", "Jones"), ("sara@example.com", "Sara", "Malik"),
+            ]
+        )
+        self.users = list(BaseUser.objects.order_by("id"))
+        self.admin = BaseUser.objects.create(email="zz-admin@example.com", username="admin", is_staff=True)
+        self.client = APIClient()
+
+    def emails(self, response):
+        return [user["email"] for user in response.json()["results"]]
+
+    def test_cursor_pages_walk_every_user_once(self):
+        self.client.force_authenticate(self.users[0])
+        response, seen = self.client.get("/user/fetch/", {"page_size": 2}), []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen += self.emails(response)
+            if not response.json()["next"]:
+                break
+            response = self.client.get(response.json()["next"])
+        self.assertEqual(seen, [user.email for user in self.users] + [self.admin.email])
+
+    def test_prefix_filters(self):
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(
+            self.emails(self.client.get("/user/fetch/", {"email": "jo"})),
+            ["john@example.com", "joan@example.com", "jo@other.com"],
+        )
+        self.assertEqual(self.emails(self.client.get("/user/fetch/", {"email": "joh"})), ["john@example.com"])
+        self.assertEqual(
+            self.emails(self.client.get("/user/fetch/", {"name": "Jo"})),
+            ["john@example.com", "joan@example.com", "jo@other.com"],
+        )
+        self.assertEqual(self.emails(self.client.get("/user/fetch/", {"name": "Jord"})), ["joan@example.com"])
+        # The prefixes are case-sensitive.
+        self.assertEqual(self.emails(self.client.get("/user/fetch/", {"name": "jo"})), [])
+
+    def test_stream_is_for_admins(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get("/user/fetch/", {"stream": "1"})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {"errors": ["Only admins can stream the user directory"]})
+
+    def test_stream_is_ndjson(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get("/user/fetch/", {"stream": "1", "email": "jo"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("application/x-ndjson"))
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["email"] for row in rows], ["john@example.com", "joan@example.com", "jo@other.com"])
+        self.assertEqual(set(rows[0]), set(UserListSerializer.Meta.fields))
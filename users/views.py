@@ -4,6 +4,10 @@ import logging
 from datetime import timezone
 
 from django.contrib.auth import get_user_model, password_validation
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django_rest_passwordreset.views import (
     ResetPasswordConfirm,
     ResetPasswordRequestToken,
@@ -14,14 +18,21 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenViewBase
 
+from user_listing_proj.fast_serialization import ValuesSerializer, fast_json_response, fast_serialization_enabled
+from user_listing_proj.streaming import NDJSON_CONTENT_TYPE, ndjson_chunks
+from user_listing_proj.utils import prefix_range
+from users.authentication import CachedJWTAuthentication
+from users.counters import get_login_counter
+from users.hashing import hash_passwords
 from users.serializers import (
+    UserBulkRegisterSerializer,
     UserRegisterSerializer,
     UserSerializer,
     UserListSerializer,
@@ -36,7 +47,8 @@ class UserRegisterViewSet(viewsets.ViewSet):
     """Viewset responsible for registering the user."""
 
     permission_classes = (IsAuthenticated, IsAdminUser)
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
+    max_bulk_users = 1000
 
     @swagger_auto_schema(
         method="post",
@@ -70,7 +82,7 @@ class UserRegisterViewSet(viewsets.ViewSet):
             return Response(
                 {"errors": e}, status=status.HTTP_412_PRECONDITION_FAILED
             )
-        user = UserModel.objects.create(
+        user = UserModel(
             first_name=serializer.validated_data["first_name"],
             last_name=serializer.validated_data["last_name"],
             email=serializer.validated_data["email"],
@@ -78,16 +90,95 @@ class UserRegisterViewSet(viewsets.ViewSet):
             phone_number=serializer.validated_data["phone_number"],
         )
         user.set_password(serializer.validated_data["password"])
-        user.save()
+        user.save(force_insert=True)
 
         return Response(status=status.HTTP_200_OK, data=UserSerializer(user).data)
 
+    @staticmethod
+    def validate_row(row):
+        """Return ``(user, password, errors)`` for one row of a bulk registration."""
+        serializer = UserBulkRegisterSerializer(data=row)
+        if not serializer.is_valid():
+            return None, None, [
+                serializer.errors[error][0].replace("This", error) for error in serializer.errors
+            ]
+        data = dict(serializer.validated_data)
+        password = data.pop("password")
+        data["email"] = UserModel.objects.normalize_email(data["email"])
+        user = UserModel(**data)
+        try:
+            password_validation.validate_password(password, user)
+        except DjangoValidationError as e:
+            return None, None, list(e.messages)
+        return user, password, None
+
+    @swagger_auto_schema(
+        method="post",
+        request_body=UserBulkRegisterSerializer(many=True),
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+    )
+    def register_users(self, request):
+        """
+        Register up to ``max_bulk_users`` users sent as a JSON list.
+
+        Rows are validated independently, passwords of the valid rows are
+        hashed in a process pool and the users are inserted with one
+        ``bulk_create``. The response has one result per row, in order.
+        """
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"errors": ["Send a non-empty list of users"]}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_bulk_users:
+            return Response(
+                {"errors": [f"At most {self.max_bulk_users} users can be registered at once"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results, valid = [], []
+        for number, row in enumerate(rows, start=1):
+            user, password, errors = self.validate_row(row) if isinstance(row, dict) else (
+                None, None, ["Each user must be a JSON object"]
+            )
+            results.append({"row": number, "status": "error", "errors": errors})
+            if user is not None:
+                valid.append((number, user, password))
+
+        emails = [user.email for _, user, _ in valid]
+        taken = set(UserModel.objects.filter(email__in=emails).values_list("email", flat=True))
+        seen, new_users = set(), []
+        for number, user, password in valid:
+            if user.email in taken or user.email in seen:
+                results[number - 1]["errors"] = ["user with this email address already exists."]
+                continue
+            seen.add(user.email)
+            new_users.append((number, user, password))
+
+        for (_, user, _), hashed in zip(new_users, hash_passwords(password for _, _, password in new_users)):
+            user.password = hashed
+        try:
+            with transaction.atomic():
+                UserModel.objects.bulk_create([user for _, user, _ in new_users], batch_size=500)
+        except IntegrityError:
+            return Response(
+                {"errors": ["Some of these users were registered concurrently, retry the request"]},
+                status=status.HTTP_409_CONFLICT,
+            )
+        for number, user, _ in new_users:
+            results[number - 1] = {"row": number, "status": "created", "user": UserSerializer(user).data}
+        return Response(
+            {"created": len(new_users), "failed": len(rows) - len(new_users), "results": results},
+            status=status.HTTP_200_OK,
+        )
+
 
 class UserUpdateViewSet(viewsets.ViewSet):
     """Viewset responsible for updating the user."""
 
     permission_classes = (IsAuthenticated, IsAdminUser)
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
 
     @swagger_auto_schema(
         method="post",
@@ -125,18 +216,68 @@ class UserUpdateViewSet(viewsets.ViewSet):
         return Response(status=status.HTTP_200_OK, data=serializer.data)
 
 
+class UserDirectoryPagination(CursorPagination):
+    """Keyset pagination on the user id."""
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
 class UserViewSet(viewsets.ViewSet):
     """Viewset that creates the Apis for listing and retrieving the users."""
 
     permission_classes = (IsAuthenticated,)
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
+    stream_chunk_size = 2000
+
+    @staticmethod
+    def filter_queryset(request, queryset):
+        """
+        Apply the ``email`` and ``name`` prefix filters as index range lookups.
+
+        Both compare with the binary collation of the column indexes, so they
+        are case-sensitive: ``?name=Jo`` matches "John", ``?name=jo`` does not.
+        """
+        email = request.query_params.get("email")
+        if email:
+            low, high = prefix_range(email)
+            queryset = queryset.filter(email__gte=low, email__lt=high)
+        name = request.query_params.get("name")
+        if name:
+            low, high = prefix_range(name)
+            queryset = queryset.filter(
+                Q(first_name__gte=low, first_name__lt=high) | Q(last_name__gte=low, last_name__lt=high)
+            )
+        return queryset
 
     @swagger_auto_schema(tags=["Users"])
     def list(self, request):
-        """List all the users in the DB."""
-        queryset = UserModel.objects.all()
-        serializer = UserListSerializer(queryset, many=True)
-        return Response(serializer.data)
+        """
+        List the users a page at a time, or stream them all as NDJSON with ``?stream=1`` (admins only).
+
+        ``?email=`` and ``?name=`` keep the users whose email, first or last
+        name starts with the given case-sensitive prefix.
+        """
+        queryset = self.filter_queryset(request, UserModel.objects.all())
+        if request.query_params.get("stream"):
+            if not request.user.is_staff:
+                return Response(
+                    {"errors": ["Only admins can stream the user directory"]},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            fields = UserListSerializer.Meta.fields
+            rows = queryset.order_by("id").values(*fields).iterator(chunk_size=self.stream_chunk_size)
+            return StreamingHttpResponse(ndjson_chunks(rows), content_type=NDJSON_CONTENT_TYPE)
+
+        paginator = UserDirectoryPagination()
+        if fast_serialization_enabled(request):
+            fast = ValuesSerializer.for_serializer(UserListSerializer)
+            results, orjson_safe = fast.serialize(paginator.paginate_queryset(fast.rows(queryset), request, view=self))
+            return fast_json_response(paginator.get_paginated_response(results).data, orjson_safe)
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = UserListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @swagger_auto_schema(tags=["Users"])
     def retrieve(self, request, pk=None):
@@ -156,13 +297,13 @@ class TokenObtainUserSerializer(TokenObtainPairSerializer):
             "errors": ["No user found with the given credentials"]
         }
         data = super().validate(attrs)
-        self.user.login_count = self.user.login_count + 1
-        self.user.save()
+        # The counter is written behind, the response shows the count including this login.
+        self.user.last_login = datetime.datetime.now(tz=timezone.utc)
+        self.user.login_count += get_login_counter().record(self.user.pk, self.user.last_login)
         data["token"] = {"access": data["access"], "refresh": data["refresh"]}
         del data["access"]
         del data["refresh"]
         data["user"] = UserSerializer(self.user).data
-        self.user.last_login = datetime.datetime.now(tz=timezone.utc)
         return data
 
 